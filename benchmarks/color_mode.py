@@ -0,0 +1,91 @@
+"""Compare the "hsv" and "ratio" colour modes for speed and colour error
+
+Times `ifg.enhance` and `clahe.apply` in both modes and, for each mode,
+measures against the input how far hue and saturation drift (in float
+HSV, over pixels with enough chroma for hue to mean anything) and how far
+the output's V is from the enhanced V channel it was meant to have.
+
+Usage:
+    python -m benchmarks.color_mode [--size 3000x4000] [--repeat 3] [--images DIR]
+"""
+
+import argparse
+import time
+from typing import Dict
+
+import cv2
+import numpy as np
+
+from src.enhancements import clahe, ifg
+from .common import parse_shape, sample_images, synthetic
+
+
+MODES = ("hsv", "ratio")
+
+# pixels whose saturation is below this have no meaningful hue
+MIN_SATURATION = 0.1
+
+
+def _hsv(img: np.ndarray) -> np.ndarray:
+    return cv2.cvtColor(img.astype(np.float32) / 255.0, cv2.COLOR_BGR2HSV)
+
+
+def _time(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def _errors(img: np.ndarray, out: np.ndarray, target_v: np.ndarray) -> Dict[str, float]:
+    src, got = _hsv(img), _hsv(out)
+    chroma = (src[..., 1] >= MIN_SATURATION) & (got[..., 2] > 0)
+    dh = np.abs(src[..., 0] - got[..., 0])[chroma]
+    dh = np.minimum(dh, 360.0 - dh)
+    ds = np.abs(src[..., 1] - got[..., 1])[chroma]
+    dv = np.abs(out.max(axis=2).astype(np.int16) - target_v)
+    return {"hue_mean": float(dh.mean()) if dh.size else 0.0, "hue_max": float(dh.max()) if dh.size else 0.0,
+            "sat_mean": float(ds.mean()) if ds.size else 0.0, "v_mean": float(dv.mean()), "v_max": int(dv.max())}
+
+
+def _report(name: str, img: np.ndarray, repeat: int) -> None:
+    h, w = img.shape[:2]
+    v = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)[..., 2]
+    target = {"ifg": ifg._enhance_value(v)[0], "clahe": clahe._apply_value(v)}
+    run = {"ifg": lambda mode: ifg.enhance(img, color=mode)[0],
+           "clahe": lambda mode: clahe.apply(img, color=mode)}
+
+    print(f"{name}: {w}x{h} ({w * h / 1e6:.1f} MP)")
+    print(f"{'engine':<8}{'mode':<7}{'time [s]':>10}{'hue err [deg]':>16}{'hue max':>9}"
+          f"{'sat err':>9}{'V err':>8}{'V max':>7}")
+    for engine, fn in run.items():
+        times = {}
+        for mode in MODES:
+            times[mode] = _time(lambda: fn(mode), repeat)
+            e = _errors(img, fn(mode), target[engine])
+            print(f"{engine:<8}{mode:<7}{times[mode]:>10.3f}{e['hue_mean']:>16.3f}{e['hue_max']:>9.2f}"
+                  f"{e['sat_mean']:>9.4f}{e['v_mean']:>8.3f}{e['v_max']:>7}")
+        diff = np.abs(fn("hsv").astype(np.int16) - fn("ratio"))
+        print(f"{'':<8}ratio speed-up {times['hsv'] / times['ratio']:.2f}x; "
+              f"modes differ by {diff.mean():.3f} levels on average, {int(diff.max())} at most")
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--size", default="3000x4000", help="HEIGHTxWIDTH of the synthetic image")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--images", default=None, help="also measure every image in this directory")
+    args = ap.parse_args(argv)
+
+    h, w = parse_shape(args.size)
+    _report("synthetic", synthetic(h, w), args.repeat)
+    for name, img in (sample_images(args.images) if args.images else {}).items():
+        print()
+        _report(name, img, args.repeat)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,44 @@
+"""Shared helpers for the benchmarks"""
+
+import glob
+import os
+from typing import Dict, List, Tuple
+
+import cv2
+import numpy as np
+
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff")
+
+
+def synthetic(h: int, w: int, seed: int = 0) -> np.ndarray:
+    """Dark, noisy BGR test image (the kind of input IFG is meant for)"""
+    rng = np.random.default_rng(seed)
+    return np.clip(rng.normal(60, 30, (h, w, 3)), 0, 255).astype(np.uint8)
+
+
+def synthetic_mp(megapixels: float, seed: int = 0) -> np.ndarray:
+    """`synthetic` image of about `megapixels` MP with a 3:2 aspect ratio"""
+    h = max(1, round((megapixels * 1e6 / 1.5) ** 0.5))
+    return synthetic(h, max(1, round(h * 1.5)), seed)
+
+
+def parse_shape(text: str) -> Tuple[int, int]:
+    """'HxW' -> (h, w)"""
+    h, w = (int(x) for x in text.lower().split("x"))
+    return h, w
+
+
+def sample_images(directory: str) -> Dict[str, np.ndarray]:
+    """Decode every image in `directory` (empty if it does not exist)"""
+    images = {}
+    for path in sorted(glob.glob(os.path.join(glob.escape(directory), "*"))):
+        if path.lower().endswith(IMAGE_EXTENSIONS):
+            img = cv2.imread(path, cv2.IMREAD_COLOR)
+            if img is not None:
+                images[os.path.basename(path)] = img
+    return images
+
+
+def parse_list(text: str, kind=float) -> List:
+    return [kind(x) for x in text.split(",") if x.strip()]
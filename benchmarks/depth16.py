@@ -0,0 +1,63 @@
+"""Compare wall time and peak memory of the 16-bit and 8-bit paths
+
+The 16-bit input is the 8-bit synthetic image scaled to 16 bits with
+random low bits, so it has the same content but (up to) 256 times the
+distinct levels. Both are run through `ifg.enhance` and `clahe.apply`;
+the 8-bit image in both colour modes, since the 16-bit path always uses
+the "ratio" reconstruction.
+
+Usage:
+    python -m benchmarks.depth16 [--size 3000x4000] [--repeat 3]
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from src.enhancements import clahe, ifg
+from .common import parse_shape, synthetic
+
+
+def _measure(fn, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--size", default="3000x4000", help="HEIGHTxWIDTH of the synthetic image")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args(argv)
+
+    h, w = parse_shape(args.size)
+    img8 = synthetic(h, w)
+    rng = np.random.default_rng(1)
+    img16 = img8.astype(np.uint16) * 257 + rng.integers(0, 257, img8.shape, dtype=np.uint16)
+
+    print(f"image: {w}x{h} ({w * h / 1e6:.1f} MP), 16-bit levels in V: "
+          f"{len(np.unique(img16.max(axis=2)))}")
+    print(f"{'engine':<8}{'input':<12}{'time [s]':>10}{'peak [MiB]':>12}{'time x':>8}{'memory x':>10}")
+    for engine, fn in (("ifg", lambda img, **kw: ifg.enhance(img, **kw)),
+                       ("clahe", lambda img, **kw: clahe.apply(img, **kw))):
+        base = None
+        for name, img, color in (("8-bit hsv", img8, "hsv"), ("8-bit ratio", img8, "ratio"),
+                                 ("16-bit", img16, "ratio")):
+            t, peak = _measure(lambda: fn(img, color=color), args.repeat)
+            base = base or (t, peak)
+            print(f"{engine:<8}{name:<12}{t:>10.3f}{peak / 2**20:>12.1f}"
+                  f"{t / base[0]:>8.2f}{peak / base[1]:>10.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,73 @@
+"""Allocations and time per call of the buffered enhancers vs the functional API
+
+Enhances a sequence of same-sized frames with `ifg.enhance` / `clahe.apply`
+and with `IFGEnhancer` / `CLAHEEnhancer`, and reports the peak traced
+allocation of each steady-state call (after the first, which sets up the
+buffers). Exits with status 1 if a buffered call allocates more than
+`--limit` bytes or its output differs from the functional API.
+
+Usage:
+    python -m benchmarks.enhancer_alloc [--size 2000x3000] [--frames 5] [--limit 1M]
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from src.cli.common import parse_size
+from src.enhancements import clahe, ifg
+from src.enhancements.enhancer import CLAHEEnhancer, IFGEnhancer
+from .common import parse_shape, synthetic
+
+
+def _steady_state(fn, frames):
+    """Peak traced bytes and time of each call after the first"""
+    fn(frames[0])
+    peaks, times = [], []
+    for frame in frames[1:]:
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        fn(frame)
+        times.append(time.perf_counter() - t0)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return max(peaks), min(times)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--size", default="2000x3000", help="HEIGHTxWIDTH of the synthetic frames")
+    ap.add_argument("--frames", type=int, default=5)
+    ap.add_argument("--limit", type=parse_size, default=2**20,
+                    help="largest allowed steady-state allocation of a buffered call (default: 1M)")
+    args = ap.parse_args(argv)
+
+    h, w = parse_shape(args.size)
+    frames = [synthetic(h, w, seed) for seed in range(max(2, args.frames))]
+    ifg_enhancer, clahe_enhancer = IFGEnhancer(), CLAHEEnhancer()
+
+    exact = all(np.array_equal(ifg.enhance(f)[0], ifg_enhancer.enhance(f)[0]) and
+                np.array_equal(clahe.apply(f), clahe_enhancer.apply(f)) for f in frames[:2])
+    cases = [
+        ("ifg.enhance", lambda f: ifg.enhance(f), False),
+        ("IFGEnhancer", lambda f: ifg_enhancer.enhance(f), True),
+        ("clahe.apply", lambda f: clahe.apply(f), False),
+        ("CLAHEEnhancer", lambda f: clahe_enhancer.apply(f), True),
+    ]
+
+    print(f"frames: {len(frames)} x {w}x{h} ({w * h / 1e6:.1f} MP)")
+    print(f"{'call':<16}{'time [s]':>10}{'peak alloc [MiB]':>18}")
+    within = True
+    for name, fn, buffered in cases:
+        peak, best = _steady_state(fn, frames)
+        print(f"{name:<16}{best:>10.3f}{peak / 2**20:>18.2f}")
+        if buffered and peak > args.limit:
+            within = False
+    print(f"identical output: {exact}; buffered calls within {args.limit} bytes: {within}")
+    return 0 if exact and within else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,52 @@
+"""Compare wall time and peak memory of the compiled (LUT) and float IFG paths
+
+Usage:
+    python -m benchmarks.ifg_compiled [--size 4000x6000] [--repeat 3]
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from src.enhancements import ifg
+from .common import parse_shape, synthetic
+
+
+def _measure(img: np.ndarray, compiled: bool, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        ifg.enhance(img, compiled=compiled)
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    out, _ = ifg.enhance(img, compiled=compiled)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return out, best, peak
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--size", default="4000x6000", help="HEIGHTxWIDTH of the synthetic image")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args(argv)
+
+    h, w = parse_shape(args.size)
+    img = synthetic(h, w)
+
+    ref, t_float, m_float = _measure(img, False, args.repeat)
+    out, t_lut, m_lut = _measure(img, True, args.repeat)
+    diff = int(np.abs(ref.astype(np.int16) - out).max())
+
+    print(f"image: {w}x{h} ({w * h / 1e6:.1f} MP)")
+    print(f"{'path':<10}{'time [s]':>12}{'peak [MiB]':>14}")
+    print(f"{'float':<10}{t_float:>12.3f}{m_float / 2**20:>14.1f}")
+    print(f"{'compiled':<10}{t_lut:>12.3f}{m_lut / 2**20:>14.1f}")
+    print(f"speed-up: {t_float / t_lut:.2f}x, memory: {m_float / max(m_lut, 1):.2f}x less, max abs diff: {diff}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,61 @@
+"""Time to the first enhanced viewport: region enhancement vs a full run
+
+A viewport of a large synthetic image is enhanced through `roi.analyse`
++ `roi.enhance` (what the GUI shows first) and compared with enhancing
+the whole image, for IFG in both colour modes and for CLAHE. The region
+must equal the same crop of the full output.
+
+Usage:
+    python -m benchmarks.roi [--size 6000x9000] [--viewport 1600x900] [--repeat 3]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from src.enhancements import clahe, ifg, roi
+from .common import parse_shape, synthetic
+
+
+def _best(fn, repeat: int):
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--size", default="6000x9000", help="HEIGHTxWIDTH of the synthetic image")
+    ap.add_argument("--viewport", default="900x1600", help="HEIGHTxWIDTH of the region, centred")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args(argv)
+
+    h, w = parse_shape(args.size)
+    vh, vw = parse_shape(args.viewport)
+    img = synthetic(h, w)
+    rect = ((w - vw) // 2, (h - vh) // 2, vw, vh)
+    x, y = rect[:2]
+
+    print(f"image: {w}x{h} ({w * h / 1e6:.1f} MP), viewport: {vw}x{vh} at ({x}, {y})")
+    print(f"{'engine':<12}{'full [s]':>10}{'analyse [s]':>13}{'region [s]':>12}{'speed-up':>10}  identical")
+    same_all = True
+    for name, full_fn, analyse_fn, color in (
+            ("ifg hsv", lambda: ifg.enhance(img)[0], lambda: roi.analyse(img), "hsv"),
+            ("ifg ratio", lambda: ifg.enhance(img, color="ratio")[0], lambda: roi.analyse(img), "ratio"),
+            ("clahe hsv", lambda: clahe.apply(img), lambda: roi.analyse_clahe(img), "hsv")):
+        t_full, full = _best(full_fn, args.repeat)
+        t_analyse, analysis = _best(analyse_fn, args.repeat)
+        t_region, region = _best(lambda: roi.enhance(img, analysis, rect, color), args.repeat)
+        same = np.array_equal(region, full[y:y + vh, x:x + vw])
+        same_all &= same
+        first = t_analyse + t_region
+        print(f"{name:<12}{t_full:>10.3f}{t_analyse:>13.3f}{t_region:>12.3f}{t_full / first:>9.1f}x  {same}")
+    return 0 if same_all else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,135 @@
+"""Load test of the enhancement service with local clients, fully offline
+
+Starts an `EnhanceServer` on an ephemeral localhost port (in this
+process), then `--clients` threads each send `--requests` images through
+`ServiceClient` and retry rejected (429) requests after a short pause.
+Reports throughput, client-side latency percentiles, rejections and the
+server's batch-size histogram. Exits with status 1 if a result differs
+from `ifg.enhance` or a request fails with anything other than 429.
+
+Usage:
+    python -m benchmarks.service [--size 480x640] [--clients 8] [--requests 25] [--workers 2]
+"""
+
+import argparse
+import asyncio
+import threading
+import time
+from typing import Dict, List
+
+import cv2
+import numpy as np
+
+from src.cli.common import parse_size
+from src.enhancements import ifg
+from src.enhancements.timing import percentiles
+from src.service.client import ServiceClient, ServiceError
+from src.service.server import EnhanceServer
+from .common import parse_shape, synthetic
+
+
+class _Background:
+    """Run a server's event loop on a thread for the duration of a `with` block"""
+
+    def __init__(self, server: EnhanceServer):
+        self.server = server
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=asyncio.run, args=(self._main(),), daemon=True)
+
+    async def _main(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.current_task()
+        await self.server.start()
+        self._ready.set()
+        try:
+            await self.server.serve_forever()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            await self.server.close()
+
+    def __enter__(self) -> EnhanceServer:
+        self._thread.start()
+        self._ready.wait()
+        return self.server
+
+    def __exit__(self, *exc) -> None:
+        self._loop.call_soon_threadsafe(self._task.cancel)
+        self._thread.join()
+
+
+def _client(port: int, payload, n: int, out: Dict, lock: threading.Lock) -> None:
+    latencies, rejected, errors = [], 0, []
+    with ServiceClient(port=port) as client:
+        for _ in range(n):
+            t0 = time.perf_counter()
+            while True:
+                try:
+                    client.enhance(payload)
+                    break
+                except ServiceError as exc:
+                    if not exc.busy:
+                        errors.append(str(exc))
+                        break
+                    rejected += 1
+                    time.sleep(0.005)
+            latencies.append(time.perf_counter() - t0)
+    with lock:
+        out["latency"].extend(latencies)
+        out["rejected"] += rejected
+        out["errors"].extend(errors)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--size", default="480x640", help="HEIGHTxWIDTH of the synthetic images (default: 480x640)")
+    ap.add_argument("--clients", type=int, default=8, help="concurrent client threads (default: 8)")
+    ap.add_argument("--requests", type=int, default=25, help="requests per client (default: 25)")
+    ap.add_argument("--workers", type=int, default=2, help="server pool processes (default: 2)")
+    ap.add_argument("--queue", type=int, default=16, help="server queue size (default: 16)")
+    ap.add_argument("--max-batch", type=int, default=8, help="largest micro-batch (default: 8)")
+    ap.add_argument("--batch-bytes", type=parse_size, default=2**20, help="batchable body size (default: 1M)")
+    ap.add_argument("--encoded", action="store_true", help="send PNG bytes instead of raw arrays")
+    args = ap.parse_args(argv)
+
+    h, w = parse_shape(args.size)
+    img = synthetic(h, w)
+    payload = cv2.imencode(".png", img)[1].tobytes() if args.encoded else img
+    server = EnhanceServer(port=0, workers=args.workers, queue_size=args.queue,
+                           max_batch=args.max_batch, batch_bytes=args.batch_bytes)
+
+    with _Background(server):
+        with ServiceClient(port=server.port) as client:
+            got = client.enhance(img).image
+        exact = np.array_equal(got, ifg.enhance(img)[0])
+
+        out = {"latency": [], "rejected": 0, "errors": []}
+        lock = threading.Lock()
+        threads: List[threading.Thread] = [
+            threading.Thread(target=_client, args=(server.port, payload, args.requests, out, lock))
+            for _ in range(args.clients)]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - t0
+        with ServiceClient(port=server.port) as client:
+            metrics = client.metrics()
+
+    done = len(out["latency"]) - len(out["errors"])
+    q = percentiles([{"latency": t} for t in out["latency"]])["latency"]
+    print(f"{args.clients} clients x {args.requests} requests of {w}x{h} "
+          f"({'png' if args.encoded else 'raw'}) on {args.workers} workers")
+    print(f"throughput: {done / elapsed:.1f} images/s, {done * w * h / 1e6 / elapsed:.1f} MP/s")
+    print(f"latency [ms]: p50 {q['p50'] * 1e3:.1f}, p90 {q['p90'] * 1e3:.1f}, p99 {q['p99'] * 1e3:.1f}")
+    print(f"rejected (429, retried): {out['rejected']}; batches: {metrics['batches']}, "
+          f"sizes (cumulative): {metrics['batch_size']['buckets']}")
+    print(f"identical to ifg.enhance: {exact}; errors: {len(out['errors'])}")
+    for err in out["errors"][:5]:
+        print(f"  {err}")
+    return 0 if exact and not out["errors"] else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
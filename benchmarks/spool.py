@@ -0,0 +1,148 @@
+"""Run a spool with several local worker processes, killing one mid-job
+
+Writes synthetic images to a temporary directory, submits them to a
+spool and starts `--workers` separate `ifg-enhance spool work` processes
+(as if on different hosts). Once a worker is busy it is SIGKILLed; the
+others must reclaim its job after the lease expires. The run passes if
+every job is done exactly once in the manifest, every output equals
+`ifg.enhance` of its input and no temporary file is left behind.
+Reports the wall time, the throughput and the jobs that were reclaimed.
+Fails, rather than waiting, if no worker is seen busy within a minute
+or all of them exit first.
+
+Before that, a claim is raced in-process against `reclaim_stale`
+running between its rename and its reading of the job: a job that
+waited in `pending/` longer than the lease must not be reclaimed as
+stale, and a claim that is reclaimed (forced with a negative lease)
+must be given up without an error or a failed record.
+
+Usage:
+    python -m benchmarks.spool [--images 24] [--size 1200x1600] [--workers 3] [--lease 2]
+"""
+
+import argparse
+import glob
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from src.enhancements import ifg
+from src.spool.store import Spool
+from .common import parse_shape, synthetic
+
+
+def _cli(*args: str, **kw) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, "-m", "src.cli", "spool", *args], **kw)
+
+
+def _busy_worker(spool: Spool, procs, timeout: float) -> Optional[int]:
+    """pid of one of `procs` whose heartbeat says it is processing a job (None if none did in time)"""
+    pids = {p.pid for p in procs}
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        for info in spool.workers():
+            if info["pid"] in pids and info["state"] == "busy":
+                return info["pid"]
+        if all(p.poll() is not None for p in procs):
+            return None
+        time.sleep(0.02)
+    return None
+
+
+def _claim_race(root: str, lease: float) -> dict:
+    """Claim a long-pending job as "A" while "B" runs `reclaim_stale(lease)` right after A's rename"""
+    spool = Spool(root)
+    spool.submit([{"input": "in.png", "output": "out.png"}])
+    for name in spool.names("pending"):
+        past = time.time() - 3600  # submitted an hour ago
+        os.utime(spool.path("pending", name), (past, past))
+    spool.heartbeat("B", {"pid": os.getpid(), "state": "idle"})
+    rename, reclaimed = os.rename, []
+
+    def racing_rename(src, dst, *args, **kw):
+        rename(src, dst, *args, **kw)
+        if not reclaimed and os.path.dirname(src) == spool.path("pending").rstrip(os.sep):
+            reclaimed.append(None)  # once, and not for the reclaimer's own renames
+            reclaimed[0] = spool.reclaim_stale("B", lease=lease)
+
+    os.rename = racing_rename
+    try:
+        claim = spool.claim("A")
+        error = None
+    except Exception as exc:
+        claim, error = None, f"{type(exc).__name__}: {exc}"
+    finally:
+        os.rename = rename
+    return {"claimed": claim is not None, "reclaimed": reclaimed[0] if reclaimed else 0,
+            "error": error, "counts": spool.counts()}
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--images", type=int, default=24)
+    ap.add_argument("--size", default="1200x1600", help="HEIGHTxWIDTH of each image")
+    ap.add_argument("--workers", type=int, default=3, help="worker processes (one is killed)")
+    ap.add_argument("--lease", type=float, default=2.0, help="lease in seconds")
+    args = ap.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fresh = _claim_race(os.path.join(tmp, "fresh"), lease=60.0)
+        lost = _claim_race(os.path.join(tmp, "lost"), lease=-1.0)
+    race_ok = (fresh["claimed"] and not fresh["reclaimed"] and not fresh["error"]
+               and not lost["error"] and lost["reclaimed"] == 1 and lost["counts"]["failed"] == 0)
+    print(f"claim racing reclaim_stale: job pending for an hour, lease 60s: {fresh}")
+    print(f"claim racing reclaim_stale: forced reclaim: {lost}")
+
+    h, w = parse_shape(args.size)
+    with tempfile.TemporaryDirectory() as tmp:
+        src, out, root = (os.path.join(tmp, name) for name in ("in", "out", "spool"))
+        os.makedirs(src)
+        for i in range(args.images):
+            cv2.imwrite(os.path.join(src, f"img{i:03d}.png"), synthetic(h, w, seed=i))
+        subprocess.run([sys.executable, "-m", "src.cli", "spool", "submit", root, src, "-o", out], check=True)
+        spool = Spool(root)
+
+        t0 = time.perf_counter()
+        opts = ["--lease", str(args.lease), "--heartbeat", str(args.lease / 6), "--poll", "0.1"]
+        procs = [_cli("work", root, *opts, stderr=subprocess.DEVNULL) for _ in range(args.workers)]
+        victim = _busy_worker(spool, procs, timeout=60)
+        if victim is not None:
+            try:
+                os.kill(victim, signal.SIGKILL)
+            except ProcessLookupError:  # finished its last job meanwhile
+                victim = None
+        codes = [p.wait() for p in procs]
+        elapsed = time.perf_counter() - t0
+
+        status = subprocess.run([sys.executable, "-m", "src.cli", "spool", "status", root],
+                                capture_output=True, text=True, check=True).stdout
+        records = [json.loads(line) for line in subprocess.run(
+            [sys.executable, "-m", "src.cli", "spool", "manifest", root, "--failed"],
+            capture_output=True, text=True, check=True).stdout.splitlines()]
+
+        inputs = sorted(r["input"] for r in records if r["status"] == "ok")
+        once = inputs == sorted(glob.glob(os.path.join(src, "*.png")))
+        identical = all(np.array_equal(cv2.imread(r["output"]), ifg.enhance(cv2.imread(r["input"]))[0])
+                        for r in records if r["status"] == "ok")
+        leftovers = [n for n in os.listdir(out) if n.startswith(".")]
+        reclaimed = [os.path.basename(r["input"]) for r in records if r.get("attempts")]
+
+    print(status, end="")
+    killed = f"pid {victim} killed" if victim is not None else "none killed: no worker was seen busy"
+    print(f"{args.images} images of {w}x{h} on {args.workers} workers ({killed}): "
+          f"{elapsed:.2f}s, {args.images / elapsed:.2f} images/s")
+    print(f"exit codes: {codes}; reclaimed: {', '.join(reclaimed) or 'none'}")
+    print(f"every job done once: {once}; outputs identical: {identical}; temporary files left: {len(leftovers)}")
+    return 0 if race_ok and victim is not None and once and identical and not leftovers and reclaimed else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
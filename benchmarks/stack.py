@@ -0,0 +1,60 @@
+"""Compare `enhance_batch` on an (N, H, W, 3) stack with a loop over `ifg.enhance`
+
+Reports the wall time of both, the k search time of each (per-image
+searches summed vs the one batched pass) and whether the outputs agree.
+
+Usage:
+    python -m benchmarks.stack [--size 480x640] [--count 32] [--repeat 3] [--search grid]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from src.enhancements import ifg
+from src.enhancements.stack import enhance_batch
+from src.enhancements.timing import StageTimer
+from .common import parse_shape, synthetic
+
+
+def _best(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--size", default="480x640", help="HEIGHTxWIDTH of each image")
+    ap.add_argument("--count", type=int, default=32, help="images in the stack")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--search", default="grid", help="k search strategy")
+    args = ap.parse_args(argv)
+
+    h, w = parse_shape(args.size)
+    stack = np.stack([synthetic(h, w, seed=i) for i in range(args.count)])
+    out = np.empty_like(stack)
+
+    t_loop = _best(lambda: [ifg.enhance(img, search=args.search) for img in stack], args.repeat)
+    t_batch = _best(lambda: enhance_batch(stack, search=args.search, out=out), args.repeat)
+
+    loop_timer, batch_timer = StageTimer(), StageTimer()
+    ref = [ifg.enhance(img, search=args.search, timer=loop_timer)[0] for img in stack]
+    enhance_batch(stack, search=args.search, out=out, timer=batch_timer)
+    same = all(np.array_equal(a, b) for a, b in zip(ref, out))
+
+    mp = args.count * w * h / 1e6
+    print(f"stack: {args.count} x {w}x{h} ({mp:.1f} MP), search: {args.search}")
+    print(f"{'path':<16}{'time [s]':>10}{'MP/s':>8}{'k search [ms]':>15}")
+    for name, t, timer in (("ifg.enhance loop", t_loop, loop_timer), ("enhance_batch", t_batch, batch_timer)):
+        print(f"{name:<16}{t:>10.3f}{mp / t:>8.1f}{timer.seconds().get('k_search', 0.0) * 1e3:>15.2f}")
+    print(f"speed-up: {t_loop / t_batch:.2f}x; identical output: {same}")
+    return 0 if same else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
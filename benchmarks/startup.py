@@ -0,0 +1,155 @@
+"""Startup time of the headless API, the CLI and the GUI (to first paint)
+
+Every case runs in a fresh interpreter. Wall time is measured from
+spawning the process until it exits (the GUI case exits from its first
+paint event); one extra run under `-X importtime` gives the heaviest
+top-level imports. The exit status is 1 if a headless case imports Qt or
+the GUI package, or if `import src.enhancements` alone pulls in OpenCV.
+
+Usage:
+    python -m benchmarks.startup [--repeat 5] [--top 5] [--json results.json]
+"""
+
+import argparse
+import ast
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# each snippet ends by printing the loaded modules on its last line (as a
+# literal, so reporting imports nothing the case did not)
+_REPORT = "import sys as _s; print(sorted(_s.modules))"
+
+CASES: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    # name: (code, module prefixes that must not be imported)
+    "headless-import": ("import src.enhancements", ("PySide6", "src.gui", "cv2")),
+    "headless-first-call": (
+        "import numpy as np\n"
+        "from src.enhancements import ifg_enhance\n"
+        "ifg_enhance(np.zeros((64, 64, 3), np.uint8))",
+        ("PySide6", "src.gui"),
+    ),
+    "cli-import": ("import src.cli", ("PySide6", "src.gui")),
+    "gui-first-paint": (
+        "from PySide6.QtCore import QEvent, QObject\n"
+        "from PySide6.QtWidgets import QApplication\n"
+        "from src.gui.window import MainWindow\n"
+        "class _FirstPaint(QObject):\n"
+        "    def eventFilter(self, obj, ev):\n"
+        "        if ev.type() == QEvent.Paint:\n"
+        "            app.removeEventFilter(self)\n"
+        "            app.exit(0)\n"
+        "        return False\n"
+        "app = QApplication([])\n"
+        "_f = _FirstPaint()\n"
+        "app.installEventFilter(_f)\n"
+        "win = MainWindow()\n"
+        "win.show()\n"
+        "app.exec()",
+        (),
+    ),
+}
+
+
+def _run(code: str, importtime: bool = False) -> Tuple[float, List[str], str]:
+    """Run `code` in a fresh interpreter: (wall seconds, loaded modules, stderr)"""
+    env = dict(os.environ)
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", f"{code}\n{_REPORT}"]
+    t0 = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=ROOT, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - t0
+    if proc.returncode != 0:
+        raise RuntimeError(f"startup case failed:\n{proc.stderr.strip()}")
+    return wall, ast.literal_eval(proc.stdout.strip().splitlines()[-1]), proc.stderr
+
+
+def top_imports(stderr: str, n: int) -> List[Tuple[str, float]]:
+    """Heaviest top-level imports (cumulative ms) from `-X importtime` output"""
+    found = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line.split("|")
+        if name.startswith("  ") or not cumulative.strip().isdigit():
+            continue  # nested import, or the header line
+        found.append((name.strip(), int(cumulative) / 1000))
+    return sorted(found, key=lambda x: -x[1])[:n]
+
+
+def measure(name: str, repeat: int, top: int) -> Dict:
+    code, forbidden = CASES[name]
+    walls, modules = [], []
+    for _ in range(repeat):
+        wall, modules, _ = _run(code)
+        walls.append(wall)
+    _, _, stderr = _run(code, importtime=True)
+    leaked = sorted(m for m in modules if any(m == f or m.startswith(f + ".") for f in forbidden))
+    return {
+        "case": name,
+        "wall": {"best": min(walls), "median": statistics.median(walls), "runs": len(walls)},
+        "modules": len(modules),
+        "top_imports": top_imports(stderr, top),
+        "forbidden_imported": leaked,
+    }
+
+
+def baseline_interpreter(repeat: int) -> float:
+    """Best wall time of a bare `python -c pass`, to put the cases in context"""
+    return min(_run("pass")[0] for _ in range(repeat))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--repeat", type=int, default=5, help="timed runs per case (default: 5)")
+    ap.add_argument("--top", type=int, default=5, help="heaviest top-level imports to list (default: 5)")
+    ap.add_argument("--cases", default=",".join(CASES), help=f"comma separated, from {', '.join(CASES)}")
+    ap.add_argument("--json", help="write results as JSON to this file ('-' for stdout)")
+    args = ap.parse_args(argv)
+
+    names = [c for c in args.cases.split(",") if c]
+    unknown = set(names) - set(CASES)
+    if unknown:
+        ap.error(f"unknown case(s): {', '.join(sorted(unknown))}")
+    if "gui-first-paint" in names and importlib.util.find_spec("PySide6") is None:
+        names.remove("gui-first-paint")
+
+    log = sys.stderr if args.json == "-" else sys.stdout
+    repeat = max(1, args.repeat)
+    bare = baseline_interpreter(repeat)
+    print(f"{'case':<22}{'best [ms]':>11}{'median [ms]':>13}{'modules':>9}   heaviest imports [ms]", file=log)
+    print(f"{'python -c pass':<22}{bare * 1000:>11.0f}", file=log)
+
+    results, failed = [], []
+    for name in names:
+        rec = measure(name, repeat, args.top)
+        results.append(rec)
+        heaviest = ", ".join(f"{mod} {ms:.0f}" for mod, ms in rec["top_imports"])
+        print(f"{name:<22}{rec['wall']['best'] * 1000:>11.0f}{rec['wall']['median'] * 1000:>13.0f}"
+              f"{rec['modules']:>9}   {heaviest}", file=log, flush=True)
+        if rec["forbidden_imported"]:
+            failed.append(rec)
+
+    report = {"python": sys.version.split()[0], "interpreter": bare, "results": results}
+    if args.json == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+    for rec in failed:
+        print(f"{rec['case']} imported {', '.join(rec['forbidden_imported'][:5])}", file=log)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
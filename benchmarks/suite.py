@@ -0,0 +1,226 @@
+"""Benchmark suite for the enhancement engines, with baseline comparison
+
+Runs `ifg.enhance` (and optionally its float path) and `clahe.apply` over
+synthetic images of several sizes plus any images in `samples/`, for each
+clip limit (and CLAHE grid), and reports wall time, a per-stage
+breakdown (from `timing.StageTimer`), peak traced memory and throughput. Results can be written as
+JSON and compared against a stored baseline; the exit status is 1 when a
+case got slower than the baseline by more than the threshold.
+
+Usage:
+    python -m benchmarks.suite [--quick] [--json results.json]
+    python -m benchmarks.suite --save-baseline benchmarks/baseline.json
+    python -m benchmarks.suite --baseline benchmarks/baseline.json [--threshold 0.1]
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+import cv2
+import numpy as np
+
+from src.enhancements import clahe, ifg, parallel
+from src.enhancements.timing import StageTimer
+from src.utils.resource import resource_path
+from .common import parse_list, parse_shape, sample_images, synthetic, synthetic_mp
+
+
+ENGINES = ("ifg", "ifg-float", "clahe")
+
+
+_RUNNERS: Dict[str, Callable] = {
+    "ifg": lambda img, clip, grid, timer=None: ifg.enhance(img, clip=clip, timer=timer),
+    "ifg-float": lambda img, clip, grid, timer=None: ifg.enhance(img, clip=clip, compiled=False, timer=timer),
+    "clahe": lambda img, clip, grid, timer=None: clahe.apply(img, clip=clip, grid=grid, timer=timer),
+}
+
+
+# -- measurement ------------------------------------------------------------------
+
+def measure(engine: str, img: np.ndarray, clip: float, grid: Tuple[int, int], repeat: int) -> Dict:
+    """Time one engine on one image: best/median wall, median stages, peak memory"""
+    run = _RUNNERS[engine]
+    run(img, clip, grid)  # warm-up (allocator, OpenCV thread pool)
+
+    walls = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        run(img, clip, grid)
+        walls.append(time.perf_counter() - t0)
+
+    # stages come from separate instrumented runs so the wall times stay untouched
+    per_stage: Dict[str, List[float]] = {}
+    for _ in range(repeat):
+        timer = StageTimer()
+        run(img, clip, grid, timer)
+        for name, t in timer.seconds().items():
+            per_stage.setdefault(name, []).append(t)
+
+    tracemalloc.start()
+    run(img, clip, grid)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    mp = img.shape[0] * img.shape[1] / 1e6
+    best = min(walls)
+    return {
+        "megapixels": round(mp, 3),
+        "wall": {"best": best, "median": statistics.median(walls), "runs": len(walls)},
+        "stages": {name: statistics.median(ts) for name, ts in per_stage.items()},
+        "peak_bytes": peak,
+        "mp_per_s": mp / best if best > 0 else 0.0,
+    }
+
+
+def case_id(engine: str, image: str, clip: float, grid: Tuple[int, int]) -> str:
+    parts = [engine, image, f"clip={clip:g}"]
+    if engine == "clahe":
+        parts.append(f"grid={grid[0]}x{grid[1]}")
+    return "/".join(parts)
+
+
+def run_suite(images: Dict[str, np.ndarray], engines: List[str], clips: List[float],
+              grids: List[Tuple[int, int]], repeat: int, progress=None) -> List[Dict]:
+    results = []
+    for name, img in images.items():
+        for engine in engines:
+            # only CLAHE takes a grid; IFG always uses its fixed 8x8 grid
+            for grid in (grids if engine == "clahe" else grids[:1]):
+                for clip in clips:
+                    rec = {"id": case_id(engine, name, clip, grid), "engine": engine, "image": name,
+                           "clip": clip, "grid": list(grid)}
+                    rec.update(measure(engine, img, clip, grid, repeat))
+                    results.append(rec)
+                    if progress is not None:
+                        progress(rec)
+    return results
+
+
+def environment() -> Dict:
+    return {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "opencv_threads": cv2.getNumThreads(),
+        "band_threads": parallel.get_num_threads(),
+    }
+
+
+def compare(rec: Dict, baseline: Dict[str, Dict], threshold: float, min_delta: float = 0.0) -> bool:
+    """
+    Attach `baseline` (its best wall time) and `ratio` (current / baseline)
+    to a result found in `baseline` (results by id). True if it regressed:
+    slower by more than `threshold` (relative) and `min_delta` seconds.
+    """
+    ref = baseline.get(rec["id"])
+    if ref is None:
+        return False
+    rec["baseline"] = ref["wall"]["best"]
+    rec["ratio"] = rec["wall"]["best"] / ref["wall"]["best"] if ref["wall"]["best"] > 0 else 1.0
+    return rec["ratio"] > 1.0 + threshold and rec["wall"]["best"] - rec["baseline"] > min_delta
+
+
+def _row(rec: Dict) -> str:
+    line = (f"{rec['id']:<44}{rec['megapixels']:>8.1f}{rec['wall']['best']:>10.3f}"
+            f"{rec['mp_per_s']:>10.1f}{rec['peak_bytes'] / 2**20:>11.1f}")
+    if "ratio" in rec:
+        line += f"{(rec['ratio'] - 1.0) * 100:>+9.1f}%"
+    return line
+
+
+def _header() -> str:
+    return f"{'case':<44}{'MP':>8}{'best [s]':>10}{'MP/s':>10}{'peak [MiB]':>11}{'vs base':>10}"
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--sizes", default="0.3,2,12,50", help="synthetic image sizes in MP (default: 0.3,2,12,50)")
+    ap.add_argument("--shape", action="append", default=[], help="extra synthetic HEIGHTxWIDTH image (repeatable)")
+    ap.add_argument("--samples", default=resource_path("samples"),
+                    help="directory of sample images to include (default: samples/)")
+    ap.add_argument("--engines", default="ifg,clahe", help=f"comma separated, from {', '.join(ENGINES)}")
+    ap.add_argument("--clips", default="1,2,4", help="clip limits (default: 1,2,4)")
+    ap.add_argument("--grids", default="8x8,16x16", help="CLAHE tile grids (default: 8x8,16x16)")
+    ap.add_argument("--repeat", type=int, default=3, help="timed runs per case (default: 3)")
+    ap.add_argument("--threads", type=int, help="OpenCV and banded NumPy threads for the run")
+    ap.add_argument("--quick", action="store_true", help="small smoke run: 0.3 and 2 MP, clip 2, 8x8, 1 run")
+    ap.add_argument("--json", help="write results as JSON to this file ('-' for stdout)")
+    ap.add_argument("--baseline", help="compare against this JSON result file")
+    ap.add_argument("--threshold", type=float, default=0.10,
+                    help="allowed slow-down vs the baseline before failing (default: 0.10)")
+    ap.add_argument("--min-delta", type=float, default=0.005,
+                    help="ignore slow-downs below this many seconds (timer noise on small cases; default: 0.005)")
+    ap.add_argument("--save-baseline", help="also write the results to this baseline file")
+    args = ap.parse_args(argv)
+
+    if args.quick:
+        args.sizes, args.clips, args.grids, args.repeat = "0.3,2", "2", "8x8", 1
+    engines = [e for e in args.engines.split(",") if e]
+    unknown = set(engines) - set(ENGINES)
+    if unknown:
+        ap.error(f"unknown engine(s): {', '.join(sorted(unknown))}")
+    if args.threads is not None:
+        cv2.setNumThreads(args.threads)
+        parallel.set_num_threads(args.threads)
+
+    images = {f"synthetic-{mp:g}MP": synthetic_mp(mp) for mp in parse_list(args.sizes)}
+    for shape in args.shape:
+        h, w = parse_shape(shape)
+        images[f"synthetic-{h}x{w}"] = synthetic(h, w)
+    images.update(sample_images(args.samples))
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = {r["id"]: r for r in json.load(f).get("results", [])}
+
+    # keep stdout clean for the JSON report when it goes there
+    log = sys.stderr if args.json == "-" else sys.stdout
+    regressions = []
+
+    def report_case(rec: Dict) -> None:
+        if compare(rec, baseline, args.threshold, args.min_delta):
+            regressions.append(rec)
+        print(_row(rec), file=log, flush=True)
+
+    print(_header(), file=log)
+    results = run_suite(images, engines, parse_list(args.clips), [parse_shape(g) for g in args.grids.split(",")],
+                        max(1, args.repeat), progress=report_case)
+
+    report = {"environment": environment(), "threshold": args.threshold, "results": results}
+    if args.json == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif args.json:
+        _write_json(args.json, report)
+    if args.save_baseline:
+        _write_json(args.save_baseline, report)
+
+    if regressions:
+        print(f"{len(regressions)} case(s) slower than the baseline by more than {args.threshold:.0%}:", file=log)
+        for rec in regressions:
+            print(f"  {rec['id']}: {rec['baseline']:.3f}s -> {rec['wall']['best']:.3f}s", file=log)
+        return 1
+    return 0
+
+
+def _write_json(path: str, report: Dict) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,128 @@
+"""Thumbnail grid: reduced-resolution decoding and responsiveness on a large folder
+
+First times making one thumbnail of a large JPEG with a reduced read
+(`thumbnails.read_reduced`) against a full decode, and a `ThumbnailStore`
+load from an empty and from a filled thumbnail directory. Then fills a
+folder with `--files` hard links to a few synthetic JPEGs (blurred, so
+they compress like photographs rather than noise), opens it in
+the window (offscreen) and reports how long the grid takes to show,
+how many thumbnails were requested before any scrolling (only the visible
+ones should be), the time until those are drawn and the longest
+event-loop stall while scrolling through the whole folder. Fails if the
+grid asks for more thumbnails than fit on screen.
+
+Usage:
+    python -m benchmarks.thumbnails [--files 10000] [--size 4000x6000] [--repeat 5]
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import cv2
+
+from src.gui import thumbnails
+from .common import parse_shape, synthetic
+
+
+def _best(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def _spin(app, seconds: float, until=None) -> float:
+    """Process events for `seconds` or until `until()`; returns the time taken"""
+    from PySide6.QtCore import QEventLoop
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < seconds and not (until and until()):
+        app.processEvents(QEventLoop.AllEvents, 10)
+    return time.perf_counter() - t0
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--files", type=int, default=10000, help="files in the folder shown in the grid")
+    ap.add_argument("--size", default="4000x6000", help="HEIGHTxWIDTH of the synthetic JPEGs")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args(argv)
+
+    h, w = parse_shape(args.size)
+    with tempfile.TemporaryDirectory() as tmp:
+        folder, cache = os.path.join(tmp, "images"), os.path.join(tmp, "cache")
+        os.makedirs(folder)
+        sources = [os.path.join(tmp, f"source{i}.jpg") for i in range(4)]
+        for i, path in enumerate(sources):
+            cv2.imwrite(path, cv2.GaussianBlur(synthetic(h, w, seed=i), (0, 0), 3))
+        for i in range(args.files):
+            os.link(sources[i % len(sources)], os.path.join(folder, f"img{i:05d}.jpg"))
+
+        path = sources[0]
+        t_full = _best(lambda: thumbnails.fit(cv2.imread(path)), args.repeat)
+        t_reduced = _best(lambda: thumbnails.fit(thumbnails.read_reduced(path)), args.repeat)
+        store = thumbnails.ThumbnailStore(os.path.join(tmp, "store"))
+        store.load(path, 2.0)  # imports and warms up the enhancement code
+
+        def cold():
+            shutil.rmtree(store.directory, ignore_errors=True)
+            store.load(path, 2.0)
+
+        t_cold = _best(cold, args.repeat)
+        t_warm = _best(lambda: store.load(path, 2.0), args.repeat)
+        print(f"thumbnail of a {w}x{h} JPEG: full decode {1e3 * t_full:.1f} ms, reduced read "
+              f"{1e3 * t_reduced:.1f} ms ({t_full / t_reduced:.1f}x); store load cold {1e3 * t_cold:.1f} ms "
+              f"(with IFG), warm {1e3 * t_warm:.1f} ms")
+
+        os.environ["XDG_CACHE_HOME"] = cache
+        from PySide6.QtWidgets import QApplication
+        app = QApplication([])
+        app.setApplicationName("ifg-thumbnail-benchmark")
+        from src.gui.window import MainWindow
+
+        requested = set()
+        request = thumbnails.ThumbnailLoader.request
+
+        def counting(self, p, clip):
+            requested.add(p)
+            request(self, p, clip)
+
+        thumbnails.ThumbnailLoader.request = counting
+        win = MainWindow()
+        win.show()
+        panel, model = win.thumbs, win.thumbs.model
+        t0 = time.perf_counter()
+        win.load_from_path(folder)
+        app.processEvents()
+        t_open = time.perf_counter() - t0
+        visible = len(requested)
+        t_drawn = t_open + _spin(app, 60, lambda: all(p in model._thumbs for p in requested))
+
+        grid = panel.grid
+        per_row = max(1, grid.viewport().width() // grid.gridSize().width())
+        on_screen = per_row * (grid.viewport().height() // grid.gridSize().height() + 2)
+        bar = grid.verticalScrollBar()
+        stalls = []
+        for value in range(0, bar.maximum() + 1, max(1, bar.maximum() // 100)):
+            t0 = time.perf_counter()
+            bar.setValue(value)
+            app.processEvents()
+            stalls.append(time.perf_counter() - t0)
+        _spin(app, 0.5)
+        win.close()
+
+    print(f"folder of {args.files} files: grid shown in {1e3 * t_open:.0f} ms, {visible} thumbnails requested "
+          f"(about {on_screen} fit on screen), drawn after {t_drawn:.2f}s")
+    print(f"scrolling through it in {len(stalls)} steps: longest stall {1e3 * max(stalls):.0f} ms, "
+          f"median {1e3 * sorted(stalls)[len(stalls) // 2]:.0f} ms")
+    return 0 if 0 < visible <= on_screen else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
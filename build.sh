@@ -2,9 +2,11 @@
 set -euo pipefail
 
 # Cross-platform build helper for PyInstaller
-# Usage: ./build.sh
+# Usage: ./build.sh            (or BUNDLE=onedir ./build.sh)
 # - Bundles ./samples into the executable if the folder exists.
-# - Produces a single-file build in ./dist/
+# - Produces a single-file build in ./dist/ by default. A --onefile binary
+#   unpacks itself to a temp dir on every launch; BUNDLE=onedir builds
+#   ./dist/<name>/ instead, which starts noticeably faster.
 # Notes:
 # - Run this script with a Python environment where pyinstaller is installed.
 # - On Windows run from Git Bash / MSYS2 / WSL or adapt to a PowerShell script.
@@ -14,6 +16,7 @@ ENTRY="main.py"
 DIST_DIR="./dist"
 BUILD_DIR="./build"
 SPEC_FILE="${APP_NAME}.spec"
+BUNDLE="${BUNDLE:-onefile}"
 
 OS_UNAME="$(uname -s || echo Unknown)"
 
@@ -32,7 +35,12 @@ is_linux() {
     [[ "${OS_UNAME}" == "Linux" ]]
 }
 
-pyinstaller_common_flags=(--onefile --name "${APP_NAME}" --distpath "${DIST_DIR}" --workpath "${BUILD_DIR}" --optimize 2 --clean --noconsole)
+case "${BUNDLE}" in
+    onefile|onedir) ;;
+    *) echo "Error: BUNDLE must be onefile or onedir"; exit 1 ;;
+esac
+
+pyinstaller_common_flags=("--${BUNDLE}" --name "${APP_NAME}" --distpath "${DIST_DIR}" --workpath "${BUILD_DIR}" --optimize 2 --clean --noconsole)
 pyinstaller_unix_flags=(--strip)
 
 rm -rf "${DIST_DIR}" "${BUILD_DIR}" "${SPEC_FILE}"
@@ -65,10 +73,14 @@ else
     fi
 fi
 
+EXE_DIR="${DIST_DIR}"
+if [ "${BUNDLE}" == "onedir" ]; then
+    EXE_DIR="${DIST_DIR}/${APP_NAME}"
+fi
 if is_windows; then
-    EXE_PATH="${DIST_DIR}/${APP_NAME}.exe"
+    EXE_PATH="${EXE_DIR}/${APP_NAME}.exe"
 else
-    EXE_PATH="${DIST_DIR}/${APP_NAME}"
+    EXE_PATH="${EXE_DIR}/${APP_NAME}"
     if [ -f "${EXE_PATH}" ]; then
         chmod +x "${EXE_PATH}" || true
     fi
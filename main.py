@@ -1,11 +1,17 @@
-"""Application entrypoint"""
+"""Application entrypoint
+
+Qt and the window are imported inside `main` so that importing this module
+(e.g. from a process-pool worker or a frozen bundle's bootstrap) is cheap;
+the window itself defers OpenCV and the enhancement pipeline.
+"""
 
 import sys
-from PySide6.QtWidgets import QApplication
-from src.gui.window import MainWindow
 
 
 def main(argv=None):
+    from PySide6.QtWidgets import QApplication
+    from src.gui.window import MainWindow
+
     app = QApplication(sys.argv if argv is None else argv)
     app.setApplicationName("IFG-based Contrast Enhancement")
     win = MainWindow()
@@ -1,3 +1,7 @@
-"""Top-level package for the project"""
+"""Top-level package for the project
 
-__all__ = ["enhancements", "gui", "utils"]
+`enhancements`, `utils` and `cli` are headless. `gui` needs PySide6 and
+is only imported by the desktop entry point (`main.py`).
+"""
+
+__all__ = ["cli", "enhancements", "utils"]
@@ -0,0 +1,30 @@
+"""Headless command-line entry point (`ifg-enhance`)
+
+Each sub-command lives in its own module exposing `add_parser(subparsers)`,
+which registers the command and sets `run(args) -> int` as its handler.
+None of them import the Qt GUI.
+"""
+
+import argparse
+from typing import Optional, Sequence
+
+from . import batch, serve, spool, tiled, video
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="ifg-enhance",
+        description="Headless IFG + CLAHE contrast enhancement",
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+    batch.add_parser(sub)
+    serve.add_parser(sub)
+    spool.add_parser(sub)
+    tiled.add_parser(sub)
+    video.add_parser(sub)
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.run(args)
@@ -0,0 +1,5 @@
+"""Allow `python -m src.cli`"""
+
+from . import main
+
+raise SystemExit(main())
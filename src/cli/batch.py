@@ -0,0 +1,299 @@
+"""`ifg-enhance batch`: enhance many files on a process pool
+
+Inputs may be files, directories or glob patterns. Each output is written
+as `<stem>_ifg.png` (the GUI's save naming) next to the input or into
+`--output-dir`; outputs newer than their input are skipped unless
+`--force` is given.
+
+With `--sweep 1,2,4` every image is enhanced at each of those clip limits
+(sharing the clip-independent work, see `enhancements.sweep`); the result
+with the highest entropy is written, the log records the entropy of every
+clip, and a per-clip summary over all images is printed at the end.
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterable, List, Optional
+
+import cv2
+import numpy as np
+
+from src.enhancements import CLAHEEnhancer, IFGEnhancer, clahe, ifg, parallel, sweep
+from src.enhancements.search import make_search
+from src.enhancements.timing import StageTimer, percentiles
+from src.utils import imageio
+from src.utils.cache import ResultCache, image_digest
+from .common import add_enhance_args, parse_size, search_from_args
+
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff")
+
+# per-process disk cache, set up by the pool initializer
+_cache: Optional[ResultCache] = None
+# per-process enhancers reusing their buffers across same-sized images
+_ifg_enhancers: Dict = {}
+_clahe_enhancer = CLAHEEnhancer()
+
+
+def collect_inputs(patterns: Iterable[str], recursive: bool = False) -> List[str]:
+    """Expand files, directories and glob patterns into a sorted list of image paths"""
+    found = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            sub = os.path.join("**", "*") if recursive else "*"
+            candidates = glob.glob(os.path.join(glob.escape(pattern), sub), recursive=recursive)
+        elif os.path.isfile(pattern):
+            candidates = [pattern]
+        else:
+            candidates = glob.glob(pattern, recursive=True)
+        found.extend(p for p in candidates
+                     if os.path.isfile(p) and p.lower().endswith(IMAGE_EXTENSIONS))
+    return sorted(set(os.path.normpath(p) for p in found))
+
+
+def output_path(src: str, out_dir: Optional[str] = None, suffix: str = "_ifg", ext: str = ".png") -> str:
+    base = os.path.basename(src).rsplit(".", 1)[0]
+    dir_ = out_dir if out_dir is not None else os.path.dirname(src)
+    return os.path.join(dir_, f"{base}{suffix}{ext}")
+
+
+def is_up_to_date(src: str, dst: str) -> bool:
+    return os.path.exists(dst) and os.path.getmtime(dst) >= os.path.getmtime(src)
+
+
+def process_one(job: Dict) -> Dict:
+    """Enhance a single file; runs inside a pool worker and returns its log record"""
+    record = {"input": job["input"], "output": job["output"]}
+    timings = {}
+    try:
+        t0 = time.perf_counter()
+        img = imageio.read(job["input"])
+        timings["read"] = time.perf_counter() - t0
+        if img is None:
+            raise ValueError("could not decode image")
+
+        stats = {}
+        timer = StageTimer()
+        clip = job["clip"]
+        search = make_search(**job["search"])
+        digest = image_digest(img) if _cache is not None else None
+        t0 = time.perf_counter()
+        if job.get("sweep"):
+            # the result cache holds single-clip results; sweeps bypass it
+            prepared = sweep.prepare(img, search, timer)
+            results = sweep.enhance_sweep(img, job["sweep"], workers=1, prepared=prepared, timer=timer)
+            chosen = sweep.best(results)
+            out, k, clip = chosen.image, chosen.k, chosen.clip
+            stats["evaluations"] = prepared.evaluations
+            record.update(clip=chosen.clip, sweep=[{"clip": r.clip, "entropy": r.entropy} for r in results])
+        elif _cache is not None:
+            out, k = _cache.ifg(img, clip=clip, search=search, digest=digest, stats=stats, timer=timer)
+            record["cached"] = stats["cached"]
+        elif img.dtype != np.uint8:
+            # the buffered enhancers are 8-bit only
+            out, k = ifg.enhance(img, clip=clip, search=search, stats=stats, timer=timer)
+        else:
+            enhancer = _ifg_enhancers.get(search)
+            if enhancer is None:
+                enhancer = _ifg_enhancers[search] = IFGEnhancer(search=search)
+            out, k = enhancer.enhance(img, clip=clip, stats=stats, timer=timer)
+        timings["ifg"] = time.perf_counter() - t0
+        record["stages"] = timer.summary()
+
+        if job.get("clahe_output"):
+            t0 = time.perf_counter()
+            if _cache is not None:
+                clahe_img = _cache.clahe(img, clip=clip, digest=digest)
+            elif img.dtype != np.uint8:
+                clahe_img = clahe.apply(img, clip=clip)
+            else:
+                # separate buffers from the IFG output, which is still to be written
+                clahe_img = _clahe_enhancer.apply(img, clip=clip)
+            timings["clahe"] = time.perf_counter() - t0
+        else:
+            clahe_img = None
+
+        t0 = time.perf_counter()
+        _write(job["output"], out)
+        if clahe_img is not None:
+            _write(job["clahe_output"], clahe_img)
+        timings["write"] = time.perf_counter() - t0
+
+        record.update(status="ok", k=k, evaluations=stats["evaluations"],
+                      megapixels=img.shape[0] * img.shape[1] / 1e6)
+    except Exception as exc:
+        record.update(status="error", error=str(exc))
+    record["timings"] = timings
+    return record
+
+
+def _write(path: str, img) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if not imageio.write(path, img):
+        raise OSError(f"could not write {path}")
+
+
+def _init_worker(cache_dir: Optional[str] = None, cache_bytes: int = 0) -> None:
+    global _cache
+    # one process per core already; keep OpenCV and the banded NumPy work from oversubscribing them
+    cv2.setNumThreads(1)
+    parallel.set_num_threads(1)
+    if cache_dir is not None:
+        _cache = ResultCache(max_bytes=0, directory=cache_dir, max_disk_bytes=cache_bytes)
+
+
+def add_parser(sub) -> argparse.ArgumentParser:
+    p = sub.add_parser("batch", help="enhance files, directories or globs in parallel",
+                       description=__doc__.splitlines()[0])
+    add_job_args(p)
+    p.add_argument("-j", "--workers", type=int, default=None,
+                   help="worker processes (default: number of cores)")
+    p.add_argument("--log", help="append one JSON record per image to this file ('-' for stdout)")
+    p.add_argument("--profile", action="store_true",
+                   help="print p50/p90/p99 of each IFG stage (and read/write) across the images")
+    p.add_argument("--cache-dir", help="reuse results of identical images and settings from this directory")
+    p.add_argument("--cache-size", type=parse_size, default=4 * 2**30,
+                   help="size limit of the cache directory, e.g. 20G (default: 4G)")
+    p.set_defaults(run=run)
+    return p
+
+
+def add_job_args(p: argparse.ArgumentParser) -> None:
+    """Inputs, outputs and enhancement options of a batch of files (shared with `spool submit`)"""
+    p.add_argument("inputs", nargs="+", help="image files, directories or glob patterns")
+    p.add_argument("-o", "--output-dir", help="write outputs here instead of next to the inputs")
+    p.add_argument("-r", "--recursive", action="store_true", help="descend into sub-directories")
+    add_enhance_args(p)
+    p.add_argument("--suffix", default="_ifg", help="output name suffix (default: _ifg)")
+    p.add_argument("--ext", default=".png", help="output extension (default: .png)")
+    p.add_argument("--clahe", action="store_true", help="also write the plain CLAHE result (<stem>_clahe)")
+    p.add_argument("--sweep", type=_parse_clips, metavar="CLIPS",
+                   help="try these clip limits (e.g. 1,2,3,4) and keep the highest-entropy result of each image")
+    p.add_argument("--force", action="store_true", help="re-process inputs whose outputs are up to date")
+
+
+def make_job(src: str, args: argparse.Namespace) -> Dict:
+    """The `process_one` job for input `src` under the options of `add_job_args`"""
+    job = {
+        "input": src,
+        "output": output_path(src, args.output_dir, args.suffix, args.ext),
+        "clip": args.clip,
+        "search": {"search": args.search, "tol": args.tol, "max_evals": args.max_evals},
+    }
+    if args.sweep:
+        job["sweep"] = args.sweep
+    if args.clahe:
+        job["clahe_output"] = output_path(src, args.output_dir, "_clahe", args.ext)
+    return job
+
+
+def _parse_clips(text: str) -> List[float]:
+    try:
+        clips = [float(c) for c in text.split(",") if c.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid clip list {text!r}") from None
+    if not clips or min(clips) <= 0:
+        raise argparse.ArgumentTypeError("clip limits must be positive")
+    return clips
+
+
+def run(args: argparse.Namespace) -> int:
+    search_from_args(args)  # fail early on bad options
+    inputs = collect_inputs(args.inputs, args.recursive)
+    if not inputs:
+        print("ifg-enhance: no input images found", file=sys.stderr)
+        return 1
+
+    jobs, records = [], []
+    for src in inputs:
+        job = make_job(src, args)
+        if not args.force and is_up_to_date(src, job["output"]):
+            records.append({"input": src, "output": job["output"], "status": "skipped"})
+        else:
+            jobs.append(job)
+
+    log = _open_log(args.log)
+    try:
+        for rec in records:
+            _emit(log, rec)
+        workers = args.workers or os.cpu_count() or 1
+        t0 = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(args.cache_dir, args.cache_size)) as pool:
+            futures = [pool.submit(process_one, job) for job in jobs]
+            for fut in as_completed(futures):
+                rec = fut.result()
+                records.append(rec)
+                _emit(log, rec)
+                if rec["status"] == "error":
+                    print(f"ifg-enhance: {rec['input']}: {rec['error']}", file=sys.stderr)
+        elapsed = time.perf_counter() - t0
+    finally:
+        if log not in (None, sys.stdout):
+            log.close()
+
+    _print_summary(records, elapsed, workers)
+    if args.profile:
+        _print_profile(records)
+    if args.sweep:
+        _print_sweep(records, args.sweep)
+    return 1 if any(r["status"] == "error" for r in records) else 0
+
+
+def _open_log(path: Optional[str]):
+    if path is None:
+        return None
+    if path == "-":
+        return sys.stdout
+    return open(path, "a", encoding="utf-8")
+
+
+def _emit(log, record: Dict) -> None:
+    if log is not None:
+        log.write(json.dumps(record) + "\n")
+        log.flush()
+
+
+def _print_summary(records: List[Dict], elapsed: float, workers: int) -> None:
+    done = [r for r in records if r["status"] == "ok"]
+    skipped = sum(r["status"] == "skipped" for r in records)
+    failed = sum(r["status"] == "error" for r in records)
+    cached = sum(bool(r.get("cached")) for r in done)
+    mp = sum(r["megapixels"] for r in done)
+    rate = len(done) / elapsed if elapsed > 0 else 0.0
+    mp_rate = mp / elapsed if elapsed > 0 else 0.0
+    print(f"processed {len(done)} images ({mp:.1f} MP) in {elapsed:.2f}s on {workers} workers: "
+          f"{rate:.2f} images/s, {mp_rate:.2f} MP/s; skipped {skipped}, failed {failed}, cache hits {cached}",
+          file=sys.stderr)
+
+
+def _print_profile(records: List[Dict]) -> None:
+    samples = []
+    for r in records:
+        if r["status"] != "ok" or not r.get("stages"):
+            continue  # cache hits ran no stages
+        sample = {name: entry["seconds"] for name, entry in r["stages"].items()}
+        sample.update(read=r["timings"]["read"], write=r["timings"]["write"])
+        samples.append(sample)
+    if not samples:
+        return
+    print(f"{'stage':<16}{'p50 [ms]':>10}{'p90 [ms]':>10}{'p99 [ms]':>10}{'n':>6}", file=sys.stderr)
+    for name, q in percentiles(samples).items():
+        print(f"{name:<16}{q['p50'] * 1e3:>10.1f}{q['p90'] * 1e3:>10.1f}{q['p99'] * 1e3:>10.1f}{q['n']:>6}",
+              file=sys.stderr)
+
+
+def _print_sweep(records: List[Dict], clips: List[float]) -> None:
+    swept = [r for r in records if r["status"] == "ok" and r.get("sweep")]
+    if not swept:
+        return
+    print(f"{'clip':>8}{'mean entropy':>14}{'best for':>10}", file=sys.stderr)
+    for clip in clips:
+        entropies = [e["entropy"] for r in swept for e in r["sweep"] if e["clip"] == clip]
+        wins = sum(r["clip"] == clip for r in swept)
+        print(f"{clip:>8g}{sum(entropies) / len(entropies):>14.3f}{wins:>10}", file=sys.stderr)
@@ -0,0 +1,34 @@
+"""Argument helpers shared by the sub-commands"""
+
+import argparse
+
+from src.enhancements.search import STRATEGIES, KSearch, make_search
+
+
+_UNITS = {"": 1, "K": 2**10, "M": 2**20, "G": 2**30}
+
+
+def parse_size(text: str) -> int:
+    """Parse a byte count such as `512M` or `2G`"""
+    t = text.strip().upper().rstrip("B").rstrip("I")
+    unit = t[-1] if t and t[-1] in _UNITS else ""
+    try:
+        return int(float(t[:len(t) - len(unit)]) * _UNITS[unit])
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid size {text!r}") from None
+
+
+def add_enhance_args(p: argparse.ArgumentParser) -> None:
+    """--clip and the k search options"""
+    p.add_argument("--clip", type=float, default=2.0, help="CLAHE clip limit (default: 2.0)")
+    p.add_argument("--search", choices=sorted(STRATEGIES), default="grid", help="k search strategy")
+    p.add_argument("--tol", type=float, default=None, help="k search tolerance")
+    p.add_argument("--max-evals", type=int, default=None, help="k search evaluation budget")
+
+
+def search_from_args(args: argparse.Namespace) -> KSearch:
+    """The k search of the options; exits with a message on invalid --tol/--max-evals"""
+    try:
+        return make_search(args.search, args.tol, args.max_evals)
+    except ValueError as exc:
+        raise SystemExit(f"ifg-enhance: {exc}") from None
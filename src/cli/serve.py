@@ -0,0 +1,43 @@
+"""`ifg-enhance serve`: local HTTP enhancement service
+
+Listens on localhost (or a Unix socket) and enhances posted images on a
+process pool; see `src.service.server` for the endpoints.
+"""
+
+import argparse
+import sys
+
+from .common import parse_size
+
+
+def add_parser(sub) -> argparse.ArgumentParser:
+    p = sub.add_parser("serve", help="run a local enhancement service over HTTP",
+                       description=__doc__.splitlines()[0])
+    p.add_argument("--host", default="127.0.0.1", help="address to bind (default: 127.0.0.1)")
+    p.add_argument("--port", type=int, default=8765, help="TCP port (default: 8765)")
+    p.add_argument("--unix", help="listen on this Unix socket instead of TCP")
+    p.add_argument("-j", "--workers", type=int, default=None,
+                   help="worker processes (default: number of cores)")
+    p.add_argument("--queue", type=int, default=64,
+                   help="requests allowed to wait before new ones get 429 (default: 64)")
+    p.add_argument("--max-batch", type=int, default=8,
+                   help="largest micro-batch of small requests per pool task (default: 8)")
+    p.add_argument("--batch-bytes", type=parse_size, default=2**20,
+                   help="bodies up to this size are batched, e.g. 512K (default: 1M)")
+    p.add_argument("--batch-window-ms", type=float, default=2.0,
+                   help="how long a lone small request waits for others to batch with (default: 2)")
+    p.add_argument("--max-body", type=parse_size, default=256 * 2**20,
+                   help="largest accepted request body (default: 256M)")
+    p.set_defaults(run=run)
+    return p
+
+
+def run(args: argparse.Namespace) -> int:
+    from src.service.server import EnhanceServer
+
+    server = EnhanceServer(host=args.host, port=args.port, unix_path=args.unix, workers=args.workers,
+                           queue_size=args.queue, max_batch=args.max_batch, batch_bytes=args.batch_bytes,
+                           batch_window=args.batch_window_ms / 1000, max_body=args.max_body)
+    server.run(on_ready=lambda s: print(f"ifg-enhance: serving on {s.address} with {s.workers} workers",
+                                        file=sys.stderr, flush=True))
+    return 0
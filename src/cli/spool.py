@@ -0,0 +1,158 @@
+"""`ifg-enhance spool`: a shared-directory work queue for batch runs
+
+    ifg-enhance spool submit SPOOL photos/ -o enhanced/ --clip 2.0
+    ifg-enhance spool work SPOOL -j 8          # on every machine
+    ifg-enhance spool status SPOOL
+    ifg-enhance spool manifest SPOOL -o manifest.jsonl
+
+`submit` takes the inputs and options of `batch` and queues one job per
+image (resubmitting is a no-op, except for failed jobs, which are queued
+again). `work` processes jobs until the spool is drained; any number of
+`work` commands, on any hosts sharing the directory, may run at once,
+and killed ones are made up for by the others (see `src.spool`).
+`status` reports progress and the throughput of each worker, and
+`manifest` prints the result record (k, timings, worker) of every job.
+"""
+
+import argparse
+import json
+import sys
+import time
+from typing import Dict, List
+
+from src.spool.store import DEFAULT_LEASE, DEFAULT_MAX_ATTEMPTS, Spool
+from . import batch
+from .common import parse_size, search_from_args
+
+
+def add_parser(sub) -> argparse.ArgumentParser:
+    p = sub.add_parser("spool", help="queue, process and monitor batch jobs in a shared directory",
+                       description=__doc__.splitlines()[0])
+    commands = p.add_subparsers(dest="spool_command", required=True)
+
+    s = commands.add_parser("submit", help="queue one job per input image")
+    s.add_argument("spool", help="spool directory (created if missing)")
+    batch.add_job_args(s)
+    s.set_defaults(run=run_submit)
+
+    w = commands.add_parser("work", help="process jobs until the spool is drained")
+    w.add_argument("spool", help="spool directory")
+    w.add_argument("-j", "--workers", type=int, default=1, help="local worker processes (default: 1)")
+    w.add_argument("--lease", type=float, default=DEFAULT_LEASE,
+                   help=f"seconds without a heartbeat after which a job is requeued (default: {DEFAULT_LEASE:g})")
+    w.add_argument("--heartbeat", type=float, default=None, help="seconds between heartbeats (default: lease / 6)")
+    w.add_argument("--poll", type=float, default=1.0, help="seconds between checks for work (default: 1)")
+    w.add_argument("--wait", action="store_true", help="keep waiting for new jobs instead of exiting when drained")
+    w.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS,
+                   help=f"fail a job after this many lost workers (default: {DEFAULT_MAX_ATTEMPTS})")
+    w.add_argument("--cache-dir", help="reuse results of identical images and settings from this directory")
+    w.add_argument("--cache-size", type=parse_size, default=4 * 2**30,
+                   help="size limit of the cache directory, e.g. 20G (default: 4G)")
+    w.set_defaults(run=run_work)
+
+    st = commands.add_parser("status", help="show progress and per-worker throughput")
+    st.add_argument("spool", help="spool directory")
+    st.set_defaults(run=run_status)
+
+    m = commands.add_parser("manifest", help="print the result record of every finished job as JSON lines")
+    m.add_argument("spool", help="spool directory")
+    m.add_argument("-o", "--output", help="write to this file instead of stdout")
+    m.add_argument("--failed", action="store_true", help="also include the failed jobs")
+    m.set_defaults(run=run_manifest)
+    return p
+
+
+def _open(args: argparse.Namespace) -> Spool:
+    spool = Spool(args.spool)
+    if not spool.exists():
+        raise SystemExit(f"ifg-enhance: {args.spool} is not a spool directory")
+    return spool
+
+
+def run_submit(args: argparse.Namespace) -> int:
+    search_from_args(args)  # fail early on bad options
+    inputs = batch.collect_inputs(args.inputs, args.recursive)
+    if not inputs:
+        print("ifg-enhance: no input images found", file=sys.stderr)
+        return 1
+    jobs, fresh = [], 0
+    for src in inputs:
+        job = batch.make_job(src, args)
+        if not args.force and batch.is_up_to_date(src, job["output"]):
+            fresh += 1
+        else:
+            jobs.append(job)
+    queued, skipped = Spool(args.spool).submit(jobs, force=args.force)
+    print(f"queued {queued} jobs in {args.spool}; skipped {skipped} already queued or done, "
+          f"{fresh} up to date", file=sys.stderr)
+    return 0
+
+
+def run_work(args: argparse.Namespace) -> int:
+    from src.spool.worker import run_workers, work
+
+    _open(args)
+    options = dict(lease=args.lease, heartbeat=args.heartbeat, poll=args.poll, wait=args.wait,
+                   max_attempts=args.max_attempts, cache_dir=args.cache_dir, cache_size=args.cache_size)
+    t0 = time.perf_counter()
+    if args.workers <= 1:
+        info = work(args.spool, **options)
+        codes = [0]
+        print(f"{info['worker']}: {info['done']} done, {info['failed']} failed, {info['megapixels']:.1f} MP "
+              f"in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+    else:
+        codes = run_workers(args.spool, args.workers, **options)
+        print(f"{args.workers} workers finished in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+    return 0 if all(code == 0 for code in codes) else 1
+
+
+def _worker_rows(workers: List[Dict]) -> List[str]:
+    rows = [f"{'worker':<24}{'state':<9}{'done':>7}{'failed':>8}{'MP':>10}{'images/s':>10}{'MP/s':>8}"
+            f"{'busy':>7}{'last seen':>11}"]
+    for w in sorted(workers, key=lambda w: w["worker"]):
+        state = w["state"]
+        if state != "stopped" and w["age"] > w.get("lease", DEFAULT_LEASE):
+            state = "lost"
+        elapsed = max(w["updated"] - w["started"], 1e-9)
+        rows.append(f"{w['worker']:<24}{state:<9}{w['done']:>7}{w['failed']:>8}{w['megapixels']:>10.1f}"
+                    f"{w['done'] / elapsed:>10.2f}{w['megapixels'] / elapsed:>8.2f}"
+                    f"{100 * w['busy'] / elapsed:>6.0f}%{w['age']:>9.0f}s ago")
+    return rows
+
+
+def run_status(args: argparse.Namespace) -> int:
+    spool = _open(args)
+    counts = spool.counts()
+    total = sum(counts.values())
+    finished = counts["done"] + counts["failed"]
+    print(f"{args.spool}: {total} jobs, {counts['done']} done, {counts['claimed']} running, "
+          f"{counts['pending']} pending, {counts['failed']} failed "
+          f"({100 * finished / total if total else 100:.1f}% finished)")
+    workers = spool.workers()
+    if workers:
+        print("\n".join(_worker_rows(workers)))
+
+    records = list(spool.records())
+    if records:
+        span = max(r["finished"] for r in records) - min(r["started"] for r in records)
+        rate = len(records) / span if span > 0 else 0.0
+        mp = sum(r.get("megapixels", 0.0) for r in records)
+        line = f"overall: {rate:.2f} images/s, {mp / span if span > 0 else 0.0:.2f} MP/s"
+        left = counts["pending"] + counts["claimed"]
+        if left and rate > 0:
+            line += f"; about {left / rate / 60:.1f} min left at this rate"
+        print(line)
+    return 0
+
+
+def run_manifest(args: argparse.Namespace) -> int:
+    spool = _open(args)
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for state in ("done", "failed") if args.failed else ("done",):
+            for record in spool.records(state):
+                out.write(json.dumps(record) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
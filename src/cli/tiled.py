@@ -0,0 +1,50 @@
+"""`ifg-enhance tiled`: out-of-core enhancement of memory-mapped images
+
+The input is a `.npy` file or raw interleaved BGR bytes (with `--shape`);
+the output is created as a memory map of the same kind, chosen by its
+extension.
+"""
+
+import argparse
+import sys
+import time
+
+from src.enhancements.tiled import DEFAULT_MEMORY_BUDGET, create_output, enhance_tiled, open_image
+from .common import add_enhance_args, parse_size, search_from_args
+
+
+def parse_shape(text: str):
+    h, w = (int(x) for x in text.lower().split("x"))
+    return h, w
+
+
+def add_parser(sub) -> argparse.ArgumentParser:
+    p = sub.add_parser("tiled", help="enhance a memory-mapped image too large for RAM",
+                       description=__doc__.splitlines()[0])
+    p.add_argument("input", help="input .npy file or raw BGR bytes")
+    p.add_argument("output", help="output .npy file or raw path")
+    p.add_argument("--shape", type=parse_shape, help="HEIGHTxWIDTH of a raw input")
+    p.add_argument("--memory", type=parse_size, default=DEFAULT_MEMORY_BUDGET,
+                   help="working memory budget, e.g. 512M (default: 256M)")
+    add_enhance_args(p)
+    p.set_defaults(run=run)
+    return p
+
+
+def run(args: argparse.Namespace) -> int:
+    search = search_from_args(args)
+    stats = {}
+    try:
+        src = open_image(args.input, args.shape)
+        dst = create_output(args.output, src.shape)
+        t0 = time.perf_counter()
+        enhance_tiled(src, dst, clip=args.clip, search=search, memory_budget=args.memory, stats=stats)
+        elapsed = time.perf_counter() - t0
+    except (OSError, ValueError) as exc:
+        print(f"ifg-enhance: {exc}", file=sys.stderr)
+        return 1
+    mp = src.shape[0] * src.shape[1] / 1e6
+    print(f"enhanced {src.shape[1]}x{src.shape[0]} ({mp:.1f} MP) in {elapsed:.2f}s "
+          f"({mp / elapsed:.2f} MP/s), k = {stats['k']:.3f}, {stats['strip_rows']} rows per strip",
+          file=sys.stderr)
+    return 0
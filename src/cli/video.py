@@ -0,0 +1,280 @@
+"""`ifg-enhance video`: enhance a video file or camera stream
+
+Frames flow through a pipeline of threads joined by bounded queues:
+
+    decode -> analyse (histogram, temporal k) -> enhance (N workers) -> encode
+
+OpenCV releases the GIL while decoding, converting and encoding, so the
+stages overlap on a multicore CPU. The encoder restores frame order. In
+`realtime` mode the decoder drops frames instead of blocking when the
+pipeline is full, and file sources are paced at their native frame rate
+to behave like a live source.
+"""
+
+import argparse
+import queue
+import sys
+import threading
+import time
+from typing import Dict, Optional, Union
+
+import cv2
+import numpy as np
+
+from src.enhancements.search import KSearch, make_search
+from src.enhancements.stream import FrameEnhancer
+from .common import add_enhance_args, search_from_args
+
+
+_END = None
+_POLL = 0.1
+
+
+class _Stage:
+    """Bounded queue feeding one pipeline stage, with depth statistics"""
+
+    def __init__(self, name: str, maxsize: int):
+        self.name = name
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.samples = 0
+        self.depth_sum = 0
+        self.depth_max = 0
+
+    def put(self, item, stop: threading.Event) -> bool:
+        while not stop.is_set():
+            try:
+                self.queue.put(item, timeout=_POLL)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def get(self, stop: threading.Event):
+        while not stop.is_set():
+            try:
+                item = self.queue.get(timeout=_POLL)
+            except queue.Empty:
+                continue
+            depth = self.queue.qsize()
+            self.samples += 1
+            self.depth_sum += depth
+            self.depth_max = max(self.depth_max, depth)
+            return item
+        return _END
+
+    def summary(self) -> Dict[str, float]:
+        mean = self.depth_sum / self.samples if self.samples else 0.0
+        return {"mean": round(mean, 2), "max": self.depth_max, "capacity": self.queue.maxsize}
+
+
+def process_video(source: Union[str, int], output: Optional[str] = None, clip: float = 2.0,
+                  search: Union[str, KSearch, None] = None, workers: int = 2, queue_size: int = 8,
+                  drift: float = 0.1, smoothing: float = 0.0, realtime: bool = False,
+                  max_latency: float = 0.5, fourcc: str = "mp4v", progress=None) -> Dict:
+    """
+    Enhance every frame of `source` (a path or camera index) into `output`.
+
+    Parameters
+    ----------
+    output : str, optional
+        Video file to write; frames are enhanced but discarded when omitted.
+    workers : int
+        Number of enhancement threads.
+    queue_size : int
+        Capacity of each inter-stage queue.
+    drift, smoothing
+        Temporal k reuse settings, see `FrameEnhancer`.
+    realtime : bool
+        Pace decoding at the source frame rate and drop frames at the
+        decoder when the pipeline is full.
+    max_latency : float
+        Frames spending longer than this (seconds) between decode and
+        encode are counted as late.
+    progress : callable, optional
+        Called as `progress(frames_written)` from the encoder thread.
+
+    Returns
+    -------
+    dict
+        Frame counts (frames, dropped, late, searches), throughput, latency
+        and per-stage queue depth statistics.
+    """
+    # everything that validates options comes first, so a bad option never leaves the source open
+    workers = max(1, int(workers))
+    enhancer = FrameEnhancer(clip=clip, search=make_search(search), drift=drift, smoothing=smoothing)
+    stages = {name: _Stage(name, queue_size) for name in ("analyse", "enhance", "encode")}
+
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        cap.release()
+        raise OSError(f"could not open video source {source!r}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    stop = threading.Event()
+    errors = []
+    counts = {"frames": 0, "dropped": 0, "late": 0}
+    latencies = []
+
+    def guarded(fn):
+        def body():
+            try:
+                fn()
+            except Exception as exc:
+                errors.append(exc)
+                stop.set()
+        return body
+
+    def decode():
+        idx = 0
+        read = 0
+        start = time.perf_counter()
+        while not stop.is_set():
+            if realtime:
+                # pace file sources at their native rate; live sources block in read()
+                delay = start + read / fps - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            ok, frame = cap.read()
+            if not ok:
+                break
+            read += 1
+            item = (idx, frame, time.perf_counter())
+            if realtime:
+                try:
+                    stages["analyse"].queue.put_nowait(item)
+                except queue.Full:
+                    counts["dropped"] += 1
+                    continue
+            elif not stages["analyse"].put(item, stop):
+                break
+            idx += 1
+        stages["analyse"].put(_END, stop)
+
+    def analyse():
+        while True:
+            item = stages["analyse"].get(stop)
+            if item is _END:
+                break
+            idx, frame, t = item
+            if not stages["enhance"].put((idx, enhancer.prepare(frame), t), stop):
+                break
+        for _ in range(workers):
+            stages["enhance"].put(_END, stop)
+
+    def enhance():
+        while True:
+            item = stages["enhance"].get(stop)
+            if item is _END:
+                break
+            idx, prepared, t = item
+            if not stages["encode"].put((idx, enhancer.finish(prepared), t), stop):
+                break
+        stages["encode"].put(_END, stop)
+
+    def encode():
+        writer = None
+        pending = {}
+        expected = 0
+        finished = 0
+        try:
+            while finished < workers:
+                item = stages["encode"].get(stop)
+                if item is _END:
+                    if stop.is_set():
+                        break
+                    finished += 1
+                    continue
+                pending[item[0]] = item
+                while expected in pending:
+                    _, frame, t = pending.pop(expected)
+                    if output is not None:
+                        if writer is None:
+                            h, w = frame.shape[:2]
+                            writer = cv2.VideoWriter(output, cv2.VideoWriter_fourcc(*fourcc), fps, (w, h))
+                            if not writer.isOpened():
+                                raise OSError(f"could not open video writer for {output!r}")
+                        writer.write(frame)
+                    latency = time.perf_counter() - t
+                    latencies.append(latency)
+                    if latency > max_latency:
+                        counts["late"] += 1
+                    counts["frames"] += 1
+                    expected += 1
+                    if progress is not None:
+                        progress(counts["frames"])
+        finally:
+            if writer is not None:
+                writer.release()
+
+    threads = [threading.Thread(target=guarded(decode), name="decode"),
+               threading.Thread(target=guarded(analyse), name="analyse"),
+               *(threading.Thread(target=guarded(enhance), name=f"enhance-{i}") for i in range(workers)),
+               threading.Thread(target=guarded(encode), name="encode")]
+    t0 = time.perf_counter()
+    try:
+        for th in threads:
+            th.start()
+        for th in threads:
+            while th.is_alive():
+                th.join(timeout=_POLL)
+    except KeyboardInterrupt:
+        stop.set()
+        for th in threads:
+            th.join()
+    finally:
+        cap.release()
+    elapsed = time.perf_counter() - t0
+    if errors:
+        raise errors[0]
+
+    lat = np.array(latencies) if latencies else np.zeros(1)
+    return {
+        **counts,
+        "searches": enhancer.searches,
+        "evaluations": enhancer.evaluations,
+        "elapsed": elapsed,
+        "fps": counts["frames"] / elapsed if elapsed > 0 else 0.0,
+        "source_fps": fps,
+        "latency": {"mean": float(lat.mean()), "p95": float(np.percentile(lat, 95)), "max": float(lat.max())},
+        "queues": {name: stage.summary() for name, stage in stages.items()},
+    }
+
+
+def _source(text: str) -> Union[str, int]:
+    return int(text) if text.isdigit() else text
+
+
+def add_parser(sub) -> argparse.ArgumentParser:
+    p = sub.add_parser("video", help="enhance a video file or camera stream",
+                       description=__doc__.splitlines()[0])
+    p.add_argument("source", type=_source, help="video file, stream URL or camera index")
+    p.add_argument("-o", "--output", help="output video file (omit to only measure)")
+    p.add_argument("-j", "--workers", type=int, default=2, help="enhancement threads (default: 2)")
+    p.add_argument("--queue-size", type=int, default=8, help="capacity of each stage queue (default: 8)")
+    add_enhance_args(p)
+    p.add_argument("--drift", type=float, default=0.1,
+                   help="histogram drift that triggers a new k search (default: 0.1)")
+    p.add_argument("--smoothing", type=float, default=0.0,
+                   help="weight of the previous k when k changes (default: 0)")
+    p.add_argument("--realtime", action="store_true", help="drop frames instead of blocking when behind")
+    p.add_argument("--max-latency", type=float, default=0.5,
+                   help="decode-to-encode latency counted as late, in seconds (default: 0.5)")
+    p.add_argument("--fourcc", default="mp4v", help="output codec (default: mp4v)")
+    p.set_defaults(run=run)
+    return p
+
+
+def run(args: argparse.Namespace) -> int:
+    search = search_from_args(args)
+    try:
+        stats = process_video(args.source, args.output, clip=args.clip, search=search, workers=args.workers,
+                              queue_size=args.queue_size, drift=args.drift, smoothing=args.smoothing,
+                              realtime=args.realtime, max_latency=args.max_latency, fourcc=args.fourcc)
+    except (OSError, ValueError) as exc:
+        print(f"ifg-enhance: {exc}", file=sys.stderr)
+        return 1
+    queues = ", ".join(f"{name} {q['mean']:.1f}/{q['max']}" for name, q in stats["queues"].items())
+    print(f"{stats['frames']} frames in {stats['elapsed']:.2f}s ({stats['fps']:.1f} fps, source "
+          f"{stats['source_fps']:.1f} fps); dropped {stats['dropped']}, late {stats['late']}; "
+          f"k searched {stats['searches']} times; latency p95 {stats['latency']['p95'] * 1000:.0f} ms; "
+          f"queue depth mean/max: {queues}", file=sys.stderr)
+    return 0
@@ -1,6 +1,42 @@
-"""Enhancement algorithms package"""
+"""Enhancement algorithms package
 
-from .clahe import apply as clahe_apply
-from .ifg import enhance as ifg_enhance
+The public names below are resolved on first access (PEP 562), so
+`import src.enhancements` stays cheap and only the modules actually used
+(and OpenCV with them) get imported. Nothing in this package imports the
+Qt GUI.
+"""
 
-__all__ = ["clahe_apply", "ifg_enhance"]
+import importlib
+
+_EXPORTS = {
+    "clahe_apply": ("clahe", "apply"),
+    "ifg_enhance": ("ifg", "enhance"),
+    "enhance_sweep": ("sweep", "enhance_sweep"),
+    "enhance_batch": ("stack", "enhance_batch"),
+    "clahe_apply_batch": ("stack", "clahe_apply_batch"),
+    "roi_analyse": ("roi", "analyse"),
+    "roi_enhance": ("roi", "enhance"),
+    "CLAHEEnhancer": ("enhancer", "CLAHEEnhancer"),
+    "IFGEnhancer": ("enhancer", "IFGEnhancer"),
+    "GridSearch": ("search", "GridSearch"),
+    "GoldenSectionSearch": ("search", "GoldenSectionSearch"),
+    "CoarseToFineSearch": ("search", "CoarseToFineSearch"),
+    "make_search": ("search", "make_search"),
+    "StageTimer": ("timing", "StageTimer"),
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    try:
+        module, attr = _EXPORTS[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    value = getattr(importlib.import_module(f".{module}", __name__), attr)
+    globals()[name] = value  # later lookups skip this hook
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -4,12 +4,17 @@ This module provides a single function `apply` that applies CLAHE to the V
 (channel) of an image in BGR (OpenCV) space and returns a BGR image
 """
 
-from typing import Tuple
+from typing import Optional, Tuple
 import numpy as np
 import cv2
 
+from . import color as _color
+from .timing import NULL_TIMER, StageTimer
 
-def apply(img: np.ndarray, clip: float = 2.0, grid: Tuple[int, int] = (8, 8)) -> np.ndarray:
+
+def apply(img: np.ndarray, clip: float = 2.0, grid: Tuple[int, int] = (8, 8),
+          timer: Optional[StageTimer] = None, color: str = "hsv",
+          roi: Optional[Tuple[int, int, int, int]] = None) -> np.ndarray:
     """
     Apply CLAHE to the V channel of a BGR image.
 
@@ -21,6 +26,15 @@ def apply(img: np.ndarray, clip: float = 2.0, grid: Tuple[int, int] = (8, 8)) ->
         CLAHE clip limit.
     grid : tuple[int, int]
         CLAHE tile grid size.
+    timer : timing.StageTimer, optional
+        Records the convert, clahe and merge stages.
+    color : str
+        "hsv" (default) or "ratio", as for `ifg.enhance`; uint16 images
+        are processed at 16 bits and always use "ratio".
+    roi : tuple[int, int, int, int], optional
+        (x, y, width, height): enhance and return only this rectangle of a
+        uint8 image, identical to the same crop of the full output (see
+        `roi.py`).
 
     Returns
     -------
@@ -29,12 +43,41 @@ def apply(img: np.ndarray, clip: float = 2.0, grid: Tuple[int, int] = (8, 8)) ->
     """
     if img is None:
         raise ValueError("img must be a valid image array")
+    if timer is None:
+        timer = NULL_TIMER
+    if roi is not None:
+        from . import roi as _roi
+        return _roi.enhance(img, _roi.analyse_clahe(img, clip, grid, timer), roi, color, timer)
 
-    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-    h, s, v = cv2.split(hsv)
+    if _color.resolve(img, color) == "ratio":
+        with timer.stage("convert"):
+            v = _color.value(img)
+        timer.alloc("convert", v)
+        with timer.stage("clahe"):
+            v2 = _apply_value(v, clip, grid)
+        timer.alloc("clahe", v2)
+        with timer.stage("merge"):
+            out = _color.rescale(img, v, v2)
+        timer.alloc("merge", out)
+        return out
 
-    clahe = cv2.createCLAHE(clipLimit=float(clip), tileGridSize=grid)
-    v2 = clahe.apply(v)
+    with timer.stage("convert"):
+        hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+        h, s, v = cv2.split(hsv)
+    timer.alloc("convert", hsv, h, s, v)
+
+    with timer.stage("clahe"):
+        v2 = _apply_value(v, clip, grid)
+    timer.alloc("clahe", v2)
 
-    hsv2 = cv2.merge([h, s, v2])
-    return cv2.cvtColor(hsv2, cv2.COLOR_HSV2BGR)
+    with timer.stage("merge"):
+        hsv2 = cv2.merge([h, s, v2])
+        out = cv2.cvtColor(hsv2, cv2.COLOR_HSV2BGR)
+    timer.alloc("merge", hsv2, out)
+    return out
+
+
+def _apply_value(v: np.ndarray, clip: float = 2.0, grid: Tuple[int, int] = (8, 8)) -> np.ndarray:
+    """CLAHE on the V channel alone"""
+    clahe = cv2.createCLAHE(clipLimit=float(clip), tileGridSize=grid)
+    return clahe.apply(v)
@@ -0,0 +1,76 @@
+"""Getting the V channel out of a BGR image and putting an enhanced one back
+
+The enhancements only change V of HSV. The default "hsv" colour mode
+converts BGR -> HSV, splits, merges and converts back: two full colour
+conversions, plus H and S quantised to 8 bits (hue in 2 degree steps) on
+the way through.
+
+The "ratio" mode skips HSV altogether. V is max(B, G, R), which `value`
+computes with three channel extractions and two `cv2.max`; after V has
+been enhanced to V', `rescale` multiplies each pixel's channels by
+V'/V. Scaling all three channels by one factor keeps their ratios, so
+hue and saturation ((max - min) / max) are preserved up to the final
+rounding to integers, and the largest channel becomes exactly V'. A black
+pixel (V = 0) has no hue, as in HSV, and becomes grey at V'. The rescale
+runs in row bands (see parallel.py) so its float32 ratio temporaries stay
+in cache.
+
+The V given to the enhancement is the same in both modes, so only the
+reconstruction differs; `benchmarks/color_mode.py` measures the speed
+and colour difference of the two. OpenCV converts integer images to HSV
+only at 8 bits, so uint16 images always use the ratio mode (`resolve`).
+"""
+
+from typing import Optional
+import numpy as np
+import cv2
+
+from . import parallel
+
+
+COLOR_MODES = ("hsv", "ratio")
+
+
+def check_mode(color: str) -> str:
+    if color not in COLOR_MODES:
+        raise ValueError(f"unknown colour mode {color!r} (expected one of {', '.join(COLOR_MODES)})")
+    return color
+
+
+def resolve(img: np.ndarray, color: str) -> str:
+    """Colour mode to use for `img`: `color`, except "ratio" for uint16 images"""
+    check_mode(color)
+    return "ratio" if img.dtype == np.uint16 else color
+
+
+def value(img: np.ndarray, dst: Optional[np.ndarray] = None, scratch: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    V channel (max of B, G and R) of a uint8 or uint16 BGR image, for uint8
+    identical to V of `cv2.cvtColor(img, cv2.COLOR_BGR2HSV)`; `dst` and
+    `scratch` are optional image-sized planes of its dtype to write into.
+    """
+    v = cv2.extractChannel(img, 0, dst=dst)
+    t = cv2.extractChannel(img, 1, dst=scratch)
+    cv2.max(v, t, dst=v)
+    cv2.extractChannel(img, 2, dst=t)
+    cv2.max(v, t, dst=v)
+    return v
+
+
+def rescale(img: np.ndarray, v: np.ndarray, enhanced: np.ndarray, dst: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    BGR image with V `enhanced`: the channels of every pixel of `img`
+    scaled by enhanced / v (`v` being `value(img)`), written into `dst`.
+    """
+    out = np.empty(img.shape, dtype=img.dtype) if dst is None else dst
+    depth = cv2.CV_16U if img.dtype == np.uint16 else cv2.CV_8U
+
+    def band(rows: slice) -> None:
+        ratio = cv2.divide(enhanced[rows], v[rows], dtype=cv2.CV_32F)
+        cv2.multiply(img[rows], cv2.merge([ratio, ratio, ratio]), dst=out[rows], dtype=depth)
+        black = v[rows] == 0
+        if black.any():
+            out[rows][black] = enhanced[rows][black][:, None]
+
+    parallel.for_each_band(band, img.shape[0], img.shape[1])
+    return out
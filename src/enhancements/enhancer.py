@@ -0,0 +1,199 @@
+"""Stateful enhancers that reuse their buffers between calls
+
+`ifg.enhance` and `clahe.apply` allocate the HSV image, the channels, the
+intermediate V images and the output on every call and build a new CLAHE
+object each time. For a sequence of same-sized inputs (video frames, a
+batch of camera images) `IFGEnhancer` and `CLAHEEnhancer` keep those
+buffers per input shape and one CLAHE instance per (clip, grid), and let
+OpenCV/NumPy write into them, so after the first call of a given shape
+no image-sized array is allocated. Results are identical to the
+functional API.
+
+An instance is not thread-safe; use one per thread (instances share no
+state, so that is all it takes).
+"""
+
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple, Union
+import numpy as np
+import cv2
+
+from . import color as _color, ifg
+from .search import KSearch, make_search
+from .timing import NULL_TIMER, StageTimer
+
+
+Shape = Tuple[int, ...]
+
+# np.take needs intp indices; build them a chunk at a time so the index
+# buffer stays small (8 bytes per pixel for a whole image would not)
+_INDEX_CHUNK = 1 << 18
+
+
+class _Workspace:
+    """Image-sized buffers for one input shape"""
+
+    def __init__(self, shape: Shape):
+        plane = shape[:2]
+        self.hsv = np.empty(shape, dtype=np.uint8)
+        self.v = np.empty(plane, dtype=np.uint8)
+        self.a = np.empty(plane, dtype=np.uint8)  # pre-CLAHE V
+        self.b = np.empty(plane, dtype=np.uint8)  # CLAHE output, then final V
+        self.index = np.empty(min(_INDEX_CHUNK, plane[0] * plane[1]), dtype=np.intp)
+        self.out = np.empty(shape, dtype=np.uint8)
+
+
+class _BufferedEnhancer:
+    """Shape-keyed workspaces and (clip, grid)-keyed CLAHE instances"""
+
+    def __init__(self, clip: float = 2.0, grid: Tuple[int, int] = (8, 8), max_shapes: int = 2):
+        self.clip = float(clip)
+        self.grid = tuple(grid)
+        self.max_shapes = max_shapes
+        self._workspaces: "OrderedDict[Shape, _Workspace]" = OrderedDict()
+        self._clahe: Dict[Tuple[float, Tuple[int, int]], cv2.CLAHE] = {}
+
+    def workspace(self, shape: Shape) -> _Workspace:
+        ws = self._workspaces.get(shape)
+        if ws is None:
+            ws = self._workspaces[shape] = _Workspace(shape)
+            while len(self._workspaces) > self.max_shapes:
+                self._workspaces.popitem(last=False)
+        else:
+            self._workspaces.move_to_end(shape)
+        return ws
+
+    def clahe(self, clip: Optional[float] = None, grid: Optional[Tuple[int, int]] = None) -> cv2.CLAHE:
+        key = (self.clip if clip is None else float(clip), self.grid if grid is None else tuple(grid))
+        inst = self._clahe.get(key)
+        if inst is None:
+            inst = self._clahe[key] = cv2.createCLAHE(clipLimit=key[0], tileGridSize=key[1])
+        return inst
+
+    def release(self) -> None:
+        """Drop all buffers (e.g. after a run of unusually large inputs)"""
+        self._workspaces.clear()
+
+    @staticmethod
+    def _check(img: np.ndarray, dst: Optional[np.ndarray]) -> None:
+        if img is None:
+            raise ValueError("img must be a valid image array")
+        if img.dtype != np.uint8 or img.ndim != 3 or img.shape[2] != 3:
+            raise ValueError("img must be a uint8 BGR image")
+        if dst is not None and (dst.shape != img.shape or dst.dtype != np.uint8):
+            raise ValueError("dst must be a uint8 array of the same shape as img")
+
+    def _to_value(self, img: np.ndarray, ws: _Workspace, color: str, timer) -> None:
+        with timer.stage("convert"):
+            if _color.check_mode(color) == "ratio":
+                _color.value(img, dst=ws.v, scratch=ws.a)  # `a` is free until the transform
+            else:
+                cv2.cvtColor(img, cv2.COLOR_BGR2HSV, dst=ws.hsv)
+                cv2.extractChannel(ws.hsv, 2, dst=ws.v)
+
+    def _to_bgr(self, img: np.ndarray, value: np.ndarray, ws: _Workspace, dst: Optional[np.ndarray],
+                color: str, timer) -> np.ndarray:
+        out = ws.out if dst is None else dst
+        with timer.stage("merge"):
+            if color == "ratio":
+                _color.rescale(img, ws.v, value, dst=out)
+            else:
+                cv2.insertChannel(value, ws.hsv, 2)
+                cv2.cvtColor(ws.hsv, cv2.COLOR_HSV2BGR, dst=out)
+        return out
+
+
+class CLAHEEnhancer(_BufferedEnhancer):
+    """
+    Buffered equivalent of `clahe.apply`.
+
+    Parameters
+    ----------
+    clip, grid
+        Default CLAHE clip limit and tile grid (overridable per call).
+    max_shapes : int
+        Number of input shapes whose buffers are kept.
+    """
+
+    def apply(self, img: np.ndarray, clip: Optional[float] = None, grid: Optional[Tuple[int, int]] = None,
+              dst: Optional[np.ndarray] = None, timer: Optional[StageTimer] = None,
+              color: str = "hsv") -> np.ndarray:
+        """
+        CLAHE on the V channel of a BGR image, written into `dst`.
+
+        Without `dst` the result lives in an internal buffer that the next
+        call of the same shape overwrites; copy it or pass `dst` to keep it.
+        `color` is the colour mode, as for `clahe.apply`.
+        """
+        self._check(img, dst)
+        timer = timer or NULL_TIMER
+        ws = self.workspace(img.shape)
+        self._to_value(img, ws, color, timer)
+        with timer.stage("clahe"):
+            self.clahe(clip, grid).apply(ws.v, dst=ws.b)
+        return self._to_bgr(img, ws.b, ws, dst, color, timer)
+
+
+class IFGEnhancer(_BufferedEnhancer):
+    """
+    Buffered equivalent of `ifg.enhance` (compiled path).
+
+    Parameters
+    ----------
+    clip : float
+        Default CLAHE clip limit (overridable per call).
+    search : str or strategy, optional
+        k search strategy, as for `ifg.enhance`.
+    max_shapes : int
+        Number of input shapes whose buffers are kept.
+    """
+
+    def __init__(self, clip: float = 2.0, search: Union[str, KSearch, None] = None, max_shapes: int = 2):
+        super().__init__(clip, (8, 8), max_shapes)
+        self.search = make_search(search)
+
+    def enhance(self, img: np.ndarray, clip: Optional[float] = None, dst: Optional[np.ndarray] = None,
+                stats: Optional[dict] = None, timer: Optional[StageTimer] = None,
+                color: str = "hsv") -> Tuple[np.ndarray, float]:
+        """
+        Enhance a BGR image; returns (enhanced_bgr, k_used) like `ifg.enhance`.
+
+        Without `dst` the result lives in an internal buffer that the next
+        call of the same shape overwrites; copy it or pass `dst` to keep it.
+        `color` is the colour mode, as for `ifg.enhance`.
+        """
+        self._check(img, dst)
+        timer = timer or NULL_TIMER
+        ws = self.workspace(img.shape)
+        self._to_value(img, ws, color, timer)
+
+        with timer.stage("histogram"):
+            hist = ifg._histogram(ws.v)
+        with timer.stage("k_search"):
+            result = ifg._choose_k(hist, self.search)
+        if stats is not None:
+            stats.update(k=result.k, entropy=result.value, evaluations=result.evaluations)
+
+        with timer.stage("transform"):
+            h_lut, pi_lut = ifg._transform_luts(hist, result.k)
+            cv2.LUT(ws.v, h_lut, dst=ws.a)
+        with timer.stage("clahe"):
+            self.clahe(clip).apply(ws.a, dst=ws.b)
+        with timer.stage("defuzzify"):
+            c_min, c_max, _, _ = cv2.minMaxLoc(ws.b)
+            table = ifg._defuzzify_table(c_min, c_max, pi_lut)
+            _apply_table(table.ravel(), ws.b, ws.v, ws.index)
+        return self._to_bgr(img, ws.b, ws, dst, color, timer), result.k
+
+
+def _apply_table(table: np.ndarray, c: np.ndarray, v: np.ndarray, index: np.ndarray) -> None:
+    """`ifg._apply_table` in place: c <- table[c << 8 | v], chunk by chunk through `index`"""
+    c, v = c.reshape(-1), v.reshape(-1)
+    step = len(index)
+    for i in range(0, len(c), step):
+        n = min(step, len(c) - i)
+        idx = index[:n]
+        np.copyto(idx, c[i:i + n])
+        idx <<= 8
+        idx |= v[i:i + n]
+        np.take(table, idx, out=c[i:i + n], mode="clip")
@@ -3,13 +3,28 @@
 Provides `enhance(img, clip=2.0)` which returns (enhanced_bgr, k_used)
 """
 
-from typing import Tuple
+from typing import List, Optional, Tuple, Union
 import numpy as np
 import cv2
 
+from . import color as _color, parallel
+from .search import GridSearch, KSearch, SearchResult, make_search
+from .timing import NULL_TIMER, StageTimer
 
-def _entropy(gray: np.ndarray) -> float:
-    hist = cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel()
+# calcHist counts in float32, which is exact only up to 2**24 per bin
+_HIST_CHUNK = 1 << 24
+
+
+def _histogram(v: np.ndarray) -> np.ndarray:
+    """Exact 256-bin histogram of a uint8 channel (int64 counts)"""
+    rows = max(1, _HIST_CHUNK // max(v.shape[1], 1))
+    hist = np.zeros(256, dtype=np.int64)
+    for y in range(0, v.shape[0], rows):
+        hist += cv2.calcHist([v[y:y + rows]], [0], None, [256], [0, 256]).ravel().astype(np.int64)
+    return hist
+
+def _entropy(hist: np.ndarray) -> float:
+    hist = hist.astype(np.float32)
     p = hist / (hist.sum() + 1e-12)
     p = p[p > 0]
     return float(-np.sum(p * np.log2(p)))
@@ -21,6 +36,17 @@ def _normalise(x: np.ndarray) -> np.ndarray:
     denom = (mx - mn) if (mx - mn) != 0 else 1.0
     return (a - mn) / denom
 
+def _normalise_levels(hist: np.ndarray) -> np.ndarray:
+    """
+    Value `_normalise` assigns to each of the 256 levels of a channel with
+    this histogram (levels absent from the channel are clamped into [0, 1])
+    """
+    levels = np.flatnonzero(hist)
+    mn = np.float32(levels[0])
+    mx = np.float32(levels[-1])
+    denom = (mx - mn) if (mx - mn) != 0 else 1.0
+    return np.clip((np.arange(256, dtype=np.float32) - mn) / denom, 0.0, 1.0)
+
 def _compute(norm: np.ndarray, k: float) -> Tuple[np.ndarray, np.ndarray]:
     a = (k + 1) ** 2
     mu = ((1 + a) * norm) / (1 + a * norm)
@@ -28,44 +54,239 @@ def _compute(norm: np.ndarray, k: float) -> Tuple[np.ndarray, np.ndarray]:
     pi = np.clip(1.0 - mu - nu, 0.0, 1.0)
     return (mu + pi), pi
 
-def _choose_k(norm: np.ndarray) -> float:
-    best_k = 0.1
-    best_entropy = -1.0
-    for k in np.arange(0, 1.05, 0.05):
-        ifi, _ = _compute(norm, k)
-        gray = (np.clip(ifi * 255.0, 0, 255)).astype(np.uint8)
-        e = _entropy(gray)
-        if e > best_entropy:
-            best_entropy = e
-            best_k = float(k)
-    return best_k
+def _entropies(hist: np.ndarray, ks: np.ndarray) -> np.ndarray:
+    """
+    Entropy of the quantised IFI for every k in `ks`.
+
+    All candidates are evaluated at once as a (k x 256) lookup table over the
+    intensity levels, and the histogram of each quantised result is obtained
+    by re-binning `hist`, so the cost does not depend on the image size.
+    """
+    ks = np.asarray(ks, dtype=np.float64)
+    ifi, _ = _compute(_normalise_levels(hist)[None, :], ks[:, None])
+    gray = (np.clip(ifi * 255.0, 0, 255)).astype(np.intp)
+    gray += 256 * np.arange(len(ks))[:, None]
+    weights = np.broadcast_to(hist, gray.shape).ravel()
+    hists = np.bincount(gray.ravel(), weights=weights, minlength=gray.size).reshape(gray.shape)
+    return np.array([_entropy(h) for h in hists])
+
+def _choose_k(hist: np.ndarray, search: Union[str, KSearch, None] = None) -> SearchResult:
+    """Pick the k maximising the entropy of the quantised IFI"""
+    return make_search(search).maximise(lambda ks: _entropies(hist, ks))
+
+def _entropies_batch(hists: np.ndarray, ks: np.ndarray) -> np.ndarray:
+    """
+    `_entropies` of every row of an (N x 256) histogram stack, as (N x k).
+
+    The IFI tables, the re-binning and the log terms of all images and
+    candidates are computed in one pass; only the final sum of each row's
+    non-zero terms is taken per row, in the same order as `_entropy`, so
+    the values are bit-identical to the per-image ones.
+    """
+    ks = np.asarray(ks, dtype=np.float64)
+    n, m = len(hists), len(ks)
+    present = hists > 0
+    mn = np.argmax(present, axis=1).astype(np.float32)[:, None]
+    mx = (255 - np.argmax(present[:, ::-1], axis=1)).astype(np.float32)[:, None]
+    denom = np.where(mx - mn != 0, mx - mn, np.float32(1.0))
+    norm = np.clip((np.arange(256, dtype=np.float32) - mn) / denom, 0.0, 1.0)
+    ifi, _ = _compute(norm[:, None, :], ks[None, :, None])
+    gray = (np.clip(ifi * 255.0, 0, 255)).astype(np.intp).reshape(n * m, 256)
+    gray += 256 * np.arange(n * m)[:, None]
+    weights = np.broadcast_to(hists[:, None, :], (n, m, 256)).ravel()
+    binned = np.bincount(gray.ravel(), weights=weights, minlength=gray.size).reshape(gray.shape)
+    binned = binned.astype(np.float32)
+    p = binned / (binned.sum(axis=1, keepdims=True) + 1e-12)
+    nonzero = p > 0
+    terms = p * np.log2(p, where=nonzero, out=np.zeros_like(p))
+    return np.array([-np.sum(t[nz]) for t, nz in zip(terms, nonzero)]).reshape(n, m)
+
+def _choose_k_batch(hists: np.ndarray, search: Union[str, KSearch, None] = None) -> List[SearchResult]:
+    """
+    `_choose_k` for each row of an (N x 256) histogram stack. The grid
+    search evaluates all images at once; the adaptive strategies pick
+    their next k from earlier values, so they run per histogram.
+    """
+    search = make_search(search)
+    if not isinstance(search, GridSearch):
+        return [_choose_k(hist, search) for hist in hists]
+    ks = search.candidates()
+    values = _entropies_batch(hists, ks)
+    best = np.argmax(values, axis=1)
+    return [SearchResult(float(ks[i]), float(values[row, i]), len(ks)) for row, i in enumerate(best)]
 
 
 def _defuzzify(h: np.ndarray, mn: float, mx: float, pi: np.ndarray) -> np.ndarray:
     return np.clip(((h * (mx - mn)) + mn) - pi * (mx - mn), 0.0, 1.0)
 
-def enhance(img: np.ndarray, clip: float = 2.0) -> Tuple[np.ndarray, float]:
+def _transform_luts(hist: np.ndarray, k: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Compile the pre-CLAHE mapping into 256-entry tables indexed by V.
+
+    Returns the uint8 table V -> H_img and the float32 table V -> pi.
+    """
+    H, pi = _compute(_normalise_levels(hist), k)
+    return (np.clip(H * 255.0, 0.0, 255.0)).astype(np.uint8), pi
+
+def _defuzzify_table(c_min: float, c_max: float, pi_lut: np.ndarray) -> np.ndarray:
+    """
+    Compile the post-CLAHE defuzzify step into a (256 x 256) uint8 table
+    indexed by [clahe_value, v], for a CLAHE output spanning [c_min, c_max].
+    """
+    h = np.arange(256, dtype=np.float32)[:, None] / 255.0
+    mn = np.float32(c_min) / 255.0
+    mx = np.float32(c_max) / 255.0
+    return (np.clip(_defuzzify(h, mn, mx, pi_lut[None, :]) * 255.0, 0.0, 255.0)).astype(np.uint8)
+
+def _apply_table(table: np.ndarray, c: np.ndarray, v: np.ndarray) -> np.ndarray:
+    flat = table.ravel()
+    out = np.empty(c.shape, dtype=np.uint8)
+
+    def band(rows: slice) -> None:
+        idx = c[rows].astype(np.uint16)
+        idx <<= 8
+        idx |= v[rows]
+        np.take(flat, idx, out=out[rows], mode="clip")
+
+    parallel.for_each_band(band, c.shape[0], c.shape[1])
+    return out
+
+def _enhance_value_float(v: np.ndarray, k: float, clahe, timer=NULL_TIMER) -> np.ndarray:
+    # `_normalise` -> `_compute` -> quantise, and later `_defuzzify`, fused per
+    # row band (see parallel.py); the global min/max they need come first
+    rows, cols = v.shape
+    with timer.stage("transform"):
+        v_min, v_max, _, _ = cv2.minMaxLoc(v)
+        mn, mx = np.float32(v_min), np.float32(v_max)
+        denom = (mx - mn) if (mx - mn) != 0 else 1.0
+        H_img = np.empty(v.shape, dtype=np.uint8)
+        pi = np.empty(v.shape, dtype=np.float32)
+
+        def transform(band: slice) -> None:
+            norm = (v[band].astype(np.float32) - mn) / denom
+            H, pi[band] = _compute(norm, k)
+            H_img[band] = np.clip(H * 255.0, 0.0, 255.0)
+
+        parallel.for_each_band(transform, rows, cols)
+    timer.alloc("transform", H_img, pi)
+
+    with timer.stage("clahe"):
+        c = clahe.apply(H_img)
+    timer.alloc("clahe", c)
+
+    with timer.stage("defuzzify"):
+        c_min, c_max, _, _ = cv2.minMaxLoc(c)
+        # what np.min/np.max of the float32 image c / 255 would give
+        h_min, h_max = np.float32(c_min) / np.float32(255.0), np.float32(c_max) / np.float32(255.0)
+        out = np.empty(v.shape, dtype=np.uint8)
+
+        def defuzzify(band: slice) -> None:
+            h = c[band].astype(np.float32) / 255.0
+            out[band] = np.clip(_defuzzify(h, h_min, h_max, pi[band]) * 255.0, 0.0, 255.0)
+
+        parallel.for_each_band(defuzzify, rows, cols)
+    timer.alloc("defuzzify", out)
+    return out
+
+def _enhance_value_lut(v: np.ndarray, hist: np.ndarray, k: float, clahe, timer=NULL_TIMER) -> np.ndarray:
+    with timer.stage("transform"):
+        h_lut, pi_lut = _transform_luts(hist, k)
+        h_img = cv2.LUT(v, h_lut)
+    timer.alloc("transform", h_img)
+    with timer.stage("clahe"):
+        c = clahe.apply(h_img)
+    timer.alloc("clahe", c)
+    with timer.stage("defuzzify"):
+        c_min, c_max, _, _ = cv2.minMaxLoc(c)
+        out = _apply_table(_defuzzify_table(c_min, c_max, pi_lut), c, v)
+    timer.alloc("defuzzify", out)
+    return out
+
+def _enhance_value(v: np.ndarray, clip: float = 2.0, compiled: bool = True,
+                   search: Union[str, KSearch, None] = None, stats: Optional[dict] = None,
+                   timer=NULL_TIMER) -> Tuple[np.ndarray, float]:
+    """IFG -> CLAHE on the V channel alone; returns (enhanced_v, k_used)"""
+    if v.dtype == np.uint16:
+        from . import ifg16
+        return ifg16.enhance_value(v, clip, search, stats, timer)
+    with timer.stage("histogram"):
+        hist = _histogram(v)
+    with timer.stage("k_search"):
+        result = _choose_k(hist, search)
+    k = result.k
+    if stats is not None:
+        stats.update(k=k, entropy=result.value, evaluations=result.evaluations)
+
+    clahe = cv2.createCLAHE(clipLimit=float(clip), tileGridSize=(8, 8))
+    if compiled:
+        return _enhance_value_lut(v, hist, k, clahe, timer), k
+    return _enhance_value_float(v, k, clahe, timer), k
+
+def enhance(img: np.ndarray, clip: float = 2.0, compiled: bool = True,
+            search: Union[str, KSearch, None] = None, stats: Optional[dict] = None,
+            timer: Optional[StageTimer] = None, color: str = "hsv",
+            roi: Optional[Tuple[int, int, int, int]] = None) -> Tuple[np.ndarray, float]:
     """
     Enhance a BGR image using the IFG -> CLAHE pipeline.
 
+    With `compiled` (the default) the per-intensity IFG mapping and the
+    defuzzify step run as lookup tables over the uint8 V channel, so no
+    float image is materialised; `compiled=False` evaluates the same
+    formulas on float32 images and produces the same output.
+
+    `search` selects the k optimiser: a strategy from `search.py` or one of
+    the names "grid" (default, the original 21-point grid), "golden" and
+    "coarse-to-fine". If `stats` is given it is updated with the chosen
+    `k`, its `entropy` and the number of entropy `evaluations` used.
+    A `timing.StageTimer` passed as `timer` records the time and allocated
+    bytes of each stage (convert, histogram, k_search, transform, clahe,
+    defuzzify, merge). The per-pixel NumPy steps run in row bands on a
+    thread pool, see `parallel.py`.
+
+    `color` selects how V is taken out of and put back into the image:
+    "hsv" (default) round-trips through HSV, "ratio" computes V as
+    max(B, G, R) and scales each pixel's channels by V'/V, which skips
+    both colour conversions (see `color.py`).
+
+    uint16 images are enhanced at 16 bits throughout (see `ifg16.py`;
+    `compiled` does not apply) and always use the "ratio" colour mode.
+
+    With `roi` = (x, y, width, height) only that rectangle of a uint8
+    image is enhanced and returned, identical to the same crop of the full
+    output; the global statistics come from a histogram pass over the
+    whole image (see `roi.py`).
+
     Returns:
         (enhanced_bgr, k_used)
     """
     if img is None:
         raise ValueError("img must be a valid image array")
+    if timer is None:
+        timer = NULL_TIMER
+    if roi is not None:
+        from . import roi as _roi
+        analysis = _roi.analyse(img, clip, search, stats, timer)
+        return _roi.enhance(img, analysis, roi, color, timer), analysis.k
 
-    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-    h, s, v = cv2.split(hsv)
+    if _color.resolve(img, color) == "ratio":
+        with timer.stage("convert"):
+            v = _color.value(img)
+        timer.alloc("convert", v)
+        enhanced, k = _enhance_value(v, clip, compiled, search, stats, timer)
+        with timer.stage("merge"):
+            out = _color.rescale(img, v, enhanced)
+        timer.alloc("merge", out)
+        return out, k
 
-    norm = _normalise(v)
-    k = _choose_k(norm)
-    H, pi = _compute(norm, k)
-    H_img = (np.clip(H * 255.0, 0.0, 255.0)).astype(np.uint8)
-
-    clahe = cv2.createCLAHE(clipLimit=float(clip), tileGridSize=(8, 8))
-    H_new = clahe.apply(H_img).astype(np.float32) / 255.0
+    with timer.stage("convert"):
+        hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+        h, s, v = cv2.split(hsv)
+    timer.alloc("convert", hsv, h, s, v)
 
-    enhanced = (np.clip(_defuzzify(H_new, np.min(H_new), np.max(H_new), pi) * 255.0, 0.0, 255.0)).astype(np.uint8)
+    enhanced, k = _enhance_value(v, clip, compiled, search, stats, timer)
 
-    hsv2 = cv2.merge([h, s, enhanced])
-    return cv2.cvtColor(hsv2, cv2.COLOR_HSV2BGR), k
+    with timer.stage("merge"):
+        hsv2 = cv2.merge([h, s, enhanced])
+        out = cv2.cvtColor(hsv2, cv2.COLOR_HSV2BGR)
+    timer.alloc("merge", hsv2, out)
+    return out, k
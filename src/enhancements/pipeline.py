@@ -0,0 +1,117 @@
+"""Combined CLAHE + IFG pipeline sharing one colour conversion
+
+`clahe.apply` and `ifg.enhance` each convert the image to HSV and split it.
+`run` converts and splits once, then evaluates the two branches on a small
+thread pool (OpenCV releases the GIL, so they overlap) and hands the CLAHE
+result to `on_clahe` as soon as it is ready, before IFG has finished.
+Given the `sweep.Prepared` state of the image (e.g. from the result
+cache, after only the clip limit changed) it skips the conversion and the
+IFG analysis too. uint16 images take the "ratio" colour mode (see
+color.py) and are enhanced at 16 bits.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Optional, Tuple, Union
+import threading
+import numpy as np
+import cv2
+
+from . import clahe, color, ifg, sweep
+from .search import KSearch
+from .timing import NULL_TIMER, StageTimer
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="enhance")
+    return _executor
+
+
+def _to_bgr(h: np.ndarray, s: np.ndarray, v: np.ndarray) -> np.ndarray:
+    return cv2.cvtColor(cv2.merge([h, s, v]), cv2.COLOR_HSV2BGR)
+
+
+def run(img: np.ndarray, clip: float = 2.0, search: Union[str, KSearch, None] = None,
+        on_clahe: Optional[Callable[[np.ndarray], None]] = None, stats: Optional[dict] = None,
+        with_clahe: bool = True, with_ifg: bool = True, timer: Optional[StageTimer] = None,
+        prepared: Optional[sweep.Prepared] = None) -> Tuple[Optional[np.ndarray], Optional[np.ndarray], Optional[float]]:
+    """
+    Produce the CLAHE and IFG enhancements of a BGR image in one pass.
+
+    Parameters
+    ----------
+    img : np.ndarray
+        Input image in BGR color order.
+    clip : float
+        CLAHE clip limit (both branches).
+    search, stats
+        As for `ifg.enhance`.
+    on_clahe : callable, optional
+        Called with the CLAHE image from a worker thread as soon as it is
+        available.
+    with_clahe, with_ifg : bool
+        Skip a branch whose result is not needed (e.g. already cached).
+    timer : timing.StageTimer, optional
+        Records the shared convert stage, the IFG stages and the whole CLAHE
+        branch as `clahe_branch`; that branch runs concurrently with IFG, so
+        the stage times may add up to more than the wall time.
+    prepared : sweep.Prepared, optional
+        Clip-independent state of `img` (same `search`, 8-bit images only);
+        only CLAHE, defuzzify and merge are then run.
+
+    Returns
+    -------
+    (clahe_bgr, ifg_bgr, k_used); entries of a skipped branch are None.
+    """
+    if img is None:
+        raise ValueError("img must be a valid image array")
+
+    if timer is None:
+        timer = NULL_TIMER
+
+    if prepared is not None:
+        h, s, v = prepared.h, prepared.s, prepared.v
+        merge = partial(_to_bgr, h, s)
+    elif color.resolve(img, "hsv") == "ratio":
+        with timer.stage("convert"):
+            v = color.value(img)
+        timer.alloc("convert", v)
+        merge = partial(color.rescale, img, v)
+    else:
+        with timer.stage("convert"):
+            hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+            h, s, v = cv2.split(hsv)
+        timer.alloc("convert", hsv, h, s, v)
+        merge = partial(_to_bgr, h, s)
+
+    def clahe_branch() -> np.ndarray:
+        with timer.stage("clahe_branch"):
+            out = merge(clahe._apply_value(v, clip))
+        timer.alloc("clahe_branch", out)
+        if on_clahe is not None:
+            on_clahe(out)
+        return out
+
+    def ifg_branch() -> Tuple[np.ndarray, float]:
+        if prepared is not None:
+            if stats is not None:
+                stats.update(k=prepared.k, entropy=prepared.entropy, evaluations=prepared.evaluations)
+            return sweep.evaluate(prepared, clip, timer), prepared.k
+        enhanced, k = ifg._enhance_value(v, clip, search=search, stats=stats, timer=timer)
+        with timer.stage("merge"):
+            out = merge(enhanced)
+        timer.alloc("merge", out)
+        return out, k
+
+    pool = _pool()
+    clahe_future = pool.submit(clahe_branch) if with_clahe else None
+    ifg_img, k = ifg_branch() if with_ifg else (None, None)
+    clahe_img = clahe_future.result() if clahe_future is not None else None
+    return clahe_img, ifg_img, k
@@ -0,0 +1,216 @@
+"""Enhancing a rectangle of an image without enhancing all of it
+
+Everything global the enhancements need comes from one cheap pass over
+the V channel of the whole image (`analyse` / `analyse_clahe`):
+
+* the V histogram, for normalisation and the k search;
+* the per-tile histograms CLAHE equalises (with OpenCV's padding), turned
+  into the tile lookup tables; for IFG the pre-CLAHE transform h_lut is
+  folded into them, as in `tiled.py`, so they are indexed by V;
+* for IFG, the exact min/max of the whole CLAHE output, which the
+  defuzzify table depends on (see `_clahe_range`).
+
+`enhance` then evaluates CLAHE on the requested rectangle alone, blending
+the tables of the tiles around each pixel exactly as OpenCV does; tile
+tables come from whole tiles, so no margin has to be enhanced and thrown
+away. The result is identical to the same crop of `ifg.enhance` /
+`clahe.apply` on the full image (8-bit images only). An `Analysis` is
+reusable for any number of rectangles of the same image and settings,
+which is what the GUI does while the user pans.
+"""
+
+from typing import NamedTuple, Optional, Tuple, Union
+import numpy as np
+import cv2
+
+from . import color as _color, ifg, tiled
+from .search import KSearch
+from .timing import NULL_TIMER, StageTimer
+
+
+Rect = Tuple[int, int, int, int]  # (x, y, width, height), as cv2.Rect and QRect
+
+# OpenCV's HSV -> BGR conversion rounds differently in its SIMD loop and
+# in the scalar tail of each row, so a pixel converts identically only in
+# the same position relative to a block boundary; blocks are at most this
+# many pixels and start at the first column
+_ROW_BLOCK = 64
+
+
+class Analysis(NamedTuple):
+    shape: Tuple[int, int]         # (height, width) of the analysed image
+    geometry: tiled._Geometry
+    luts: np.ndarray               # (tiles_y, tiles_x, 256) CLAHE tables indexed by V
+    table: Optional[np.ndarray]    # (256, 256) IFG defuzzify table, None for plain CLAHE
+    k: Optional[float]             # None for plain CLAHE
+
+
+def _check(img: np.ndarray) -> None:
+    if img is None or img.ndim != 3 or img.shape[2] != 3 or img.dtype != np.uint8:
+        raise ValueError("region enhancement needs an (H, W, 3) uint8 BGR image")
+
+
+def _tile_histograms(v: np.ndarray, geom: tiled._Geometry, grid: Tuple[int, int]) -> np.ndarray:
+    """Per-tile histograms of V as OpenCV's CLAHE sees it (reflect-101 padded)"""
+    h = v.shape[0]
+    tile_hist = np.zeros((grid[1], grid[0], 256), dtype=np.int64)
+    tiled._accumulate_tiles(tile_hist, tiled._pad_cols(v, geom.pad_x), 0, geom)
+    if geom.pad_y:
+        mirrored = [cv2.borderInterpolate(y, h, cv2.BORDER_REFLECT_101) for y in range(h, h + geom.pad_y)]
+        tiled._accumulate_tiles(tile_hist, tiled._pad_cols(v[mirrored], geom.pad_x), h, geom)
+    return tile_hist
+
+
+def _clahe_points(vals: np.ndarray, ys: np.ndarray, xs: np.ndarray, rows: tiled._Axis, cols: tiled._Axis,
+                  quad: np.ndarray) -> np.ndarray:
+    """`tiled._clahe_rows` for scattered pixels of one cell (same float32 operations)"""
+    xa, ya = cols.weight[xs], rows.weight[ys]
+    xa1, ya1 = np.float32(1.0) - xa, np.float32(1.0) - ya
+    top = quad[0][vals] * xa1 + quad[1][vals] * xa
+    bot = quad[2][vals] * xa1 + quad[3][vals] * xa
+    return np.rint(top * ya1 + bot * ya)
+
+
+def _clahe_range(v: np.ndarray, rows: tiled._Axis, cols: tiled._Axis, luts: np.ndarray) -> Tuple[int, int]:
+    """
+    Exact min and max of `tiled._clahe_rows(v, rows, cols, luts)`.
+
+    In every interpolation cell a pixel of value x lies between the lowest
+    and the highest of the cell's four tables at x. The darkest pixel of
+    each cell bounds the global minimum from above (highest table) and
+    from below (lowest table); where the bounds meet, that is the minimum.
+    Otherwise only the pixels whose lower bound does not exceed the best
+    upper bound can be the minimum, and just those are evaluated. The
+    maximum is found the same way. Typically few or no pixels are
+    evaluated, against every pixel for a full CLAHE run.
+    """
+    cells = []
+    for r0, r1, t_top, t_bot in rows.runs:
+        for c0, c1, t_left, t_right in cols.runs:
+            quad = luts[[t_top, t_top, t_bot, t_bot], [t_left, t_right, t_left, t_right]]
+            lo_v, hi_v, _, _ = cv2.minMaxLoc(v[r0:r1, c0:c1])
+            cells.append((r0, r1, c0, c1, quad, quad.min(axis=0), quad.max(axis=0), int(lo_v), int(hi_v)))
+
+    lo_floor = min(int(lower[lo_v]) for *_, lower, upper, lo_v, hi_v in cells)
+    lo_bound = min(int(upper[lo_v]) for *_, lower, upper, lo_v, hi_v in cells)
+    hi_ceil = max(int(upper[hi_v]) for *_, lower, upper, lo_v, hi_v in cells)
+    hi_bound = max(int(lower[hi_v]) for *_, lower, upper, lo_v, hi_v in cells)
+
+    def search(bound: int, find_max: bool) -> int:
+        best = bound
+        for r0, r1, c0, c1, quad, lower, upper, lo_v, hi_v in cells:
+            present = (upper if find_max else lower)[lo_v:hi_v + 1]
+            if (present.max() < best) if find_max else (present.min() > best):
+                continue
+            blk = v[r0:r1, c0:c1]
+            mask = cv2.LUT(blk, upper) >= best if find_max else cv2.LUT(blk, lower) <= best
+            ys, xs = np.nonzero(mask)
+            if len(ys):
+                c = _clahe_points(blk[ys, xs], ys + r0, xs + c0, rows, cols, quad)
+                best = max(best, int(c.max())) if find_max else min(best, int(c.min()))
+        return best
+
+    c_min = lo_bound if lo_floor == lo_bound else search(lo_bound, False)
+    c_max = hi_bound if hi_ceil == hi_bound else search(hi_bound, True)
+    return c_min, c_max
+
+
+def analyse(img: np.ndarray, clip: float = 2.0, search: Union[str, KSearch, None] = None,
+            stats: Optional[dict] = None, timer: Optional[StageTimer] = None) -> Analysis:
+    """
+    Global state of `ifg.enhance(img, clip, search=search)` for `enhance`.
+
+    `stats` and `timer` are updated as by `ifg.enhance`, with the stages
+    convert, histogram, k_search, transform and clahe_range.
+    """
+    _check(img)
+    timer = timer or NULL_TIMER
+    h, w = img.shape[:2]
+    gx, gy = tiled._GRID
+    geom = tiled._geometry(h, w, tiled._GRID)
+    with timer.stage("convert"):
+        v = _color.value(img)
+    with timer.stage("histogram"):
+        hist = ifg._histogram(v)
+        tile_hist = _tile_histograms(v, geom, tiled._GRID)
+    with timer.stage("k_search"):
+        result = ifg._choose_k(hist, search)
+    k = result.k
+    if stats is not None:
+        stats.update(k=k, entropy=result.value, evaluations=result.evaluations)
+
+    with timer.stage("transform"):
+        h_lut, pi_lut = ifg._transform_luts(hist, k)
+        onehot = np.zeros((256, 256), dtype=np.int64)
+        onehot[np.arange(256), h_lut] = 1
+        luts = tiled._clahe_luts(tile_hist @ onehot, float(clip), geom.tile_w * geom.tile_h)[..., h_lut]
+    with timer.stage("clahe_range"):
+        c_min, c_max = _clahe_range(v, tiled._axis(0, h, geom.tile_h, gy), tiled._axis(0, w, geom.tile_w, gx), luts)
+        table = ifg._defuzzify_table(c_min, c_max, pi_lut)
+    return Analysis((h, w), geom, luts, table, k)
+
+
+def analyse_clahe(img: np.ndarray, clip: float = 2.0, grid: Tuple[int, int] = (8, 8),
+                  timer: Optional[StageTimer] = None) -> Analysis:
+    """Global state of `clahe.apply(img, clip, grid)` for `enhance`"""
+    _check(img)
+    timer = timer or NULL_TIMER
+    h, w = img.shape[:2]
+    geom = tiled._geometry(h, w, tuple(grid))
+    with timer.stage("convert"):
+        v = _color.value(img)
+    with timer.stage("histogram"):
+        tile_hist = _tile_histograms(v, geom, tuple(grid))
+    with timer.stage("transform"):
+        luts = tiled._clahe_luts(tile_hist, float(clip), geom.tile_w * geom.tile_h)
+    return Analysis((h, w), geom, luts, None, None)
+
+
+def check_rect(rect: Rect, shape: Tuple[int, ...]) -> Rect:
+    """`rect` as a tuple of ints, or ValueError if it is empty or not inside an image of `shape`"""
+    x, y, w, h = (int(n) for n in rect)
+    if w <= 0 or h <= 0 or x < 0 or y < 0 or x + w > shape[1] or y + h > shape[0]:
+        raise ValueError(f"roi {rect!r} is empty or outside the {shape[1]}x{shape[0]} image")
+    return x, y, w, h
+
+
+def enhance(img: np.ndarray, analysis: Analysis, rect: Rect, color: str = "hsv",
+            timer: Optional[StageTimer] = None) -> np.ndarray:
+    """
+    Enhanced BGR pixels of `img` inside `rect` = (x, y, width, height).
+
+    `analysis` comes from `analyse` (IFG) or `analyse_clahe` (CLAHE) of
+    the same image; `color` and `timer` are as for `ifg.enhance`.
+    """
+    _check(img)
+    if img.shape[:2] != analysis.shape:
+        raise ValueError("the analysis is of an image of another size")
+    x, y, w, h = check_rect(rect, img.shape)
+    timer = timer or NULL_TIMER
+    hsv = _color.check_mode(color) == "hsv"
+    x0, x1 = x, x + w
+    if hsv:
+        # convert whole blocks, or up to the end of the row as the full run does
+        x0 -= x0 % _ROW_BLOCK
+        x1 = min(-(-x1 // _ROW_BLOCK) * _ROW_BLOCK, img.shape[1])
+    sub = img[y:y + h, x0:x1]
+
+    with timer.stage("convert"):
+        if hsv:
+            hue, sat, v = cv2.split(cv2.cvtColor(sub, cv2.COLOR_BGR2HSV))
+        else:
+            v = _color.value(sub)
+    with timer.stage("clahe"):
+        geom = analysis.geometry
+        tiles_y, tiles_x = analysis.luts.shape[:2]
+        rows = tiled._axis(y, y + h, geom.tile_h, tiles_y)
+        cols = tiled._axis(x0, x1, geom.tile_w, tiles_x)
+        enhanced = tiled._clahe_rows(v, rows, cols, analysis.luts)
+    if analysis.table is not None:
+        with timer.stage("defuzzify"):
+            enhanced = ifg._apply_table(analysis.table, enhanced, v)
+    with timer.stage("merge"):
+        if not hsv:
+            return _color.rescale(sub, v, enhanced)
+        out = cv2.cvtColor(cv2.merge([hue, sat, enhanced]), cv2.COLOR_HSV2BGR)
+        return out if (x0, x1) == (x, x + w) else np.ascontiguousarray(out[:, x - x0:x - x0 + w])
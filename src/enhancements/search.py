@@ -0,0 +1,203 @@
+"""Search strategies for the IFG parameter k
+
+Each strategy maximises a vectorised objective `f(ks) -> values` over
+[lo, hi] and reports how many points it evaluated. `ifg.enhance` uses the
+entropy of the quantised IFI as objective.
+"""
+
+from dataclasses import dataclass
+from typing import Callable, NamedTuple, Optional, Union
+import numpy as np
+
+
+Objective = Callable[[np.ndarray], np.ndarray]
+
+
+class SearchResult(NamedTuple):
+    k: float
+    value: float
+    evaluations: int
+
+
+def _check(tol: float, max_evals: Optional[int]) -> None:
+    if not tol > 0:
+        raise ValueError(f"k search tolerance must be positive, got {tol!r}")
+    if max_evals is not None and max_evals < 1:
+        raise ValueError(f"k search evaluation budget must be at least 1, got {max_evals!r}")
+
+
+class _Tracker:
+    """Evaluates the objective and remembers the best point seen so far"""
+
+    def __init__(self, objective: Objective, max_evals: Optional[int]):
+        self._objective = objective
+        self.budget = max_evals if max_evals is not None else np.inf
+        self.evaluations = 0
+        self.best_k = 0.0
+        self.best_value = -np.inf
+
+    def __call__(self, ks: np.ndarray) -> np.ndarray:
+        ks = np.asarray(ks, dtype=np.float64)[: int(min(len(ks), self.remaining))]
+        values = np.asarray(self._objective(ks), dtype=np.float64)
+        self.evaluations += len(ks)
+        if len(ks):
+            i = int(np.argmax(values))
+            if values[i] > self.best_value:
+                self.best_k, self.best_value = float(ks[i]), float(values[i])
+        return values
+
+    @property
+    def remaining(self) -> float:
+        return self.budget - self.evaluations
+
+    def result(self) -> SearchResult:
+        return SearchResult(self.best_k, self.best_value, self.evaluations)
+
+
+@dataclass(frozen=True)
+class GridSearch:
+    """
+    Exhaustive search on a regular grid with spacing `tol`.
+
+    The defaults reproduce the original fixed grid `np.arange(0, 1.05, 0.05)`.
+    If the grid has more than `max_evals` points it is resampled to exactly
+    `max_evals` evenly spaced points.
+    """
+    tol: float = 0.05
+    max_evals: Optional[int] = None
+    lo: float = 0.0
+    hi: float = 1.0
+
+    def __post_init__(self):
+        _check(self.tol, self.max_evals)
+
+    def candidates(self) -> np.ndarray:
+        """The k values evaluated (independent of the objective)"""
+        ks = np.arange(self.lo, self.hi + self.tol, self.tol)
+        ks = ks[ks < self.hi + self.tol / 2]
+        if self.max_evals is not None and len(ks) > self.max_evals:
+            ks = np.linspace(self.lo, self.hi, int(self.max_evals))
+        return ks
+
+    def maximise(self, objective: Objective) -> SearchResult:
+        track = _Tracker(objective, None)
+        track(self.candidates())
+        return track.result()
+
+
+@dataclass(frozen=True)
+class GoldenSectionSearch:
+    """
+    Golden-section maximisation over [lo, hi].
+
+    Stops once the bracket is narrower than `tol` or after `max_evals`
+    objective evaluations, and returns the best point evaluated. Brent's
+    parabolic steps are not used: the entropy objective is piecewise
+    constant in k, so parabolic interpolation gains nothing over it.
+    """
+    tol: float = 1e-3
+    max_evals: Optional[int] = 20
+    lo: float = 0.0
+    hi: float = 1.0
+
+    _INV_PHI = (np.sqrt(5.0) - 1.0) / 2.0
+
+    def __post_init__(self):
+        _check(self.tol, self.max_evals)
+
+    def maximise(self, objective: Objective) -> SearchResult:
+        track = _Tracker(objective, self.max_evals)
+        a, b = self.lo, self.hi
+        c = b - self._INV_PHI * (b - a)
+        d = a + self._INV_PHI * (b - a)
+        if track.remaining < 2:
+            track(np.array([(a + b) / 2]))
+            return track.result()
+        fc, fd = track(np.array([c, d]))
+        while (b - a) > self.tol and track.remaining > 0:
+            if fc >= fd:
+                b, d, fd = d, c, fc
+                c = b - self._INV_PHI * (b - a)
+                fc = track(np.array([c]))[0]
+            else:
+                a, c, fc = c, d, fd
+                d = a + self._INV_PHI * (b - a)
+                fd = track(np.array([d]))[0]
+        return track.result()
+
+
+@dataclass(frozen=True)
+class CoarseToFineSearch:
+    """
+    Evaluate `points` evenly spaced candidates, then repeatedly zoom into
+    the neighbourhood of the best one until the spacing drops below `tol`
+    or `max_evals` evaluations have been spent.
+
+    Each round spreads the `points` over the best point +- the previous
+    spacing, so the spacing shrinks by 2 / (points - 1): `points` must be
+    at least 4, and at most `_MAX_ROUNDS` rounds are run whatever the budget.
+    """
+    tol: float = 1e-3
+    max_evals: Optional[int] = 20
+    lo: float = 0.0
+    hi: float = 1.0
+    points: int = 5
+
+    _MAX_ROUNDS = 64
+
+    def __post_init__(self):
+        _check(self.tol, self.max_evals)
+        if self.points < 4:
+            raise ValueError(f"coarse-to-fine search needs at least 4 points per round, got {self.points!r}")
+
+    def maximise(self, objective: Objective) -> SearchResult:
+        track = _Tracker(objective, self.max_evals)
+        n = int(self.points)
+        a, b = self.lo, self.hi
+        step = (b - a) / (n - 1)
+        track(np.linspace(a, b, n))
+        for _ in range(self._MAX_ROUNDS):
+            if step <= self.tol or track.remaining <= 0:
+                break
+            a = max(self.lo, track.best_k - step)
+            b = min(self.hi, track.best_k + step)
+            step = (b - a) / (n - 1)
+            # the bracket centre was already evaluated in the previous round
+            ks = np.linspace(a, b, n)
+            track(ks[~np.isclose(ks, track.best_k, rtol=0.0, atol=1e-12)])
+        return track.result()
+
+
+KSearch = Union[GridSearch, GoldenSectionSearch, CoarseToFineSearch]
+
+STRATEGIES = {
+    "grid": GridSearch,
+    "golden": GoldenSectionSearch,
+    "coarse-to-fine": CoarseToFineSearch,
+}
+
+
+def make_search(search: Union[str, KSearch, None] = None, tol: Optional[float] = None,
+                max_evals: Optional[int] = None) -> KSearch:
+    """
+    Resolve a strategy name ("grid", "golden", "coarse-to-fine") or instance.
+
+    `tol` and `max_evals` override the strategy defaults when given; a
+    `tol` that is not positive or a `max_evals` below 1 raises ValueError.
+    """
+    if search is None:
+        search = "grid"
+    if isinstance(search, str):
+        try:
+            cls = STRATEGIES[search]
+        except KeyError:
+            raise ValueError(f"unknown k search strategy {search!r}; expected one of {sorted(STRATEGIES)}") from None
+        kwargs = {}
+        if tol is not None:
+            kwargs["tol"] = float(tol)
+        if max_evals is not None:
+            kwargs["max_evals"] = int(max_evals)
+        return cls(**kwargs)
+    if tol is not None or max_evals is not None:
+        raise ValueError("tol/max_evals can only be combined with a strategy name")
+    return search
@@ -0,0 +1,180 @@
+"""Enhancement of whole (N, H, W, 3) stacks of same-sized images
+
+`enhance_batch(stack, out=out)` gives the same images as calling
+`ifg.enhance` on each `stack[i]`, but works on the stack as a unit:
+
+* the colour conversion and V histogram of every image run on a thread
+  pool, each image's HSV going straight into its slot of `out`;
+* the k search of all images is one NumPy pass (`ifg._choose_k_batch`;
+  the adaptive strategies still search per image, over 256 bins);
+* the per-image IFG transform and defuzzify step are compiled into tables
+  up front, then the table lookups, CLAHE and conversion back to BGR run
+  per image on the thread pool, in place in `out`.
+
+Each worker handles a contiguous run of images with one set of plane-
+sized scratch buffers, so besides the stack of V channels (a third of
+the input) nothing image-sized is allocated per image. `out` may be a
+caller-provided array reused across calls, or the input stack itself.
+`clahe_apply_batch` is the same for `clahe.apply`.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Tuple, Union
+import numpy as np
+import cv2
+
+from . import color as _color, ifg, parallel
+from .enhancer import _INDEX_CHUNK, _apply_table
+from .search import KSearch
+from .timing import NULL_TIMER, StageTimer
+
+
+def _check(stack: np.ndarray, out: Optional[np.ndarray]) -> np.ndarray:
+    if stack is None:
+        raise ValueError("stack must be a valid image array")
+    if stack.dtype != np.uint8 or stack.ndim != 4 or stack.shape[3] != 3:
+        raise ValueError("stack must be a uint8 (N, H, W, 3) array of BGR images")
+    if out is None:
+        return np.empty(stack.shape, dtype=np.uint8)
+    if out.shape != stack.shape or out.dtype != np.uint8 or not out.flags.c_contiguous:
+        raise ValueError("out must be a C-contiguous uint8 array of the same shape as stack")
+    return out
+
+
+def _for_each_run(fn: Callable[[range], None], n: int, workers: Optional[int]) -> None:
+    """Call `fn` on `workers` contiguous runs of range(n), concurrently"""
+    if n == 0:
+        return
+    workers = max(1, min(n, workers or parallel.get_num_threads()))
+    step = -(-n // workers)
+    runs = [range(i, min(i + step, n)) for i in range(0, n, step)]
+    if len(runs) <= 1:
+        for run in runs:
+            fn(run)
+        return
+    with ThreadPoolExecutor(max_workers=len(runs), thread_name_prefix="stack") as pool:
+        for future in [pool.submit(fn, run) for run in runs]:
+            future.result()
+
+
+def _to_value(img: np.ndarray, hsv: np.ndarray, v: np.ndarray, scratch: np.ndarray, color: str) -> None:
+    """V of `img` into `v`; in "hsv" mode the HSV image goes into `hsv` (may be `img`)"""
+    if color == "ratio":
+        _color.value(img, dst=v, scratch=scratch)
+    else:
+        cv2.cvtColor(img, cv2.COLOR_BGR2HSV, dst=hsv)
+        cv2.extractChannel(hsv, 2, dst=v)
+
+
+def _to_bgr(img: np.ndarray, v: np.ndarray, value: np.ndarray, out: np.ndarray, color: str) -> None:
+    """BGR with V `value` into `out`, which in "hsv" mode holds the HSV image"""
+    if color == "ratio":
+        _color.rescale(img, v, value, dst=out)
+    else:
+        cv2.insertChannel(value, out, 2)
+        cv2.cvtColor(out, cv2.COLOR_HSV2BGR, dst=out)
+
+
+def enhance_batch(stack: np.ndarray, clip: float = 2.0, search: Union[str, KSearch, None] = None,
+                  out: Optional[np.ndarray] = None, workers: Optional[int] = None,
+                  stats: Optional[list] = None, timer: Optional[StageTimer] = None,
+                  color: str = "hsv") -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Enhance every image of a stack with the IFG -> CLAHE pipeline.
+
+    Parameters
+    ----------
+    stack : np.ndarray
+        (N, H, W, 3) uint8 BGR images.
+    clip, search, color
+        As for `ifg.enhance` (the same for every image).
+    out : np.ndarray, optional
+        C-contiguous array of the same shape and dtype to write the results
+        into (may be `stack` itself); allocated when not given.
+    workers : int, optional
+        Threads processing images concurrently (default
+        `parallel.get_num_threads()`).
+    stats : list, optional
+        Extended with one dict (k, entropy, evaluations) per image.
+    timer : timing.StageTimer, optional
+        Records the stages of `ifg.enhance`, summed over the stack.
+
+    Returns
+    -------
+    (out, ks): the enhanced stack and the k used for each image.
+    """
+    out = _check(stack, out)
+    _color.check_mode(color)
+    timer = timer or NULL_TIMER
+    n, rows, cols = stack.shape[:3]
+    if n == 0:
+        return out, np.empty(0)
+    values = np.empty((n, rows, cols), dtype=np.uint8)
+    hists = np.empty((n, 256), dtype=np.int64)
+
+    def analyse(run: range) -> None:
+        scratch = np.empty((rows, cols), dtype=np.uint8) if color == "ratio" else None
+        for i in run:
+            with timer.stage("convert"):
+                _to_value(stack[i], out[i], values[i], scratch, color)
+            with timer.stage("histogram"):
+                hists[i] = ifg._histogram(values[i])
+
+    _for_each_run(analyse, n, workers)
+
+    with timer.stage("k_search"):
+        results = ifg._choose_k_batch(hists, search)
+    if stats is not None:
+        stats.extend(dict(k=r.k, entropy=r.value, evaluations=r.evaluations) for r in results)
+    with timer.stage("transform"):
+        luts = [ifg._transform_luts(hist, r.k) for hist, r in zip(hists, results)]
+        h_luts = np.stack([h for h, _ in luts])
+        pi_luts = np.stack([pi for _, pi in luts])
+
+    def finish(run: range) -> None:
+        a = np.empty((rows, cols), dtype=np.uint8)  # pre-CLAHE V
+        b = np.empty((rows, cols), dtype=np.uint8)  # CLAHE output, then final V
+        index = np.empty(min(_INDEX_CHUNK, rows * cols), dtype=np.intp)
+        clahe = cv2.createCLAHE(clipLimit=float(clip), tileGridSize=(8, 8))
+        for i in run:
+            with timer.stage("transform"):
+                cv2.LUT(values[i], h_luts[i], dst=a)
+            with timer.stage("clahe"):
+                clahe.apply(a, dst=b)
+            with timer.stage("defuzzify"):
+                c_min, c_max, _, _ = cv2.minMaxLoc(b)
+                _apply_table(ifg._defuzzify_table(c_min, c_max, pi_luts[i]).ravel(), b, values[i], index)
+            with timer.stage("merge"):
+                _to_bgr(stack[i], values[i], b, out[i], color)
+
+    _for_each_run(finish, n, workers)
+    return out, np.array([r.k for r in results])
+
+
+def clahe_apply_batch(stack: np.ndarray, clip: float = 2.0, grid: Tuple[int, int] = (8, 8),
+                      out: Optional[np.ndarray] = None, workers: Optional[int] = None,
+                      timer: Optional[StageTimer] = None, color: str = "hsv") -> np.ndarray:
+    """
+    `clahe.apply` on every image of an (N, H, W, 3) uint8 BGR stack.
+
+    `out` and `workers` are as for `enhance_batch`; returns `out`.
+    """
+    out = _check(stack, out)
+    _color.check_mode(color)
+    timer = timer or NULL_TIMER
+    rows, cols = stack.shape[1:3]
+
+    def apply(run: range) -> None:
+        v = np.empty((rows, cols), dtype=np.uint8)
+        b = np.empty((rows, cols), dtype=np.uint8)
+        clahe = cv2.createCLAHE(clipLimit=float(clip), tileGridSize=tuple(grid))
+        for i in run:
+            with timer.stage("convert"):
+                _to_value(stack[i], out[i], v, b, color)
+            with timer.stage("clahe"):
+                clahe.apply(v, dst=b)
+            with timer.stage("merge"):
+                _to_bgr(stack[i], v, b, out[i], color)
+
+    _for_each_run(apply, len(stack), workers)
+    return out
@@ -0,0 +1,97 @@
+"""Frame-stream IFG enhancement with temporal reuse of k
+
+Consecutive video frames usually share their intensity distribution, so
+re-running the k search on every frame is wasted work. `FrameEnhancer`
+keeps the k of its last search and only searches again once the V
+histogram has drifted from the one that search was run on by more than
+`drift` (total variation distance, 0 = identical, 1 = disjoint).
+
+The work per frame is split so it can be pipelined: `prepare` (colour
+conversion, histogram and k decision) is stateful and must be called in
+frame order, while `finish` (transform, CLAHE, defuzzify, merge) is
+stateless and may run on several threads at once.
+"""
+
+from typing import NamedTuple, Optional, Tuple, Union
+import numpy as np
+import cv2
+
+from . import ifg
+from .search import KSearch, make_search
+
+
+class PreparedFrame(NamedTuple):
+    h: np.ndarray
+    s: np.ndarray
+    v: np.ndarray
+    hist: np.ndarray
+    k: float
+    searched: bool
+
+
+class FrameEnhancer:
+    """
+    IFG -> CLAHE enhancer for a sequence of frames.
+
+    Parameters
+    ----------
+    clip : float
+        CLAHE clip limit.
+    search : str or strategy, optional
+        k search strategy, as for `ifg.enhance`.
+    drift : float
+        Histogram distance above which k is searched again.
+    smoothing : float
+        Weight of the previous k when a new search result is adopted
+        (0 adopts the new k as is; values near 1 suppress flicker).
+    """
+
+    def __init__(self, clip: float = 2.0, search: Union[str, KSearch, None] = None,
+                 drift: float = 0.1, smoothing: float = 0.0):
+        if not 0.0 <= smoothing < 1.0:
+            raise ValueError("smoothing must be in [0, 1)")
+        self.clip = float(clip)
+        self.search = make_search(search)
+        self.drift = float(drift)
+        self.smoothing = float(smoothing)
+        self.reset()
+
+    def reset(self) -> None:
+        self.k: Optional[float] = None
+        self._reference: Optional[np.ndarray] = None
+        self.frames = 0
+        self.searches = 0
+        self.evaluations = 0
+
+    def prepare(self, frame: np.ndarray) -> PreparedFrame:
+        """Analyse a frame and decide its k; call in frame order"""
+        if frame is None:
+            raise ValueError("frame must be a valid image array")
+        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+        h, s, v = cv2.split(hsv)
+        hist = ifg._histogram(v)
+        p = hist / hist.sum()
+
+        searched = self._reference is None or 0.5 * float(np.abs(p - self._reference).sum()) > self.drift
+        if searched:
+            result = ifg._choose_k(hist, self.search)
+            self.searches += 1
+            self.evaluations += result.evaluations
+            if self.k is None:
+                self.k = result.k
+            else:
+                self.k = self.smoothing * self.k + (1.0 - self.smoothing) * result.k
+            self._reference = p
+        self.frames += 1
+        return PreparedFrame(h, s, v, hist, self.k, searched)
+
+    def finish(self, prepared: PreparedFrame) -> np.ndarray:
+        """Apply the IFG -> CLAHE transform to a prepared frame; thread-safe"""
+        clahe = cv2.createCLAHE(clipLimit=self.clip, tileGridSize=(8, 8))
+        enhanced = ifg._enhance_value_lut(prepared.v, prepared.hist, prepared.k, clahe)
+        return cv2.cvtColor(cv2.merge([prepared.h, prepared.s, enhanced]), cv2.COLOR_HSV2BGR)
+
+    def enhance(self, frame: np.ndarray) -> Tuple[np.ndarray, float]:
+        """Enhance the next frame of the sequence; returns (enhanced_bgr, k_used)"""
+        prepared = self.prepare(frame)
+        return self.finish(prepared), prepared.k
@@ -0,0 +1,156 @@
+"""Clip-limit sweeps that share the clip-independent IFG stages
+
+Of the IFG -> CLAHE pipeline only CLAHE and the defuzzify step depend on
+the clip limit. `prepare` runs everything before them once (colour
+conversion, histogram, k search and the pre-CLAHE transform) and
+`evaluate` finishes a prepared image for one clip limit, so
+
+    results = enhance_sweep(img, clips=[1, 2, 3, 4])
+    best = max(results, key=lambda r: r.entropy)
+
+costs one analysis plus a CLAHE/defuzzify/merge per clip, with the clips
+evaluated on a thread pool. Every result is identical to
+`ifg.enhance(img, clip)`. The `Prepared` state is also what the result
+cache keeps per image, so the GUI only re-runs the clip-dependent stages
+when the clip limit changes.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, NamedTuple, Optional, Sequence, Tuple, Union
+import numpy as np
+import cv2
+
+from . import ifg, parallel
+from .search import KSearch
+from .timing import NULL_TIMER, StageTimer
+
+
+class Prepared(NamedTuple):
+    """Clip-independent state of one image"""
+    h: np.ndarray
+    s: np.ndarray
+    v: np.ndarray
+    h_img: np.ndarray   # V after the IFG transform (CLAHE input)
+    pi_lut: np.ndarray  # hesitation degree per V level
+    k: float
+    entropy: float      # of the quantised IFI at k (the search objective)
+    evaluations: int
+
+
+class SweepResult(NamedTuple):
+    clip: float
+    image: np.ndarray   # enhanced BGR
+    k: float
+    entropy: float      # of the enhanced V channel, in bits
+
+
+def split(img: np.ndarray, timer: Optional[StageTimer] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """BGR image -> H, S, V planes"""
+    if img is None:
+        raise ValueError("img must be a valid image array")
+    if img.dtype != np.uint8:
+        raise ValueError("clip sweeps need 8-bit images")
+    timer = timer or NULL_TIMER
+    with timer.stage("convert"):
+        hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+        h, s, v = cv2.split(hsv)
+    timer.alloc("convert", hsv, h, s, v)
+    return h, s, v
+
+
+def analyse(h: np.ndarray, s: np.ndarray, v: np.ndarray, search: Union[str, KSearch, None] = None,
+            timer: Optional[StageTimer] = None) -> Prepared:
+    """Histogram, k search and pre-CLAHE transform of already split planes"""
+    timer = timer or NULL_TIMER
+    with timer.stage("histogram"):
+        hist = ifg._histogram(v)
+    with timer.stage("k_search"):
+        result = ifg._choose_k(hist, search)
+    with timer.stage("transform"):
+        h_lut, pi_lut = ifg._transform_luts(hist, result.k)
+        h_img = cv2.LUT(v, h_lut)
+    timer.alloc("transform", h_img)
+    return Prepared(h, s, v, h_img, pi_lut, result.k, result.value, result.evaluations)
+
+
+def prepare(img: np.ndarray, search: Union[str, KSearch, None] = None,
+            timer: Optional[StageTimer] = None) -> Prepared:
+    """Run the clip-independent stages of `ifg.enhance` on a BGR image"""
+    h, s, v = split(img, timer)
+    return analyse(h, s, v, search, timer)
+
+
+def evaluate_value(prepared: Prepared, clip: float, timer: Optional[StageTimer] = None) -> np.ndarray:
+    """CLAHE and defuzzify of a prepared image; returns the enhanced V channel"""
+    timer = timer or NULL_TIMER
+    with timer.stage("clahe"):
+        c = cv2.createCLAHE(clipLimit=float(clip), tileGridSize=(8, 8)).apply(prepared.h_img)
+    timer.alloc("clahe", c)
+    with timer.stage("defuzzify"):
+        c_min, c_max, _, _ = cv2.minMaxLoc(c)
+        out = ifg._apply_table(ifg._defuzzify_table(c_min, c_max, prepared.pi_lut), c, prepared.v)
+    timer.alloc("defuzzify", out)
+    return out
+
+
+def evaluate(prepared: Prepared, clip: float, timer: Optional[StageTimer] = None) -> np.ndarray:
+    """Enhanced BGR image of a prepared image at `clip`, identical to `ifg.enhance(img, clip)`"""
+    timer = timer or NULL_TIMER
+    value = evaluate_value(prepared, clip, timer)
+    with timer.stage("merge"):
+        hsv = cv2.merge([prepared.h, prepared.s, value])
+        out = cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
+    timer.alloc("merge", hsv, out)
+    return out
+
+
+def enhance_sweep(img: np.ndarray, clips: Sequence[float], search: Union[str, KSearch, None] = None,
+                  workers: Optional[int] = None, prepared: Optional[Prepared] = None,
+                  timer: Optional[StageTimer] = None) -> List[SweepResult]:
+    """
+    Enhance `img` at every clip limit in `clips`, sharing the analysis.
+
+    Parameters
+    ----------
+    img : np.ndarray
+        Input image in BGR color order.
+    clips : sequence of float
+        Clip limits to evaluate; results come back in the same order.
+    search
+        k search strategy, as for `ifg.enhance`.
+    workers : int, optional
+        Threads evaluating clips concurrently (default: one per clip, up
+        to `parallel.get_num_threads()`; 1 evaluates them in turn).
+    prepared : Prepared, optional
+        Result of an earlier `prepare(img, search)`, to skip the analysis.
+    timer : timing.StageTimer, optional
+        Records the shared stages once and the per-clip stages summed over
+        all clips.
+
+    Returns
+    -------
+    One `SweepResult` (clip, image, k, entropy of the enhanced V) per clip.
+    """
+    clips = [float(c) for c in clips]
+    if not clips:
+        raise ValueError("clips must not be empty")
+    if prepared is None:
+        prepared = prepare(img, search, timer)
+
+    def one(clip: float) -> SweepResult:
+        value = evaluate_value(prepared, clip, timer)
+        entropy = ifg._entropy(ifg._histogram(value))
+        with (timer or NULL_TIMER).stage("merge"):
+            out = cv2.cvtColor(cv2.merge([prepared.h, prepared.s, value]), cv2.COLOR_HSV2BGR)
+        return SweepResult(clip, out, prepared.k, entropy)
+
+    workers = min(len(clips), workers or parallel.get_num_threads())
+    if workers <= 1:
+        return [one(clip) for clip in clips]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sweep") as pool:
+        return list(pool.map(one, clips))
+
+
+def best(results: Sequence[SweepResult]) -> SweepResult:
+    """Result with the highest entropy (the first of equals, i.e. the lowest clip if sorted)"""
+    return max(results, key=lambda r: r.entropy)
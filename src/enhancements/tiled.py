@@ -0,0 +1,218 @@
+"""Out-of-core IFG enhancement for images larger than memory
+
+`enhance_tiled(src, dst)` runs the same IFG -> CLAHE pipeline as
+`ifg.enhance`, but reads `src` and writes `dst` in horizontal strips so
+both can be memory-mapped (see `open_image` / `create_output`). Peak
+working memory is bounded by `memory_budget` instead of the image size.
+
+The image is streamed three times:
+
+1. the global V histogram (for normalisation and the k search) and the
+   per-tile histograms CLAHE needs are accumulated;
+2. CLAHE is evaluated strip by strip from the per-tile lookup tables,
+   interpolating across tile borders exactly as OpenCV does, so strips
+   join without seams; the result is parked in the first channel of `dst`
+   while its global min/max is tracked;
+3. the defuzzify table is applied and the strip converted back to BGR.
+
+The output is identical to `ifg.enhance` on the same image.
+"""
+
+from typing import List, NamedTuple, Optional, Tuple, Union
+import numpy as np
+import cv2
+
+from . import ifg
+from .search import KSearch
+
+
+# working set per strip pixel: source rows, HSV copy, V, CLAHE cell
+# temporaries (four uint8 lookups, float32 blend) and the output rows
+_BYTES_PER_PIXEL = 64
+DEFAULT_MEMORY_BUDGET = 256 * 2**20
+_GRID = (8, 8)
+
+
+class _Geometry(NamedTuple):
+    tile_w: int
+    tile_h: int
+    pad_x: int
+    pad_y: int
+
+
+def _geometry(h: int, w: int, grid: Tuple[int, int]) -> _Geometry:
+    """Tile size and bottom/right padding OpenCV's CLAHE uses for an h x w image"""
+    gx, gy = grid
+    if w % gx == 0 and h % gy == 0:
+        return _Geometry(w // gx, h // gy, 0, 0)
+    pad_x, pad_y = gx - w % gx, gy - h % gy
+    return _Geometry((w + pad_x) // gx, (h + pad_y) // gy, pad_x, pad_y)
+
+
+def _strip_rows(width: int, memory_budget: int) -> int:
+    rows = memory_budget // (width * _BYTES_PER_PIXEL)
+    # keep every calcHist call below float32's exact integer range
+    return int(max(1, min(rows, ifg._HIST_CHUNK // width)))
+
+
+def _value(bgr: np.ndarray) -> np.ndarray:
+    return cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)[..., 2].copy()
+
+
+def _accumulate_tiles(tile_hist: np.ndarray, v_ext: np.ndarray, y0: int, geom: _Geometry) -> None:
+    """Add rows [y0, y0 + len(v_ext)) of the padded image to the per-tile histograms"""
+    y1 = y0 + v_ext.shape[0]
+    gy, gx = tile_hist.shape[:2]
+    for ty in range(y0 // geom.tile_h, min((y1 - 1) // geom.tile_h + 1, gy)):
+        band = v_ext[max(ty * geom.tile_h, y0) - y0:min((ty + 1) * geom.tile_h, y1) - y0]
+        for tx in range(gx):
+            tile = band[:, tx * geom.tile_w:(tx + 1) * geom.tile_w]
+            tile_hist[ty, tx] += cv2.calcHist([tile], [0], None, [256], [0, 256]).ravel().astype(np.int64)
+
+
+def _clahe_luts(tile_hist: np.ndarray, clip: float, tile_area: int) -> np.ndarray:
+    """Clip, redistribute and equalise per-tile histograms the way OpenCV's CLAHE does"""
+    hist = tile_hist.copy()
+    if clip > 0:
+        limit = max(int(clip * tile_area / 256), 1)
+        excess = np.maximum(hist - limit, 0).sum(axis=-1)
+        np.minimum(hist, limit, out=hist)
+        batch, residual = np.divmod(excess, 256)
+        hist += batch[..., None]
+        for idx in zip(*np.nonzero(residual)):
+            r = int(residual[idx])
+            hist[idx][np.arange(0, 256, max(256 // r, 1))[:r]] += 1
+    scale = np.float32(255) / np.float32(tile_area)
+    cdf = np.cumsum(hist, axis=-1).astype(np.float32) * scale
+    return np.clip(np.rint(cdf), 0, 255).astype(np.uint8)
+
+
+class _Axis(NamedTuple):
+    weight: np.ndarray             # float32 distance past the lower tile centre
+    runs: List[Tuple[int, int, int, int]]  # (start, stop, lower tile, upper tile)
+
+
+def _axis(start: int, stop: int, tile: int, tiles: int) -> _Axis:
+    """Interpolation weights and constant-tile runs for coordinates [start, stop)"""
+    pos = np.arange(start, stop, dtype=np.float32) * (np.float32(1.0) / np.float32(tile)) - np.float32(0.5)
+    lower = np.floor(pos).astype(np.intp)
+    weight = pos - lower.astype(np.float32)
+    edges = np.flatnonzero(np.diff(lower)) + 1
+    bounds = [0, *edges.tolist(), len(lower)]
+    runs = [(b0, b1, max(int(lower[b0]), 0), min(int(lower[b0]) + 1, tiles - 1))
+            for b0, b1 in zip(bounds[:-1], bounds[1:]) if b1 > b0]
+    return _Axis(weight, runs)
+
+
+def _clahe_rows(v: np.ndarray, rows: _Axis, cols: _Axis, luts: np.ndarray) -> np.ndarray:
+    """Bilinearly blend the four neighbouring tile LUTs, cell by cell"""
+    out = np.empty_like(v)
+    for r0, r1, t_top, t_bot in rows.runs:
+        ya = rows.weight[r0:r1, None]
+        ya1 = np.float32(1.0) - ya
+        for c0, c1, t_left, t_right in cols.runs:
+            blk = v[r0:r1, c0:c1]
+            xa = cols.weight[c0:c1]
+            xa1 = np.float32(1.0) - xa
+            top = cv2.LUT(blk, luts[t_top, t_left]) * xa1 + cv2.LUT(blk, luts[t_top, t_right]) * xa
+            bot = cv2.LUT(blk, luts[t_bot, t_left]) * xa1 + cv2.LUT(blk, luts[t_bot, t_right]) * xa
+            out[r0:r1, c0:c1] = np.rint(top * ya1 + bot * ya)
+    return out
+
+
+def _pad_cols(v: np.ndarray, pad_x: int) -> np.ndarray:
+    return cv2.copyMakeBorder(v, 0, 0, 0, pad_x, cv2.BORDER_REFLECT_101) if pad_x else v
+
+
+def enhance_tiled(src: np.ndarray, dst: Optional[np.ndarray] = None, clip: float = 2.0,
+                  search: Union[str, KSearch, None] = None, memory_budget: int = DEFAULT_MEMORY_BUDGET,
+                  stats: Optional[dict] = None) -> Tuple[np.ndarray, float]:
+    """
+    Enhance an (H, W, 3) uint8 BGR array strip by strip.
+
+    Parameters
+    ----------
+    src : np.ndarray
+        Input image; typically a read-only memory map.
+    dst : np.ndarray, optional
+        Output array of the same shape (e.g. from `create_output`); a new
+        in-memory array is allocated when omitted.
+    clip, search, stats
+        As for `ifg.enhance`.
+    memory_budget : int
+        Approximate bound, in bytes, on the working memory of one strip.
+
+    Returns
+    -------
+    (dst, k_used)
+    """
+    if src is None or src.ndim != 3 or src.shape[2] != 3 or src.dtype != np.uint8:
+        raise ValueError("src must be an (H, W, 3) uint8 BGR array")
+    if dst is None:
+        dst = np.empty(src.shape, dtype=np.uint8)
+    elif dst.shape != src.shape or dst.dtype != np.uint8:
+        raise ValueError("dst must match the shape and dtype of src")
+
+    h, w = src.shape[:2]
+    gx, gy = _GRID
+    geom = _geometry(h, w, _GRID)
+    step = _strip_rows(w + geom.pad_x, memory_budget)
+    strips = [(y0, min(y0 + step, h)) for y0 in range(0, h, step)]
+
+    hist = np.zeros(256, dtype=np.int64)
+    tile_hist = np.zeros((gy, gx, 256), dtype=np.int64)
+    for y0, y1 in strips:
+        v = _value(src[y0:y1])
+        hist += ifg._histogram(v)
+        _accumulate_tiles(tile_hist, _pad_cols(v, geom.pad_x), y0, geom)
+    if geom.pad_y:
+        mirrored = [cv2.borderInterpolate(y, h, cv2.BORDER_REFLECT_101) for y in range(h, h + geom.pad_y)]
+        _accumulate_tiles(tile_hist, _pad_cols(_value(src[mirrored]), geom.pad_x), h, geom)
+
+    result = ifg._choose_k(hist, search)
+    k = result.k
+    if stats is not None:
+        stats.update(k=k, entropy=result.value, evaluations=result.evaluations, strip_rows=step)
+    h_lut, pi_lut = ifg._transform_luts(hist, k)
+
+    # CLAHE sees h_lut[v]: re-bin the tile histograms through h_lut, then
+    # fold h_lut into the tile LUTs so they can be indexed by V directly
+    onehot = np.zeros((256, 256), dtype=np.int64)
+    onehot[np.arange(256), h_lut] = 1
+    luts = _clahe_luts(tile_hist @ onehot, float(clip), geom.tile_w * geom.tile_h)[..., h_lut]
+    cols = _axis(0, w, geom.tile_w, gx)
+
+    c_min, c_max = 255, 0
+    for y0, y1 in strips:
+        c = _clahe_rows(_value(src[y0:y1]), _axis(y0, y1, geom.tile_h, gy), cols, luts)
+        c_min, c_max = min(c_min, int(c.min())), max(c_max, int(c.max()))
+        dst[y0:y1, :, 0] = c
+
+    table = ifg._defuzzify_table(c_min, c_max, pi_lut)
+    for y0, y1 in strips:
+        hsv = cv2.cvtColor(src[y0:y1], cv2.COLOR_BGR2HSV)
+        hsv[..., 2] = ifg._apply_table(table, dst[y0:y1, :, 0], hsv[..., 2])
+        dst[y0:y1] = cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
+
+    if isinstance(dst, np.memmap):
+        dst.flush()
+    return dst, k
+
+
+def open_image(path: str, shape: Optional[Tuple[int, int]] = None) -> np.ndarray:
+    """
+    Memory-map an (H, W, 3) uint8 BGR image stored as `.npy`, or as raw
+    interleaved bytes when `shape` = (H, W) is given.
+    """
+    if path.lower().endswith(".npy"):
+        return np.load(path, mmap_mode="r")
+    if shape is None:
+        raise ValueError("raw input needs an explicit (height, width)")
+    return np.memmap(path, dtype=np.uint8, mode="r", shape=(shape[0], shape[1], 3))
+
+
+def create_output(path: str, shape: Tuple[int, ...]) -> np.ndarray:
+    """Create a writable memory-mapped output (`.npy` header or raw bytes)"""
+    if path.lower().endswith(".npy"):
+        return np.lib.format.open_memmap(path, mode="w+", dtype=np.uint8, shape=tuple(shape))
+    return np.memmap(path, dtype=np.uint8, mode="w+", shape=tuple(shape))
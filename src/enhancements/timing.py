@@ -0,0 +1,134 @@
+"""Opt-in per-stage instrumentation for the enhancers
+
+`ifg.enhance`, `clahe.apply` and `pipeline.run` accept a `timer`. Pass a
+`StageTimer` to collect the wall time of each stage and the bytes of the
+arrays it allocated; the default `NULL_TIMER` makes every hook a no-op, so
+uninstrumented calls pay only a method call per stage.
+
+    timer = StageTimer()
+    out, k = ifg.enhance(img, timer=timer)
+    timer.summary()  # {"convert": {"seconds": ..., "bytes": ..., "calls": 1}, ...}
+
+Stages recorded by the same timer accumulate, also across threads.
+"""
+
+import threading
+import time
+from typing import Dict, Iterable, List, Mapping, Optional
+
+import numpy as np
+
+
+class _Stage:
+    __slots__ = ("timer", "name", "t0")
+
+    def __init__(self, timer: "StageTimer", name: str):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self) -> "_Stage":
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.timer.add(self.name, time.perf_counter() - self.t0)
+
+
+class StageTimer:
+    """Collects the duration and allocation size of named stages"""
+
+    enabled = True
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Dict[str, float]] = {}
+
+    def stage(self, name: str) -> _Stage:
+        """Context manager timing one stage"""
+        return _Stage(self, name)
+
+    def _entry(self, name: str) -> Dict[str, float]:
+        entry = self._stages.get(name)
+        if entry is None:
+            entry = self._stages[name] = {"seconds": 0.0, "bytes": 0, "calls": 0}
+        return entry
+
+    def add(self, name: str, seconds: float) -> None:
+        """Record one run of stage `name` taking `seconds`"""
+        with self._lock:
+            entry = self._entry(name)
+            entry["seconds"] += seconds
+            entry["calls"] += 1
+
+    def alloc(self, name: str, *arrays: Optional[np.ndarray]) -> None:
+        """Attribute the size of freshly allocated `arrays` to stage `name`"""
+        nbytes = sum(a.nbytes for a in arrays if a is not None)
+        with self._lock:
+            self._entry(name)["bytes"] += nbytes
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Per-stage totals, in the order the stages first ran"""
+        with self._lock:
+            return {name: dict(entry) for name, entry in self._stages.items()}
+
+    def seconds(self) -> Dict[str, float]:
+        with self._lock:
+            return {name: entry["seconds"] for name, entry in self._stages.items()}
+
+    def total(self) -> float:
+        with self._lock:
+            return sum(entry["seconds"] for entry in self._stages.values())
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullStage":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+class _NullTimer:
+    """Stand-in used when instrumentation is off; every hook does nothing"""
+
+    enabled = False
+    _stage = _NullStage()
+
+    def stage(self, name: str) -> _NullStage:
+        return self._stage
+
+    def add(self, name: str, seconds: float) -> None:
+        pass
+
+    def alloc(self, name: str, *arrays) -> None:
+        pass
+
+
+NULL_TIMER = _NullTimer()
+
+
+def format_stages(summary: Mapping[str, Mapping[str, float]]) -> str:
+    """One-line breakdown of a `StageTimer.summary()`, e.g. 'convert 12 ms, k search 3 ms'"""
+    return ", ".join(f"{name.replace('_', ' ')} {entry['seconds'] * 1000:.0f} ms"
+                     for name, entry in summary.items())
+
+
+def percentiles(samples: Iterable[Mapping[str, float]],
+                qs: Iterable[float] = (50, 90, 99)) -> Dict[str, Dict[str, float]]:
+    """
+    Aggregate per-stage seconds of many runs (e.g. `StageTimer.seconds()`
+    of each image) into {stage: {"p50": ..., "p90": ..., "p99": ..., "n": ...}}.
+    """
+    by_stage: Dict[str, List[float]] = {}
+    for sample in samples:
+        for name, t in sample.items():
+            by_stage.setdefault(name, []).append(t)
+    qs = list(qs)
+    out = {}
+    for name, ts in by_stage.items():
+        values = np.percentile(np.asarray(ts), qs)
+        out[name] = {f"p{q:g}": float(v) for q, v in zip(qs, values)}
+        out[name]["n"] = len(ts)
+    return out
@@ -0,0 +1,274 @@
+"""Background file I/O for the GUI: loading, saving and folder prefetch
+
+Decoding a large TIFF or writing a PNG takes long enough to freeze the
+window, so both run as jobs on a thread pool (same shape as `Worker`:
+a QObject started with `pool.start(job.run)`, emitting `finished` last).
+
+Decoded images are kept in a `DecodedCache`, a byte-bounded LRU keyed by
+path, size and modification time. While browsing a folder the window
+starts a `PrefetchJob` for the neighbours of the current file, which
+decodes them into that cache and, optionally, enhances them into the
+result cache, so stepping to the next image needs neither.
+
+Images keep their bit depth (see `utils.imageio`): 16-bit files are
+enhanced at 16 bits and saved as such where the format allows.
+
+OpenCV and the enhancement code are imported inside the jobs, keeping
+this module (and so the window) quick to import.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, List, NamedTuple, Optional, Sequence, Tuple
+from PySide6.QtCore import QObject, Signal
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff")
+
+DECODED_CACHE_BYTES = 512 * 2**20
+PREFETCH_RADIUS = 2
+
+
+def is_image(path: str) -> bool:
+    return path.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def list_images(directory: str) -> List[str]:
+    """Image files directly in `directory`, sorted case-insensitively by name"""
+    try:
+        with os.scandir(directory) as it:
+            found = [e.path for e in it if e.is_file() and is_image(e.name)]
+    except OSError:
+        return []
+    return sorted(found, key=lambda p: os.path.basename(p).lower())
+
+
+class FolderBrowser:
+    """Position within the images of one folder (or a list of files), for next/previous navigation"""
+
+    def __init__(self):
+        self.files: List[str] = []
+        self.index = -1
+
+    def open(self, path: str) -> Optional[str]:
+        """Browse the folder of `path` (a file, or a directory to start at its first image)"""
+        if os.path.isdir(path):
+            self.files = list_images(path)
+            self.index = 0 if self.files else -1
+            return self.current
+        self.files = list_images(os.path.dirname(os.path.abspath(path)))
+        target = os.path.normcase(os.path.abspath(path))
+        self.index = next((i for i, p in enumerate(self.files) if os.path.normcase(p) == target), -1)
+        if self.index < 0:
+            self.files, self.index = [path], 0
+        return self.current
+
+    def open_list(self, paths: Sequence[str]) -> Optional[str]:
+        """Browse `paths` in the given order, starting at the first"""
+        self.files = list(paths)
+        self.index = 0 if self.files else -1
+        return self.current
+
+    @property
+    def current(self) -> Optional[str]:
+        return self.files[self.index] if 0 <= self.index < len(self.files) else None
+
+    def peek(self, step: int) -> Optional[str]:
+        i = self.index + step
+        return self.files[i] if self.index >= 0 and 0 <= i < len(self.files) else None
+
+    def step(self, step: int) -> Optional[str]:
+        """Move by `step` files; returns the new current file (None, and no move, past either end)"""
+        path = self.peek(step)
+        if path is not None:
+            self.index += step
+        return path
+
+    def neighbours(self, radius: int = PREFETCH_RADIUS) -> List[str]:
+        """Files within `radius` of the current one, nearest first and the next before the previous"""
+        out = []
+        for d in range(1, radius + 1):
+            for step in (d, -d):
+                path = self.peek(step)
+                if path is not None:
+                    out.append(path)
+        return out
+
+
+class Decoded(NamedTuple):
+    image: "np.ndarray"  # read-only BGR, uint8 or uint16
+    digest: str          # content hash, so the result cache need not hash it again
+
+
+class DecodedCache:
+    """Thread-safe LRU of decoded images, bounded by their total bytes"""
+
+    def __init__(self, max_bytes: int = DECODED_CACHE_BYTES):
+        self.max_bytes = int(max_bytes)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, int, int], Decoded]" = OrderedDict()
+        self._bytes = 0
+
+    @staticmethod
+    def _key(path: str) -> Optional[Tuple[str, int, int]]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return os.path.abspath(path), st.st_size, st.st_mtime_ns
+
+    def get(self, path: str) -> Optional[Decoded]:
+        key = self._key(path)
+        with self._lock:
+            entry = self._entries.get(key) if key is not None else None
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def __contains__(self, path: str) -> bool:
+        key = self._key(path)
+        with self._lock:
+            return key in self._entries
+
+    def load(self, path: str) -> Decoded:
+        """Cached entry for `path`, decoding it on a miss; raises OSError if unreadable"""
+        entry = self.get(path)
+        if entry is not None:
+            return entry
+        from src.utils import imageio
+        from src.utils.cache import image_digest
+
+        key = self._key(path)
+        img = imageio.read(path)  # 16-bit files stay 16-bit
+        if img is None:
+            raise OSError(f"could not decode {os.path.basename(path)}")
+        img.flags.writeable = False  # shared with jobs and the views without copying
+        entry = Decoded(img, image_digest(img))
+        if key is not None:
+            self._put(key, entry)
+        return entry
+
+    def _put(self, key: Tuple[str, int, int], entry: Decoded) -> None:
+        size = entry.image.nbytes
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.image.nbytes
+            self._entries[key] = entry
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.image.nbytes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+
+class LoadJob(QObject):
+    """Decode one file (through a `DecodedCache`)
+
+    Emits:
+        loaded(path: str, decoded: Decoded)
+        failed(path: str, message: str)
+        finished()
+    """
+    loaded = Signal(str, object)
+    failed = Signal(str, str)
+    finished = Signal()
+
+    def __init__(self, path: str, cache: DecodedCache):
+        super().__init__()
+        self.path = path
+        self._cache = cache
+
+    def run(self) -> None:
+        try:
+            self.loaded.emit(self.path, self._cache.load(self.path))
+        except Exception as exc:
+            self.failed.emit(self.path, str(exc))
+        finally:
+            self.finished.emit()
+
+
+class SaveJob(QObject):
+    """Encode and write one image
+
+    Emits:
+        saved(path: str)
+        failed(path: str, message: str)
+        finished()
+    """
+    saved = Signal(str)
+    failed = Signal(str, str)
+    finished = Signal()
+
+    def __init__(self, path: str, img: "np.ndarray"):
+        super().__init__()
+        self.path = path
+        self._img = img
+
+    def run(self) -> None:
+        try:
+            from src.utils import imageio
+            if not imageio.write(self.path, self._img):
+                raise OSError(f"could not write {os.path.basename(self.path)}")
+            self.saved.emit(self.path)
+        except Exception as exc:
+            self.failed.emit(self.path, str(exc))
+        finally:
+            self.finished.emit()
+
+
+class PrefetchJob(QObject):
+    """Decode `paths` into a `DecodedCache` and, with a `clip`, enhance them into the result cache
+
+    Speculative work: errors are ignored and a cancelled job stops before
+    its next file. Emits only `finished`.
+    """
+    finished = Signal()
+
+    def __init__(self, paths: Sequence[str], cache: DecodedCache, clip: Optional[float] = None):
+        super().__init__()
+        self._paths = list(paths)
+        self._cache = cache
+        self._clip = clip
+        self._cancelled = threading.Event()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    def run(self) -> None:
+        try:
+            # decode every neighbour before enhancing any, so stepping is quick first of all
+            decoded = []
+            for path in self._paths:
+                if self._cancelled.is_set():
+                    return
+                try:
+                    decoded.append(self._cache.load(path))
+                except Exception:
+                    continue
+            if self._clip is None:
+                return
+            from src.utils.cache import default_cache
+            for entry in decoded:
+                if self._cancelled.is_set():
+                    return
+                default_cache().pipeline(entry.image, clip=self._clip, digest=entry.digest)
+        finally:
+            self.finished.emit()
@@ -1,11 +1,159 @@
 """Reusable image view widgets used by the MainWindow"""
 
-from typing import Optional, Tuple
+from collections import OrderedDict
+from typing import TYPE_CHECKING, List, Optional, Tuple
+import math
+import weakref
 from PySide6.QtWidgets import QWidget
 from PySide6.QtGui import QPixmap, QImage, QPainter, QFont, QColor, QPen
-from PySide6.QtCore import Qt, QTimer, Signal
-import cv2
-import numpy as np
+from PySide6.QtCore import Qt, QTimer, Signal, QRectF
+
+if TYPE_CHECKING:
+    # imported where used, so building the (still empty) views needs only Qt
+    import numpy as np
+
+
+class TilePyramid:
+    """
+    Level-of-detail renderer for one image array.
+
+    Level 0 is the array itself and every further level halves it (area
+    averaging) until it fits a single tile. Levels are built on first use
+    and each level is cut into `TILE` px tiles that are uploaded to
+    QPixmaps only when they intersect the viewport; a bounded LRU keeps the
+    recently drawn tiles. Drawing picks the coarsest level that still has
+    at least one pixel per screen pixel, so the cost of a repaint depends
+    on the size of the view, not of the image.
+    """
+
+    TILE = 512
+
+    def __init__(self, img: "np.ndarray", max_tiles: int = 128):
+        self.image = img
+        self.max_tiles = max_tiles
+        self.height, self.width = img.shape[:2]
+        self._levels: List["np.ndarray"] = [img]
+        self._tiles: "OrderedDict[Tuple[int, int, int], QPixmap]" = OrderedDict()
+        self.max_level = 0
+        w, h = self.width, self.height
+        while max(w, h) > self.TILE:
+            w, h = (w + 1) // 2, (h + 1) // 2
+            self.max_level += 1
+
+    def level(self, n: int) -> "np.ndarray":
+        import cv2
+        n = min(n, self.max_level)
+        while len(self._levels) <= n:
+            prev = self._levels[-1]
+            h, w = prev.shape[:2]
+            self._levels.append(cv2.resize(prev, ((w + 1) // 2, (h + 1) // 2), interpolation=cv2.INTER_AREA))
+        return self._levels[n]
+
+    def level_for(self, screen_per_pixel: float) -> int:
+        """Coarsest level with at least one pixel per screen pixel"""
+        if screen_per_pixel >= 1.0:
+            return 0
+        return min(self.max_level, int(math.floor(math.log2(1.0 / screen_per_pixel))))
+
+    def tile(self, n: int, tx: int, ty: int) -> QPixmap:
+        key = (n, tx, ty)
+        pix = self._tiles.get(key)
+        if pix is not None:
+            self._tiles.move_to_end(key)
+            return pix
+        t = self.TILE
+        arr = self.level(n)[ty * t:(ty + 1) * t, tx * t:(tx + 1) * t]
+        pix = QPixmap.fromImage(to_qimage(arr))
+        self._tiles[key] = pix
+        while len(self._tiles) > self.max_tiles:
+            self._tiles.popitem(last=False)
+        return pix
+
+    def draw(self, p: QPainter, target: QRectF, visible: QRectF, scale: float) -> None:
+        """
+        Draw the image stretched over `target`, limited to the `visible`
+        part (both in painter coordinates); `scale` is the number of screen
+        pixels per painter unit.
+        """
+        n = self.level_for(scale * target.width() / self.width)
+        lvl = self.level(n)
+        lh, lw = lvl.shape[:2]
+        fx, fy = target.width() / lw, target.height() / lh
+        area = visible.intersected(target)
+        if area.isEmpty():
+            return
+        x0 = max(0, int((area.left() - target.left()) / fx))
+        x1 = min(lw, int(math.ceil((area.right() - target.left()) / fx)))
+        y0 = max(0, int((area.top() - target.top()) / fy))
+        y1 = min(lh, int(math.ceil((area.bottom() - target.top()) / fy)))
+        t = self.TILE
+        for ty in range(y0 // t, (y1 - 1) // t + 1):
+            for tx in range(x0 // t, (x1 - 1) // t + 1):
+                pix = self.tile(n, tx, ty)
+                dst = QRectF(target.left() + tx * t * fx, target.top() + ty * t * fy,
+                             pix.width() * fx, pix.height() * fy)
+                p.drawPixmap(dst, pix, QRectF(pix.rect()))
+
+
+class PyramidStore:
+    """
+    GUI-thread registry of the TilePyramid of each displayed array.
+
+    Entries are keyed by the identity of the ndarray plus a caller supplied
+    version (bump it after modifying an array in place) and are held
+    weakly: views showing the same array share one pyramid and its
+    uploaded tiles, and the pyramid is released once no view shows it.
+    """
+
+    def __init__(self):
+        self._entries: "weakref.WeakValueDictionary[Tuple[int, int], TilePyramid]" = weakref.WeakValueDictionary()
+
+    def get(self, img: "np.ndarray", version: int = 0) -> TilePyramid:
+        key = (id(img), version)
+        pyr = self._entries.get(key)
+        if pyr is None or pyr.image is not img:
+            pyr = TilePyramid(img)
+            self._entries[key] = pyr
+        return pyr
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def to_qimage(img: "np.ndarray") -> QImage:
+    """Wrap a BGR (or grayscale) uint8 array as a QImage sharing its memory
+
+    The QImage does not own the buffer; keep `img` alive while it is used.
+    16-bit arrays are shown at 8 bits, through an owned copy.
+    """
+    import numpy as np
+    fmt = QImage.Format_Grayscale8 if img.ndim == 2 else QImage.Format_BGR888
+    h, w = img.shape[:2]
+    if img.dtype != np.uint8:
+        from src.utils.imageio import to_8bit
+        img = to_8bit(img)
+        return QImage(img.data, w, h, img.strides[0], fmt).copy()
+    row = img.strides[0]
+    # rows may be strided (e.g. a tile), but the pixels within a row must be packed
+    if img.strides[-1] != 1 or (img.ndim == 3 and img.strides[1] != img.shape[2]) or row <= 0:
+        img = np.ascontiguousarray(img)
+        return QImage(img.data, w, h, img.strides[0], fmt).copy()
+    if not img.flags.c_contiguous:
+        # flat view from the first pixel to the end of the last row
+        span = (h - 1) * row + w * (img.shape[2] if img.ndim == 3 else 1)
+        img = np.lib.stride_tricks.as_strided(img, shape=(span,), strides=(1,), writeable=False)
+    return QImage(img.data, w, h, row, fmt)
+
+
+_store: Optional[PyramidStore] = None
+
+
+def pyramid_store() -> PyramidStore:
+    """Store shared by all views, so an image shown twice is uploaded once"""
+    global _store
+    if _store is None:
+        _store = PyramidStore()
+    return _store
 
 
 class ImageView(QWidget):
@@ -13,29 +161,43 @@ class ImageView(QWidget):
 
     def __init__(self, label: str = "Image", parent: Optional[QWidget] = None):
         super().__init__(parent)
-        self.pix: Optional[QPixmap] = None
+        self.pyramid: Optional[TilePyramid] = None
+        self.img_w: int = 0
+        self.img_h: int = 0
         self.scale: float = 1.0
         self.offset_x: float = 0.0
         self.offset_y: float = 0.0
         self.last_pos = None
         self.label = label
+        self.regions: List[Tuple[QRectF, QPixmap]] = []
         self.setMouseTracking(True)
 
-    def set_image(self, img: Optional[np.ndarray]) -> None:
+    def set_image(self, img: Optional["np.ndarray"], size: Optional[Tuple[int, int]] = None) -> None:
+        """Show `img`, stretched to the logical `size` (w, h) if given (e.g. for a downscaled preview)"""
+        self.regions = []
         if img is None:
-            self.pix = None
+            self.pyramid = None
             self.update()
             return
         h, w = img.shape[:2]
-        rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        qimg = QImage(rgb.data, w, h, QImage.Format_RGB888)
-        self.pix = QPixmap.fromImage(qimg)
+        self.pyramid = pyramid_store().get(img)
+        self.img_w, self.img_h = size if size is not None else (w, h)
         self.fit_to_view()
 
+    def add_region(self, x: int, y: int, img: "np.ndarray") -> None:
+        """Draw `img` over the image with its top left corner at (x, y) until the next `set_image`"""
+        pix = QPixmap.fromImage(to_qimage(img))
+        self.regions.append((QRectF(x, y, pix.width(), pix.height()), pix))
+        self.update()
+
+    def clear_regions(self) -> None:
+        self.regions = []
+        self.update()
+
     def fit_to_view(self) -> None:
-        if not self.pix or self.width() <= 0 or self.height() <= 0:
+        if not self.pyramid or self.width() <= 0 or self.height() <= 0:
             return
-        iw, ih = self.pix.width(), self.pix.height()
+        iw, ih = self.img_w, self.img_h
         self.scale = min(self.width() / iw, self.height() / ih)
         self.offset_x = (self.width() - iw * self.scale) / 2
         self.offset_y = (self.height() - ih * self.scale) / 2
@@ -43,9 +205,9 @@ class ImageView(QWidget):
         self.update()
 
     def clamp_offsets(self) -> None:
-        if not self.pix:
+        if not self.pyramid:
             return
-        iw, ih = self.pix.width(), self.pix.height()
+        iw, ih = self.img_w, self.img_h
         sw, sh = iw * self.scale, ih * self.scale
         vw, vh = self.width(), self.height()
         if sw <= vw:
@@ -62,26 +224,36 @@ class ImageView(QWidget):
         self.clamp_offsets()
         self.update()
 
+    def visible_rect(self, area) -> QRectF:
+        """Part of the image (in image coordinates) under the widget `area`"""
+        r = QRectF(area)
+        return QRectF((r.left() - self.offset_x) / self.scale, (r.top() - self.offset_y) / self.scale,
+                      r.width() / self.scale, r.height() / self.scale)
+
     def paintEvent(self, ev) -> None:
         p = QPainter(self)
         p.fillRect(self.rect(), QColor(16, 18, 20))
-        if not self.pix:
+        if not self.pyramid:
             return
         p.translate(self.offset_x, self.offset_y)
         p.scale(self.scale, self.scale)
-        p.drawPixmap(0, 0, self.pix)
+        visible = self.visible_rect(self.rect())
+        self.pyramid.draw(p, QRectF(0, 0, self.img_w, self.img_h), visible, self.scale)
+        for target, pix in self.regions:
+            if target.intersects(visible):
+                p.drawPixmap(target, pix, QRectF(pix.rect()))
         p.resetTransform()
         p.setFont(QFont("Arial", 14, QFont.Bold))
         p.setPen(QColor("white"))
         p.drawText(10, 30, self.label)
 
     def wheelEvent(self, ev) -> None:
-        if not self.pix:
+        if not self.pyramid:
             return
         pos = ev.position()
         factor = 1.25 if ev.angleDelta().y() > 0 else 0.8
         old = self.scale
-        iw, ih = self.pix.width(), self.pix.height()
+        iw, ih = self.img_w, self.img_h
         fit_scale = min(self.width() / iw, self.height() / ih)
         self.scale = max(fit_scale, min(50.0, old * factor))
         if self.scale == old:
@@ -95,12 +267,12 @@ class ImageView(QWidget):
         self.update()
 
     def mousePressEvent(self, ev) -> None:
-        if ev.button() == Qt.LeftButton and self.pix:
+        if ev.button() == Qt.LeftButton and self.pyramid:
             self.last_pos = ev.position()
         super().mousePressEvent(ev)
 
     def mouseMoveEvent(self, ev) -> None:
-        if self.last_pos and self.pix:
+        if self.last_pos and self.pyramid:
             d = ev.position() - self.last_pos
             self.offset_x += d.x()
             self.offset_y += d.y()
@@ -117,7 +289,8 @@ class ImageView(QWidget):
     def set_transform(self, scale: float, ox: float, oy: float) -> None:
         self.scale, self.offset_x, self.offset_y = scale, ox, oy
         self.clamp_offsets()
-        self.update()
+        if self.isVisible():  # hidden tabs repaint when shown
+            self.update()
 
 
 class CompareView(QWidget):
@@ -125,8 +298,10 @@ class CompareView(QWidget):
 
     def __init__(self, parent: Optional[QWidget] = None):
         super().__init__(parent)
-        self.left_pix: Optional[QPixmap] = None
-        self.right_pix: Optional[QPixmap] = None
+        self.left_pyr: Optional[TilePyramid] = None
+        self.right_pyr: Optional[TilePyramid] = None
+        self.img_w: int = 0
+        self.img_h: int = 0
         self.scale: float = 1.0
         self.offset_x: float = 0.0
         self.offset_y: float = 0.0
@@ -137,27 +312,26 @@ class CompareView(QWidget):
         self.right_label = "IFG"
         self.setMouseTracking(True)
 
-    def set_images(self, left: Optional[np.ndarray], right: Optional[np.ndarray],
-                   left_label: str = "Original", right_label: str = "IFG") -> None:
+    def set_images(self, left: Optional["np.ndarray"], right: Optional["np.ndarray"],
+                   left_label: str = "Original", right_label: str = "IFG",
+                   size: Optional[Tuple[int, int]] = None) -> None:
+        """Show two images; both are stretched to the logical `size` (w, h), by default that of `left`"""
         self.left_label = left_label
         self.right_label = right_label
         if left is None or right is None:
-            self.left_pix = self.right_pix = None
+            self.left_pyr = self.right_pyr = None
             self.update()
             return
         h, w = left.shape[:2]
-        rgb1 = cv2.cvtColor(left, cv2.COLOR_BGR2RGB)
-        q1 = QImage(rgb1.data, w, h, QImage.Format_RGB888)
-        self.left_pix = QPixmap.fromImage(q1)
-        rgb2 = cv2.cvtColor(right, cv2.COLOR_BGR2RGB)
-        q2 = QImage(rgb2.data, w, h, QImage.Format_RGB888)
-        self.right_pix = QPixmap.fromImage(q2)
+        self.left_pyr = pyramid_store().get(left)
+        self.right_pyr = pyramid_store().get(right)
+        self.img_w, self.img_h = size if size is not None else (w, h)
         self.fit_to_view()
 
     def fit_to_view(self) -> None:
-        if not self.left_pix or self.width() <= 0 or self.height() <= 0:
+        if not self.left_pyr or self.width() <= 0 or self.height() <= 0:
             return
-        iw, ih = self.left_pix.width(), self.left_pix.height()
+        iw, ih = self.img_w, self.img_h
         self.scale = min(self.width() / iw, self.height() / ih)
         self.offset_x = (self.width() - iw * self.scale) / 2
         self.offset_y = (self.height() - ih * self.scale) / 2
@@ -165,9 +339,9 @@ class CompareView(QWidget):
         self.update()
 
     def clamp_offsets(self) -> None:
-        if not self.left_pix:
+        if not self.left_pyr:
             return
-        iw, ih = self.left_pix.width(), self.left_pix.height()
+        iw, ih = self.img_w, self.img_h
         sw, sh = iw * self.scale, ih * self.scale
         vw, vh = self.width(), self.height()
         if sw <= vw:
@@ -186,27 +360,30 @@ class CompareView(QWidget):
 
     def showEvent(self, event) -> None:
         super().showEvent(event)
-        if self.left_pix and self.right_pix:
+        if self.left_pyr and self.right_pyr:
             QTimer.singleShot(0, self.fit_to_view)
 
+    def visible_rect(self, area) -> QRectF:
+        """Part of the image (in image coordinates) under the widget `area`"""
+        r = QRectF(area)
+        return QRectF((r.left() - self.offset_x) / self.scale, (r.top() - self.offset_y) / self.scale,
+                      r.width() / self.scale, r.height() / self.scale)
+
     def paintEvent(self, ev) -> None:
         p = QPainter(self)
         p.fillRect(self.rect(), QColor(16, 18, 20))
-        if not (self.left_pix and self.right_pix):
+        if not (self.left_pyr and self.right_pyr):
             return
         div = int(self.divider_ratio * self.width())
-        p.save()
-        p.setClipRect(0, 0, div, self.height())
-        p.translate(self.offset_x, self.offset_y)
-        p.scale(self.scale, self.scale)
-        p.drawPixmap(0, 0, self.left_pix)
-        p.restore()
-        p.save()
-        p.setClipRect(div, 0, self.width() - div, self.height())
-        p.translate(self.offset_x, self.offset_y)
-        p.scale(self.scale, self.scale)
-        p.drawPixmap(0, 0, self.right_pix)
-        p.restore()
+        target = QRectF(0, 0, self.img_w, self.img_h)
+        for pyr, clip in ((self.left_pyr, QRectF(0, 0, div, self.height())),
+                          (self.right_pyr, QRectF(div, 0, self.width() - div, self.height()))):
+            p.save()
+            p.setClipRect(clip)
+            p.translate(self.offset_x, self.offset_y)
+            p.scale(self.scale, self.scale)
+            pyr.draw(p, target, self.visible_rect(clip), self.scale)
+            p.restore()
         p.setPen(QPen(QColor("white"), 1))
         p.drawLine(div, 0, div, self.height())
         p.resetTransform()
@@ -216,12 +393,12 @@ class CompareView(QWidget):
         p.drawText(self.width() - 80, 30, self.right_label)
 
     def wheelEvent(self, ev) -> None:
-        if not self.left_pix:
+        if not self.left_pyr:
             return
         pos = ev.position()
         factor = 1.25 if ev.angleDelta().y() > 0 else 0.8
         old = self.scale
-        iw, ih = self.left_pix.width(), self.left_pix.height()
+        iw, ih = self.img_w, self.img_h
         fit_scale = min(self.width() / iw, self.height() / ih)
         self.scale = max(fit_scale, min(50.0, old * factor))
         if self.scale == old:
@@ -235,7 +412,7 @@ class CompareView(QWidget):
         self.update()
 
     def mousePressEvent(self, ev) -> None:
-        if ev.button() != Qt.LeftButton or not self.left_pix:
+        if ev.button() != Qt.LeftButton or not self.left_pyr:
             return
         x = ev.position().x()
         div = self.divider_ratio * self.width()
@@ -268,7 +445,8 @@ class CompareView(QWidget):
     def set_transform(self, scale: float, ox: float, oy: float) -> None:
         self.scale, self.offset_x, self.offset_y = scale, ox, oy
         self.clamp_offsets()
-        self.update()
+        if self.isVisible():  # hidden tabs repaint when shown
+            self.update()
 
 
 class CentralWidget(QWidget):
@@ -280,8 +458,8 @@ class CentralWidget(QWidget):
         ev.accept() if ev.mimeData().hasUrls() else ev.ignore()
 
     def dropEvent(self, ev) -> None:
-        path = ev.mimeData().urls()[0].toLocalFile()
-        if path.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tiff')):
-            parent = self.parent()
-            if parent and hasattr(parent, "load_from_path"):
-                parent.load_from_path(path)
+        # an image file, a folder to browse, or several of either for the folder grid
+        paths = [url.toLocalFile() for url in ev.mimeData().urls() if url.isLocalFile()]
+        parent = self.parent()
+        if paths and parent and hasattr(parent, "load_paths"):
+            parent.load_paths(paths)
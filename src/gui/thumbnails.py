@@ -0,0 +1,455 @@
+"""Thumbnail grid of a folder (or of several dropped files)
+
+The grid is a `QListView` in icon mode over a `ThumbnailModel`, so Qt
+lays out and paints only the rows on screen: with uniform item sizes the
+view never asks for the data of a file it does not draw, and a folder of
+10,000+ images costs one list of paths. The model hands out a
+placeholder for any thumbnail it does not hold and asks the
+`ThumbnailLoader` for it; scrolling on drops the requests that went out
+of view (the repaint asks again for those still visible).
+
+The loader runs at most `THUMB_WORKERS` jobs at once and takes the most
+recent request first. Each job produces the original thumbnail of a
+file and, while "Enhanced thumbnails" is on, its IFG thumbnail, through
+a `ThumbnailStore`: a directory of small JPEGs keyed by the file's path,
+size and modification time (and, for the IFG one, the clip limit and the
+enhancement code). The IFG thumbnail is always made from the stored
+original, so it does not depend on what was cached. JPEGs are decoded
+with OpenCV's reduced-resolution reads (`IMREAD_REDUCED_*`) at 1/2 to
+1/8 scale without building the full image.
+
+As in `files`, OpenCV and the enhancement code are imported on the
+worker threads.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, List, NamedTuple, Optional, Sequence, Tuple
+from PySide6.QtWidgets import QWidget, QListView, QAbstractItemView, QHBoxLayout, QVBoxLayout, QLabel, QCheckBox
+from PySide6.QtGui import QPixmap, QColor
+from PySide6.QtCore import (
+    Qt, QObject, Signal, QTimer, QThreadPool, QAbstractListModel, QModelIndex, QSize, QStandardPaths
+)
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+THUMB_SIZE = 160
+THUMB_WORKERS = 2
+THUMB_DISK_BYTES = 512 * 2**20
+PIXMAP_CACHE = 400  # files whose thumbnails are kept as pixmaps
+PENDING_MAX = 256
+SCROLL_SETTLE_MS = 120
+CLIP_DEBOUNCE_MS = 300
+JPEG_QUALITY = 90
+
+PathRole = Qt.UserRole
+
+
+def default_directory() -> str:
+    return os.path.join(QStandardPaths.writableLocation(QStandardPaths.CacheLocation), "thumbnails")
+
+
+def read_reduced(path: str, size: int = THUMB_SIZE) -> Optional["np.ndarray"]:
+    """
+    8-bit BGR image of `path` (None if it cannot be decoded). JPEGs are
+    decoded at the smallest of 1/8, 1/4, 1/2 or full scale that is still
+    at least `size` px on its longer side; other formats gain nothing
+    from reduced reads (OpenCV decodes them whole and then resizes), so
+    they are decoded once at full scale.
+    """
+    import cv2
+    if not path.lower().endswith((".jpg", ".jpeg")):
+        return cv2.imread(path, cv2.IMREAD_COLOR)
+    img = cv2.imread(path, cv2.IMREAD_REDUCED_COLOR_8)
+    if img is None:
+        return None
+    # a second read only for JPEGs under 8 * size px, which decode quickly
+    full = max(img.shape[:2]) * 8
+    for factor, flag in ((8, None), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2)):
+        if full // factor >= size:
+            break
+    else:
+        flag = cv2.IMREAD_COLOR
+    return img if flag is None else cv2.imread(path, flag)
+
+
+def fit(img: "np.ndarray", size: int = THUMB_SIZE) -> "np.ndarray":
+    """`img` shrunk (area averaging) to fit a `size` px square; smaller images are returned as is"""
+    import cv2
+    h, w = img.shape[:2]
+    scale = size / max(h, w)
+    if scale >= 1:
+        return img
+    return cv2.resize(img, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+
+
+class ThumbnailStore:
+    """
+    Thumbnails on disk, one JPEG per file and kind.
+
+    Parameters
+    ----------
+    directory : str
+        Where the thumbnails are kept (created on first write).
+    size : int
+        Longer side of the thumbnails, in px.
+    max_bytes : int
+        Size above which `trim` deletes the least recently used files.
+    """
+
+    def __init__(self, directory: str, size: int = THUMB_SIZE, max_bytes: int = THUMB_DISK_BYTES):
+        self.directory = directory
+        self.size = int(size)
+        self.max_bytes = int(max_bytes)
+
+    def _file(self, path: str, kind: str) -> Optional[str]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        key = f"{os.path.abspath(path)}\0{st.st_size}\0{st.st_mtime_ns}\0{self.size}\0{kind}"
+        name = hashlib.blake2b(key.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+        return os.path.join(self.directory, name[:2], name + ".jpg")
+
+    @staticmethod
+    def _read(file: Optional[str]) -> Optional["np.ndarray"]:
+        if file is None or not os.path.exists(file):
+            return None
+        import cv2
+        img = cv2.imread(file, cv2.IMREAD_COLOR)
+        if img is not None:
+            try:
+                os.utime(file)  # recently used, for `trim`
+            except OSError:
+                pass
+        return img
+
+    @staticmethod
+    def _store(file: Optional[str], img: "np.ndarray") -> "np.ndarray":
+        """Write `img` to `file` as JPEG; returns it as decoded from that JPEG, i.e. as a later read gives it"""
+        import cv2
+        ok, data = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+        if not ok:
+            return img
+        if file is not None:
+            tmp = f"{file}.{os.getpid()}.{threading.get_ident()}.tmp.jpg"
+            try:
+                os.makedirs(os.path.dirname(file), exist_ok=True)
+                data.tofile(tmp)
+                os.replace(tmp, file)
+            except OSError:
+                pass
+            finally:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+        return cv2.imdecode(data, cv2.IMREAD_COLOR)
+
+    def load(self, path: str, clip: Optional[float] = None) -> Tuple["np.ndarray", Optional["np.ndarray"]]:
+        """
+        Original thumbnail of `path` and, with a `clip`, its IFG thumbnail
+        (else None), made and stored on a miss; raises OSError if `path`
+        is unreadable.
+        """
+        orig_file = self._file(path, "original")
+        orig = self._read(orig_file)
+        if orig is None:
+            img = read_reduced(path, self.size)
+            if img is None:
+                raise OSError(f"could not decode {os.path.basename(path)}")
+            orig = self._store(orig_file, fit(img, self.size))
+        if clip is None:
+            return orig, None
+        from src.utils.cache import code_version
+
+        ifg_file = self._file(path, f"ifg-{clip:.2f}-{code_version()}")
+        ifg_img = self._read(ifg_file)
+        if ifg_img is None:
+            from src.enhancements import ifg
+            ifg_img = self._store(ifg_file, ifg.enhance(orig, clip)[0])
+        return orig, ifg_img
+
+    def trim(self) -> int:
+        """Delete the least recently used thumbnails beyond `max_bytes`; returns the bytes freed"""
+        entries = []
+        for root, _dirs, names in os.walk(self.directory):
+            for name in names:
+                file = os.path.join(root, name)
+                try:
+                    st = os.stat(file)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, file))
+        total = sum(size for _, size, _ in entries)
+        freed = 0
+        for _, size, file in sorted(entries):
+            if total - freed <= self.max_bytes:
+                break
+            try:
+                os.remove(file)
+                freed += size
+            except OSError:
+                pass
+        return freed
+
+
+class ThumbnailLoader(QObject):
+    """Makes thumbnails on a bounded pool, most recent request first
+
+    A request with a clip limit also makes the IFG thumbnail, one with
+    None only the original.
+
+    Emits (on the GUI thread):
+        ready(path: str, clip: Optional[float], original: np.ndarray, ifg: Optional[np.ndarray])
+            (both None if unreadable)
+    """
+    ready = Signal(str, object, object, object)
+
+    def __init__(self, store: ThumbnailStore, workers: int = THUMB_WORKERS, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self.store = store
+        self.workers = max(1, int(workers))
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(self.workers + 1)  # and one to trim the store
+        self._lock = threading.Lock()
+        self._pending: "OrderedDict[str, Optional[float]]" = OrderedDict()  # path -> clip, newest last
+        self._running = set()
+        self._active = 0
+        self.pool.start(self.store.trim, -1)
+
+    def request(self, path: str, clip: Optional[float]) -> None:
+        start = False
+        with self._lock:
+            if path in self._running:
+                return
+            self._pending[path] = clip
+            self._pending.move_to_end(path)
+            while len(self._pending) > PENDING_MAX:
+                self._pending.popitem(last=False)
+            if self._active < self.workers:
+                self._active += 1
+                start = True
+        if start:
+            self.pool.start(self._drain)
+
+    def clear(self) -> None:
+        """Drop the requests not started yet"""
+        with self._lock:
+            self._pending.clear()
+
+    def close(self) -> None:
+        self.clear()
+        self.pool.waitForDone()
+
+    def _drain(self) -> None:
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._active -= 1
+                    return
+                path, clip = self._pending.popitem()
+                self._running.add(path)
+            try:
+                orig, ifg_img = self.store.load(path, clip)
+            except Exception:
+                orig = ifg_img = None
+            with self._lock:
+                self._running.discard(path)
+            self.ready.emit(path, clip, orig, ifg_img)
+
+
+class _Thumb(NamedTuple):
+    original: Optional[QPixmap]  # None if the file could not be read
+    ifg: Optional[QPixmap]       # None until requested
+    clip: Optional[float]        # of `ifg`
+
+
+def _placeholder(size: int, color: str) -> QPixmap:
+    pix = QPixmap(size, size)
+    pix.fill(QColor(color))
+    return pix
+
+
+class ThumbnailModel(QAbstractListModel):
+    """List model of image files whose decoration is the thumbnail (original or IFG)"""
+
+    def __init__(self, loader: ThumbnailLoader, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self.loader = loader
+        self.files: List[str] = []
+        self.enhanced = False
+        self.clip = 2.0
+        self._rows = {}
+        self._thumbs: "OrderedDict[str, _Thumb]" = OrderedDict()
+        size = loader.store.size
+        self._loading = _placeholder(size, "#1a1c21")
+        self._broken = _placeholder(size, "#3a1c1c")
+        loader.ready.connect(self.on_ready)
+
+    def set_files(self, files: Sequence[str]) -> None:
+        self.beginResetModel()
+        self.files = list(files)
+        self._rows = {path: row for row, path in enumerate(self.files)}
+        self.loader.clear()
+        self.endResetModel()
+
+    def set_enhanced(self, enhanced: bool) -> None:
+        self.enhanced = enhanced
+        self._refresh()
+
+    def set_clip(self, clip: float) -> None:
+        self.clip = clip
+        self._refresh()
+
+    def _refresh(self) -> None:
+        if self.files:
+            self.dataChanged.emit(self.index(0), self.index(len(self.files) - 1), [Qt.DecorationRole])
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.files)
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < len(self.files):
+            return None
+        path = self.files[index.row()]
+        if role == Qt.DisplayRole:
+            return os.path.basename(path)
+        if role in (Qt.ToolTipRole, PathRole):
+            return path
+        if role == Qt.DecorationRole:
+            return self._decoration(path)
+        return None
+
+    def _decoration(self, path: str) -> QPixmap:
+        thumb = self._thumbs.get(path)
+        if thumb is None:
+            self.loader.request(path, self.clip if self.enhanced else None)
+            return self._loading
+        self._thumbs.move_to_end(path)
+        if thumb.original is None:
+            return self._broken
+        if not self.enhanced:
+            return thumb.original
+        if thumb.clip != self.clip:
+            self.loader.request(path, self.clip)
+        # a stale IFG thumbnail, or else the original, is shown until then
+        return thumb.ifg if thumb.ifg is not None else thumb.original
+
+    def on_ready(self, path: str, clip: Optional[float], orig, ifg_img) -> None:
+        row = self._rows.get(path)
+        if row is None:
+            return  # from a previous folder
+        from src.gui.imageView import to_qimage
+        old = self._thumbs.get(path)
+        if orig is None:
+            thumb = _Thumb(None, None, None)
+        elif ifg_img is not None:
+            thumb = _Thumb(QPixmap.fromImage(to_qimage(orig)), QPixmap.fromImage(to_qimage(ifg_img)), clip)
+        else:  # keeps an IFG thumbnail made earlier
+            thumb = _Thumb(QPixmap.fromImage(to_qimage(orig)), old.ifg if old else None, old.clip if old else None)
+        self._thumbs[path] = thumb
+        self._thumbs.move_to_end(path)
+        while len(self._thumbs) > PIXMAP_CACHE:
+            self._thumbs.popitem(last=False)
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+
+class ThumbnailPanel(QWidget):
+    """Thumbnail grid with its options; rows are indices into the files given to `set_files`
+
+    Emits:
+        selected(row: int)   the current thumbnail changed (by click or keys)
+        activated(row: int)  a thumbnail was double-clicked or Enter pressed
+    """
+    selected = Signal(int)
+    activated = Signal(int)
+
+    def __init__(self, directory: Optional[str] = None, parent: Optional[QWidget] = None):
+        super().__init__(parent)
+        store = ThumbnailStore(directory or default_directory())
+        self.loader = ThumbnailLoader(store, parent=self)
+        self.model = ThumbnailModel(self.loader, self)
+
+        self.grid = QListView()
+        self.grid.setViewMode(QListView.IconMode)
+        self.grid.setMovement(QListView.Static)
+        self.grid.setResizeMode(QListView.Adjust)
+        self.grid.setUniformItemSizes(True)
+        self.grid.setLayoutMode(QListView.Batched)
+        self.grid.setBatchSize(500)
+        self.grid.setIconSize(QSize(store.size, store.size))
+        self.grid.setGridSize(QSize(store.size + 24, store.size + 36))
+        self.grid.setTextElideMode(Qt.ElideMiddle)
+        self.grid.setWordWrap(False)
+        self.grid.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.grid.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.grid.setModel(self.model)
+        self.grid.setStyleSheet("QListView {background:#101214; border-radius:8px; color:#dbe2ef;}"
+                                "QListView::item:selected {background:#2a2d35;}")
+        self.grid.selectionModel().currentChanged.connect(self.on_current_changed)
+        self.grid.activated.connect(lambda index: self.activated.emit(index.row()))
+
+        self.count_lbl = QLabel()
+        self.enhanced_chk = QCheckBox("Enhanced thumbnails")
+        self.enhanced_chk.setToolTip("Show the IFG result of every file at the current clip limit")
+        self.enhanced_chk.toggled.connect(self.model.set_enhanced)
+
+        # requests of thumbnails scrolled out of view are dropped once scrolling settles
+        self.scroll_timer = QTimer(self)
+        self.scroll_timer.setSingleShot(True)
+        self.scroll_timer.setInterval(SCROLL_SETTLE_MS)
+        self.scroll_timer.timeout.connect(self.on_scroll_settled)
+        self.grid.verticalScrollBar().valueChanged.connect(lambda _value: self.scroll_timer.start())
+        self.clip_timer = QTimer(self)
+        self.clip_timer.setSingleShot(True)
+        self.clip_timer.setInterval(CLIP_DEBOUNCE_MS)
+        self.clip_timer.timeout.connect(lambda: self.model.set_clip(self._clip))
+        self._clip = self.model.clip
+        self._syncing = False
+
+        bar = QHBoxLayout()
+        bar.addWidget(self.count_lbl)
+        bar.addStretch()
+        bar.addWidget(self.enhanced_chk)
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addLayout(bar)
+        layout.addWidget(self.grid, 1)
+
+    @property
+    def files(self) -> List[str]:
+        return self.model.files
+
+    def set_files(self, files: Sequence[str]) -> None:
+        self.model.set_files(files)
+        self.count_lbl.setText(f"{len(files)} images" if len(files) != 1 else "1 image")
+
+    def set_current(self, row: int) -> None:
+        """Select `row` without emitting `selected`"""
+        if not 0 <= row < self.model.rowCount():
+            return
+        self._syncing = True
+        index = self.model.index(row)
+        self.grid.setCurrentIndex(index)
+        self.grid.scrollTo(index)
+        self._syncing = False
+
+    def set_clip(self, clip: float) -> None:
+        self._clip = clip
+        self.clip_timer.start()
+
+    def on_current_changed(self, current: QModelIndex, _previous: QModelIndex) -> None:
+        if current.isValid() and not self._syncing:
+            self.selected.emit(current.row())
+
+    def on_scroll_settled(self) -> None:
+        self.loader.clear()
+        self.grid.viewport().update()  # the visible rows request their thumbnails again
+
+    def shutdown(self) -> None:
+        """Drop pending thumbnails and wait for the running ones"""
+        self.loader.close()
@@ -1,21 +1,67 @@
-"""MainWindow implementation for the IFG Contrast Enhancer"""
+"""MainWindow implementation for the IFG Contrast Enhancer
 
-from typing import Optional
+Only Qt is imported up front so the window can paint as soon as possible.
+OpenCV, NumPy and the enhancement pipeline are imported on first use and
+warmed up on a background thread right after the window is shown.
+
+Files are read and written on a background pool (`files`). Loading an
+image also browses its folder: Previous/Next (or Page Up/Down) step
+through the folder's images, whose neighbours are decoded ahead of time
+(and enhanced too with "Enhance ahead").
+
+Opening a folder, or dropping several files, also shows them in the
+"Folder" tab as a grid of thumbnails (see `thumbnails`), original or
+enhanced; selecting one opens it in the other tabs.
+
+On large images viewed zoomed in, the IFG result of the visible part is
+computed first (see `Worker`) and drawn over the preview; until the full
+result arrives, parts panned into view are enhanced on demand in blocks
+of `REGION_BLOCK` px (`RegionJob`).
+"""
+
+from typing import TYPE_CHECKING, Optional, Set, Tuple
 from PySide6.QtWidgets import (
     QMainWindow, QPushButton, QFileDialog, QHBoxLayout, QVBoxLayout,
-    QStatusBar, QLabel, QDoubleSpinBox, QTabWidget
+    QStatusBar, QLabel, QDoubleSpinBox, QTabWidget, QCheckBox
 )
-from PySide6.QtGui import QFont
-from PySide6.QtCore import Qt, QTimer
+from PySide6.QtGui import QFont, QKeySequence, QShortcut
+from PySide6.QtCore import Qt, QTimer, QThreadPool, QRectF
 
+import math
 import os
-import cv2
-import numpy as np
+import threading
 
+from src.gui.files import (
+    PREFETCH_RADIUS, Decoded, DecodedCache, FolderBrowser, LoadJob, PrefetchJob, SaveJob, is_image, list_images
+)
 from src.gui.imageView import ImageView, CompareView, CentralWidget
-from src.gui.worker import Worker
+from src.gui.thumbnails import ThumbnailPanel
 from src.utils.resource import resource_path
 
+if TYPE_CHECKING:
+    import numpy as np
+    from src.enhancements.roi import Analysis
+    from src.gui.worker import Worker
+
+
+PREVIEW_DEBOUNCE_MS = 150
+REGION_DEBOUNCE_MS = 50
+REGION_BLOCK = 256
+REGION_MIN_PIXELS = 4_000_000  # smaller images are enhanced whole about as fast
+REGION_MAX_FRACTION = 0.5  # of the image visible, above which regions are not worth it
+
+
+def _import_heavy() -> None:
+    import cv2  # noqa: F401
+    import src.gui.worker  # noqa: F401  (pulls in the cache, pipeline and IFG)
+
+
+def warm_up() -> threading.Thread:
+    """Import the modules deferred at startup on a background thread"""
+    thread = threading.Thread(target=_import_heavy, name="gui-warm-up", daemon=True)
+    thread.start()
+    return thread
+
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -38,24 +84,40 @@ class MainWindow(QMainWindow):
         self.tabs.addTab(self.orig_view, "Original")
         self.tabs.addTab(self.ifg_view, "IFG")
         self.tabs.addTab(self.compare_view, "Compare")
+        self.thumbs = ThumbnailPanel()
+        self.thumbs.selected.connect(self.on_thumbnail_selected)
+        self.thumbs.activated.connect(self.on_thumbnail_activated)
+        self.tabs.addTab(self.thumbs, "Folder")
         self.tabs.setTabEnabled(1, False)
         self.tabs.setTabEnabled(2, False)
+        self.tabs.setTabEnabled(3, False)
         self.tabs.currentChanged.connect(self.on_tab_changed)
 
         self.load_btn = QPushButton("Load Image")
+        self.folder_btn = QPushButton("Open Folder")
         self.run_btn = QPushButton("Run Enhancement")
         self.save_ifg = QPushButton("Save IFG")
         self.fit_btn = QPushButton("Fit to View")
+        self.prev_btn = QPushButton("Previous")
+        self.next_btn = QPushButton("Next")
 
-        self.load_btn.setToolTip("Load an image file")
+        self.load_btn.setToolTip("Load an image file (several open them in the Folder tab)")
+        self.folder_btn.setToolTip("Browse the images of a folder as thumbnails")
         self.run_btn.setToolTip("Apply enhancement with current clip limit")
         self.save_ifg.setToolTip("Save the enhanced IFG image")
         self.fit_btn.setToolTip("Fit the image to the view")
+        self.prev_btn.setToolTip("Previous image in the folder (Page Up)")
+        self.next_btn.setToolTip("Next image in the folder (Page Down)")
 
         self.load_btn.clicked.connect(self.load_image)
+        self.folder_btn.clicked.connect(self.load_folder)
         self.run_btn.clicked.connect(self.run_enhancement)
         self.save_ifg.clicked.connect(lambda: self.save_image("ifg"))
         self.fit_btn.clicked.connect(self.fit_all)
+        self.prev_btn.clicked.connect(lambda: self.step_folder(-1))
+        self.next_btn.clicked.connect(lambda: self.step_folder(1))
+        for key, step in ((Qt.Key_PageUp, -1), (Qt.Key_PageDown, 1)):
+            QShortcut(QKeySequence(key), self, activated=lambda step=step: self.step_folder(step))
 
         clip_lbl = QLabel("Clip limit:")
         clip_lbl.setToolTip("Adjust the clip limit for enhancement")
@@ -66,6 +128,15 @@ class MainWindow(QMainWindow):
         self.clip_spin.setDecimals(2)
         self.clip_spin.setFixedWidth(100)
         self.clip_spin.setButtonSymbols(QDoubleSpinBox.NoButtons)
+        self.clip_spin.valueChanged.connect(self.on_clip_changed)
+
+        self.live_chk = QCheckBox("Live preview")
+        self.live_chk.setToolTip("Re-run the enhancement while the clip limit is edited")
+        self.live_chk.toggled.connect(self.on_live_toggled)
+
+        self.ahead_chk = QCheckBox("Enhance ahead")
+        self.ahead_chk.setToolTip("Also enhance the neighbouring images of the folder in the background")
+        self.ahead_chk.toggled.connect(lambda _checked: self.prefetch())
 
         self.toggle_compare_btn = QPushButton("Original vs IFG")
         self.toggle_compare_btn.setCheckable(True)
@@ -75,9 +146,14 @@ class MainWindow(QMainWindow):
 
         top = QHBoxLayout()
         top.addWidget(self.load_btn)
+        top.addWidget(self.folder_btn)
+        top.addWidget(self.prev_btn)
+        top.addWidget(self.next_btn)
         top.addWidget(self.run_btn)
         top.addWidget(clip_lbl)
         top.addWidget(self.clip_spin)
+        top.addWidget(self.live_chk)
+        top.addWidget(self.ahead_chk)
         top.addStretch()
         top.addWidget(self.toggle_compare_btn)
         top.addWidget(self.fit_btn)
@@ -93,10 +169,11 @@ class MainWindow(QMainWindow):
         self.status_timer.setSingleShot(True)
         self.status_timer.timeout.connect(self.status.clearMessage)
 
-        self.orig: Optional[np.ndarray] = None
-        self.ifg: Optional[np.ndarray] = None
-        self.clahe: Optional[np.ndarray] = None
+        self.orig: Optional["np.ndarray"] = None
+        self.ifg: Optional["np.ndarray"] = None
+        self.clahe: Optional["np.ndarray"] = None
         self.orig_path: Optional[str] = None
+        self.orig_digest: Optional[str] = None
         self.updating = False
         self.run_btn.setEnabled(False)
         self.save_ifg.setEnabled(False)
@@ -105,8 +182,46 @@ class MainWindow(QMainWindow):
         for v in (self.orig_view, self.ifg_view, self.compare_view):
             v.transformChanged.connect(self.sync_transform)
 
+        # enhancement jobs run on a reusable pool; a new request supersedes
+        # (cancels) the previous one and results of stale jobs are dropped
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(2)
+        self.job: Optional["Worker"] = None
+        self.jobs = set()
+        self.generation = 0
+        self.result_size = None  # logical size while a proxy preview is shown
+        self.preview_timer = QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(PREVIEW_DEBOUNCE_MS)
+        self.preview_timer.timeout.connect(lambda: self.submit(preview=True))
+        # viewport-first enhancement: the running job's analysis and the
+        # blocks (REGION_BLOCK px) already enhanced or being enhanced
+        self.region_analysis: Optional["Analysis"] = None
+        self.region_blocks: Set[Tuple[int, int]] = set()
+        self.region_timer = QTimer(self)
+        self.region_timer.setSingleShot(True)
+        self.region_timer.setInterval(REGION_DEBOUNCE_MS)
+        self.region_timer.timeout.connect(self.request_region)
+
+        # file reads/writes and prefetching run on their own pool, so a slow
+        # decode never waits behind (or holds up) an enhancement
+        self.io_pool = QThreadPool(self)
+        self.io_pool.setMaxThreadCount(2)
+        self.browser = FolderBrowser()
+        self.decoded = DecodedCache()
+        self.load_generation = 0
+        self.prefetch_job: Optional[PrefetchJob] = None
+        self.update_nav()
+
         self.setStyleSheet(self._style())
 
+    def showEvent(self, event) -> None:
+        super().showEvent(event)
+        if not getattr(self, "_warmed", False):
+            self._warmed = True
+            # after the first paint, not before it
+            QTimer.singleShot(0, warm_up)
+
     def _style(self) -> str:
         return """
             QMainWindow {background: #0b0c0d; color: #dbe2ef;}
@@ -133,18 +248,109 @@ class MainWindow(QMainWindow):
                 min-width: 70px;
             }
             QLabel {color: #dbe2ef; font-weight: 500;}
+            QCheckBox {color: #dbe2ef; font-weight: 500;}
         """
 
     def load_from_path(self, path: str) -> None:
+        """Show `path` (a file, or a folder to browse from its first image), decoding it in the background"""
         if not path or not os.path.exists(path):
             return
-        img = cv2.imread(path, cv2.IMREAD_COLOR)
-        if img is None:
-            self.status.showMessage("Failed to load image")
+        if os.path.isfile(path) and not is_image(path):
+            self.status.showMessage(f"Not a supported image: {os.path.basename(path)}")
+            return
+        folder = os.path.isdir(path)
+        path = self.browser.open(path)
+        self.update_nav()
+        self.update_grid(show=folder)
+        if path is not None:
+            self.open_file(path)
+
+    def load_paths(self, paths) -> None:
+        """Show one file or folder as `load_from_path` does, or the images among several in the Folder tab"""
+        if len(paths) == 1:
+            self.load_from_path(paths[0])
+            return
+        files, seen = [], set()
+        for p in paths:
+            if os.path.isdir(p):
+                found = list_images(p)
+            elif os.path.isfile(p) and is_image(p):
+                found = [p]
+            else:
+                continue
+            for f in found:
+                key = os.path.normcase(os.path.abspath(f))
+                if key not in seen:
+                    seen.add(key)
+                    files.append(f)
+        if not files:
+            self.status.showMessage("No supported images among the dropped files")
             return
+        path = self.browser.open_list(files)
+        self.update_nav()
+        self.update_grid(show=True)
+        self.open_file(path)
+
+    def update_grid(self, show: bool = False) -> None:
+        """Give the Folder tab the browsed files (switching to it with `show`) and select the current one"""
+        if self.thumbs.files != self.browser.files:
+            self.thumbs.set_files(self.browser.files)
+            self.tabs.setTabEnabled(3, len(self.browser.files) > 1)
+        self.thumbs.set_current(self.browser.index)
+        if show and self.tabs.isTabEnabled(3):
+            self.tabs.setCurrentWidget(self.thumbs)
+
+    def on_thumbnail_selected(self, row: int) -> None:
+        if row != self.browser.index:
+            self.browser.index = row
+            self.update_nav()
+            self.open_file(self.browser.current)
+
+    def on_thumbnail_activated(self, row: int) -> None:
+        self.on_thumbnail_selected(row)
+        self.tabs.setCurrentWidget(self.orig_view)
+
+    def step_folder(self, step: int) -> None:
+        path = self.browser.step(step)
+        self.update_nav()
+        self.thumbs.set_current(self.browser.index)
+        if path is not None:
+            self.open_file(path)
+
+    def update_nav(self) -> None:
+        self.prev_btn.setEnabled(self.browser.peek(-1) is not None)
+        self.next_btn.setEnabled(self.browser.peek(1) is not None)
+
+    def open_file(self, path: str) -> None:
+        self.load_generation += 1
+        gen = self.load_generation
+        decoded = self.decoded.get(path)
+        if decoded is not None:
+            self.show_loaded(path, decoded)
+            return
+        self.status.showMessage(f"Loading {os.path.basename(path)}")
+        job = LoadJob(path, self.decoded)
+        job.loaded.connect(lambda p, d: self.on_loaded(gen, p, d))
+        job.failed.connect(lambda p, msg: self.on_load_failed(gen, msg))
+        job.finished.connect(self.on_job_finished)
+        self.jobs.add(job)
+        self.io_pool.start(job.run, 1)  # ahead of queued prefetches
+
+    def on_loaded(self, gen: int, path: str, decoded: Decoded) -> None:
+        if gen == self.load_generation:
+            self.show_loaded(path, decoded)
+
+    def on_load_failed(self, gen: int, message: str) -> None:
+        if gen == self.load_generation:
+            self.status.showMessage(f"Failed to load image: {message}")
+
+    def show_loaded(self, path: str, decoded: Decoded) -> None:
+        img = decoded.image
+        self.orig_digest = decoded.digest
         self.orig = img
         self.orig_path = path
         self.ifg = self.clahe = None
+        self.result_size = None
         self.orig_view.set_image(img)
         self.ifg_view.set_image(None)
         self.compare_view.set_images(None, None)
@@ -156,19 +362,45 @@ class MainWindow(QMainWindow):
         self.toggle_compare_btn.setChecked(False)
         self.toggle_compare_btn.setText("Original vs IFG")
         self.compare_mode_original = True
-        self.status.showMessage(f"Loaded: {os.path.basename(path)}")
+        position = f" ({self.browser.index + 1}/{len(self.browser.files)})" if len(self.browser.files) > 1 else ""
+        self.status.showMessage(f"Loaded: {os.path.basename(path)}{position}")
         self.status_timer.start(5000)
+        self.cancel_job()
+        if self.live_chk.isChecked():
+            self.submit(preview=True)
+        self.prefetch()
+
+    def prefetch(self) -> None:
+        """Decode (and with "Enhance ahead", enhance) the current file's neighbours in the background"""
+        if self.prefetch_job is not None:
+            self.prefetch_job.cancel()
+            self.prefetch_job = None
+        paths = self.browser.neighbours(PREFETCH_RADIUS)
+        if not paths:
+            return
+        clip = self.clip_spin.value() if self.ahead_chk.isChecked() else None
+        job = PrefetchJob(paths, self.decoded, clip)
+        job.finished.connect(self.on_job_finished)
+        self.prefetch_job = job
+        self.jobs.add(job)
+        self.io_pool.start(job.run, -1)
 
     def load_image(self) -> None:
         samples_dir = resource_path("samples")
 
         start_dir = samples_dir if os.path.isdir(samples_dir) else os.path.expanduser("~")
-        path, _ = QFileDialog.getOpenFileName(
+        paths, _ = QFileDialog.getOpenFileNames(
             self,
             "Open Image",
             start_dir,
-            "Images (*.png *.jpg *.jpeg *.bmp *.tiff)"
+            "Images (*.png *.jpg *.jpeg *.bmp *.tif *.tiff)"
         )
+        if paths:
+            self.load_paths(paths)
+
+    def load_folder(self) -> None:
+        start_dir = os.path.dirname(self.orig_path) if self.orig_path else os.path.expanduser("~")
+        path = QFileDialog.getExistingDirectory(self, "Open Folder", start_dir)
         if path:
             self.load_from_path(path)
 
@@ -176,35 +408,169 @@ class MainWindow(QMainWindow):
         if self.orig is None:
             self.status.showMessage("Load an image first")
             return
-        cur_scale, cur_ox, cur_oy = self.orig_view.scale, self.orig_view.offset_x, self.orig_view.offset_y
-        self.run_btn.setEnabled(False)
+        self.submit(preview=False)
+
+    def on_clip_changed(self, value: float) -> None:
+        self.thumbs.set_clip(value)
+        if self.live_chk.isChecked() and self.orig is not None:
+            self.preview_timer.start()
+
+    def on_live_toggled(self, checked: bool) -> None:
+        if checked and self.orig is not None:
+            self.preview_timer.start()
+
+    def cancel_job(self) -> None:
+        self.preview_timer.stop()
+        self.region_timer.stop()
+        self.generation += 1
+        self.region_analysis = None
+        self.region_blocks = set()
+        self.ifg_view.clear_regions()
+        if self.job is not None:
+            self.job.cancel()
+            self.job = None
+
+    def claim_viewport(self) -> Optional[Tuple[int, int, int, int]]:
+        """
+        Block-aligned rectangle (x, y, w, h) covering the visible blocks of
+        the image not enhanced yet, which are then marked as enhanced; None
+        if there are none, or the image is small or mostly visible.
+        """
+        img, view = self.orig, self.orig_view
+        if img is None or img.dtype.itemsize != 1 or view.pyramid is None:
+            return None
+        h, w = img.shape[:2]
+        if w * h < REGION_MIN_PIXELS:
+            return None
+        r = view.visible_rect(view.rect()).intersected(QRectF(0, 0, w, h))
+        if r.isEmpty() or r.width() * r.height() > w * h * REGION_MAX_FRACTION:
+            return None
+        b = REGION_BLOCK
+        cols = range(int(r.left()) // b, (math.ceil(r.right()) - 1) // b + 1)
+        rows = range(int(r.top()) // b, (math.ceil(r.bottom()) - 1) // b + 1)
+        missing = [(bx, by) for by in rows for bx in cols if (bx, by) not in self.region_blocks]
+        if not missing:
+            return None
+        bx0, bx1 = min(bx for bx, _ in missing), max(bx for bx, _ in missing)
+        by0, by1 = min(by for _, by in missing), max(by for _, by in missing)
+        self.region_blocks.update((bx, by) for by in range(by0, by1 + 1) for bx in range(bx0, bx1 + 1))
+        x0, y0 = bx0 * b, by0 * b
+        return x0, y0, min((bx1 + 1) * b, w) - x0, min((by1 + 1) * b, h) - y0
+
+    def request_region(self) -> None:
+        """Enhance the visible part not enhanced yet while the full result is pending"""
+        if self.region_analysis is None:
+            return
+        rect = self.claim_viewport()
+        if rect is None:
+            return
+        from src.gui.worker import RegionJob
+        gen = self.generation
+        job = RegionJob(self.orig, self.region_analysis, rect)
+        job.done.connect(lambda r, img: self.on_region(gen, r, img))
+        job.finished.connect(self.on_job_finished)
+        self.jobs.add(job)
+        self.pool.start(job.run, 1)  # ahead of queued enhancements
+
+    def submit(self, preview: bool) -> None:
+        """Start an enhancement job, superseding the one in flight"""
+        if self.orig is None:
+            return
+        from src.gui.worker import Worker
+        self.cancel_job()
+        gen = self.generation
         self.status.showMessage("Processing")
-        clip = self.clip_spin.value()
-        self.worker = Worker(self.orig, clip)
-        self.worker.done.connect(lambda c, i, k: self.on_done(c, i, k, cur_scale, cur_ox, cur_oy))
-        self.worker.start()
+        job = Worker(self.orig, self.clip_spin.value(), preview=preview, digest=self.orig_digest,
+                     viewport=self.claim_viewport())
+        job.preview.connect(lambda c, i, k: self.on_preview(gen, c, i, k))
+        job.analysed.connect(lambda a: self.on_analysed(gen, a))
+        job.region.connect(lambda r, img: self.on_region(gen, r, img))
+        job.clahe_ready.connect(lambda c: self.on_clahe_ready(gen, c))
+        job.done.connect(lambda c, i, k, t: self.on_done(gen, c, i, k, t))
+        job.finished.connect(self.on_job_finished)
+        self.job = job
+        self.jobs.add(job)  # keep the job alive until its queued signals are delivered
+        self.pool.start(job.run)
+        if self.ahead_chk.isChecked():
+            self.prefetch()  # with the clip limit just used
+
+    def on_job_finished(self) -> None:
+        self.jobs.discard(self.sender())
+
+    def on_preview(self, gen: int, clahe_img, ifg_img, k: float) -> None:
+        if gen != self.generation:
+            return
+        size = (self.orig.shape[1], self.orig.shape[0])
+        self.clahe, self.ifg = clahe_img, ifg_img
+        self.show_results(size)
+        self.status.showMessage(f"Preview (k = {k:.3f}), refining")
+
+    def on_analysed(self, gen: int, analysis: "Analysis") -> None:
+        if gen == self.generation and self.job is not None:
+            self.region_analysis = analysis
+            self.request_region()  # the view may have moved since the job started
 
-    def on_done(self, clahe_img, ifg_img, k: float, saved_scale: float, saved_ox: float, saved_oy: float) -> None:
+    def on_region(self, gen: int, rect, ifg_img) -> None:
+        if gen != self.generation or self.job is None:
+            return
+        if self.ifg_view.pyramid is None:
+            # nothing shown yet: draw the regions over the original until the full result
+            scale, ox, oy = self.orig_view.scale, self.orig_view.offset_x, self.orig_view.offset_y
+            self.updating = True
+            self.ifg_view.set_image(self.orig)
+            self.ifg_view.set_transform(scale, ox, oy)
+            self.updating = False
+            self.tabs.setTabEnabled(1, True)
+        self.ifg_view.add_region(rect[0], rect[1], ifg_img)
+        self.status.showMessage("Visible region enhanced, running the full image")
+
+    def on_clahe_ready(self, gen: int, clahe_img) -> None:
+        if gen != self.generation:
+            return
+        self.status.showMessage("CLAHE ready, running IFG")
+        if self.result_size is not None:
+            return  # keep the proxy pair consistent until the full result arrives
+        self.clahe = clahe_img
+        if self.ifg is None:
+            self.compare_view.set_images(self.orig, clahe_img, "Original", "CLAHE")
+            self.tabs.setTabEnabled(2, True)
+
+    def on_done(self, gen: int, clahe_img, ifg_img, k: float, timings: dict) -> None:
+        if gen != self.generation:
+            return
+        self.job = None
+        self.region_analysis = None
         self.clahe, self.ifg = clahe_img, ifg_img
-        self.ifg_view.set_image(ifg_img)
-        self.compare_mode_original = True
-        self.toggle_compare_btn.setChecked(False)
-        self.toggle_compare_btn.setText("Original vs IFG")
-        self.compare_view.set_images(self.orig, self.ifg, "Original", "IFG")
+        self.show_results()
+        if timings:
+            from src.enhancements.timing import format_stages
+            self.status.showMessage(f"Processed (k = {k:.3f}): {format_stages(timings)}")
+            self.status_timer.start(15000)
+        else:
+            self.status.showMessage(f"Processed (k = {k:.3f}, cached)")
+            self.status_timer.start(5000)
+
+    def show_results(self, size=None) -> None:
+        """Display self.ifg/self.clahe (stretched to `size` for a preview) keeping the current view"""
+        saved_scale, saved_ox, saved_oy = self.orig_view.scale, self.orig_view.offset_x, self.orig_view.offset_y
+        self.result_size = size
+        self.updating = True
+        self.ifg_view.set_image(self.ifg, size)
+        if self.compare_mode_original or self.clahe is None:
+            self.compare_view.set_images(self.orig, self.ifg, "Original", "IFG", size=size)
+        else:
+            self.compare_view.set_images(self.clahe, self.ifg, "CLAHE", "IFG", size=size)
+        self.updating = False
         self.tabs.setTabEnabled(1, True)
         self.tabs.setTabEnabled(2, True)
-        self.save_ifg.setEnabled(True)
-        self.run_btn.setEnabled(True)
+        self.save_ifg.setEnabled(size is None)
 
         for v in (self.orig_view, self.ifg_view):
-            if v.pix is not None:
+            if v.pyramid is not None:
                 v.set_transform(saved_scale, saved_ox, saved_oy)
-        if self.compare_view.left_pix is not None:
+        if self.compare_view.left_pyr is not None:
             self.compare_view.set_transform(saved_scale, saved_ox, saved_oy)
 
-        self.status.showMessage(f"Processed (k = {k:.3f})")
-        self.status_timer.start(5000)
-
         if self.tabs.currentWidget() == self.compare_view:
             self.toggle_compare_btn.setEnabled(True)
 
@@ -214,9 +580,9 @@ class MainWindow(QMainWindow):
             if self.ifg is not None:
                 self.toggle_compare_btn.setEnabled(True)
                 if self.compare_mode_original:
-                    self.compare_view.set_images(self.orig, self.ifg, "Original", "IFG")
+                    self.compare_view.set_images(self.orig, self.ifg, "Original", "IFG", size=self.result_size)
                 else:
-                    self.compare_view.set_images(self.clahe, self.ifg, "CLAHE", "IFG")
+                    self.compare_view.set_images(self.clahe, self.ifg, "CLAHE", "IFG", size=self.result_size)
             else:
                 self.toggle_compare_btn.setEnabled(False)
         else:
@@ -227,25 +593,27 @@ class MainWindow(QMainWindow):
             return
         if self.toggle_compare_btn.isChecked():
             if self.clahe is not None:
-                self.compare_view.set_images(self.clahe, self.ifg, "CLAHE", "IFG")
+                self.compare_view.set_images(self.clahe, self.ifg, "CLAHE", "IFG", size=self.result_size)
                 self.toggle_compare_btn.setText("CLAHE vs IFG")
                 self.compare_mode_original = False
             else:
                 self.toggle_compare_btn.setChecked(False)
         else:
-            self.compare_view.set_images(self.orig, self.ifg, "Original", "IFG")
+            self.compare_view.set_images(self.orig, self.ifg, "Original", "IFG", size=self.result_size)
             self.toggle_compare_btn.setText("Original vs IFG")
             self.compare_mode_original = True
 
     def sync_transform(self, scale: float, ox: float, oy: float) -> None:
         if self.updating:
             return
+        if self.region_analysis is not None:
+            self.region_timer.start()
         self.updating = True
         sender = self.sender()
         for v in (self.orig_view, self.ifg_view):
-            if v != sender and v.pix is not None:
+            if v != sender and v.pyramid is not None:
                 v.set_transform(scale, ox, oy)
-        if self.compare_view != sender and self.compare_view.left_pix is not None:
+        if self.compare_view != sender and self.compare_view.left_pyr is not None:
             self.compare_view.set_transform(scale, ox, oy)
         self.updating = False
 
@@ -263,8 +631,25 @@ class MainWindow(QMainWindow):
         dir_ = os.path.dirname(self.orig_path) if self.orig_path else ""
         path, _ = QFileDialog.getSaveFileName(
             self, "Save IFG", os.path.join(dir_, suggest),
-            "PNG (*.png);;JPEG (*.jpg)")
+            "PNG (*.png);;TIFF (*.tif *.tiff);;JPEG (*.jpg)")
         if path:
-            cv2.imwrite(path, img)
-            self.status.showMessage("Saved IFG")
-            self.status_timer.start(5000)
+            self.status.showMessage(f"Saving {os.path.basename(path)}")
+            job = SaveJob(path, img)
+            job.saved.connect(self.on_saved)
+            job.failed.connect(lambda p, msg: self.status.showMessage(f"Failed to save: {msg}"))
+            job.finished.connect(self.on_job_finished)
+            self.jobs.add(job)
+            self.io_pool.start(job.run, 1)
+
+    def on_saved(self, path: str) -> None:
+        self.status.showMessage(f"Saved IFG to {os.path.basename(path)}")
+        self.status_timer.start(5000)
+
+    def closeEvent(self, event) -> None:
+        self.cancel_job()
+        if self.prefetch_job is not None:
+            self.prefetch_job.cancel()
+        self.thumbs.shutdown()
+        self.pool.waitForDone()
+        self.io_pool.waitForDone()  # lets a pending save finish
+        super().closeEvent(event)
@@ -1,28 +1,138 @@
-"""Background worker thread for processing images"""
+"""Background jobs for processing images"""
 
-from typing import Tuple, Any
-from PySide6.QtCore import QThread, Signal
+from typing import Optional, Tuple
+import threading
+from PySide6.QtCore import QObject, Signal
+import cv2
 import numpy as np
 
-from src.enhancements import clahe_apply, ifg_enhance
+from src.enhancements import roi
+from src.enhancements.timing import StageTimer
+from src.utils.cache import default_cache
 
 
-class Worker(QThread):
-    """Worker that runs enhancement algorithms off the GUI thread
+PREVIEW_MAX_SIDE = 1024
+
+
+def make_proxy(img: np.ndarray, max_side: int = PREVIEW_MAX_SIDE) -> np.ndarray:
+    """Downscale `img` so its longer side is at most `max_side` (no-op if already smaller)"""
+    h, w = img.shape[:2]
+    f = max_side / max(h, w)
+    if f >= 1.0:
+        return img
+    size = (max(1, round(w * f)), max(1, round(h * f)))
+    return cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+
+
+def _readonly(img: np.ndarray) -> np.ndarray:
+    """Read-only view of `img`; the job never writes to its input"""
+    view = img.view()
+    view.flags.writeable = False
+    return view
+
+
+class Worker(QObject):
+    """Job that runs enhancement algorithms; start it with `pool.start(worker.run)`
+
+    Results come from the process-wide result cache when the same image was
+    already enhanced with the same settings. Both enhancements share one
+    colour conversion and run concurrently; the CLAHE result is emitted as
+    soon as it is ready. With `preview`, a downscaled proxy is enhanced
+    first so a coarse result can be shown quickly, unless the full result
+    is already cached. `digest` (the image's content hash, if the caller
+    has it) saves hashing the image again. A cancelled job stops at
+    the next stage boundary and emits nothing further except `finished`.
+    `done` carries the per-stage summary of a `StageTimer` for the
+    full-resolution run (empty when the IFG result came from the cache).
+
+    With a `viewport` (x, y, width, height) of an 8-bit image, the IFG
+    result for just that rectangle comes before the full run: the image
+    is analysed (`roi.analyse`, a histogram pass), the analysis is emitted
+    for enhancing further regions with `RegionJob`, and then the region.
 
     Emits:
-        done(clahe_img: np.ndarray, ifg_img: np.ndarray, k: float)
+        preview(clahe_img: np.ndarray, ifg_img: np.ndarray, k: float)  (proxy resolution)
+        analysed(analysis: roi.Analysis)
+        region(rect: tuple, ifg_img: np.ndarray)
+        clahe_ready(clahe_img: np.ndarray)
+        done(clahe_img: np.ndarray, ifg_img: np.ndarray, k: float, timings: dict)
+        finished()
     """
-    done = Signal(object, object, float)
+    preview = Signal(object, object, float)
+    analysed = Signal(object)
+    region = Signal(object, object)
+    clahe_ready = Signal(object)
+    done = Signal(object, object, float, object)
+    finished = Signal()
 
-    def __init__(self, img: np.ndarray, clip: float = 2.0):
+    def __init__(self, img: np.ndarray, clip: float = 2.0, preview: bool = False, digest: Optional[str] = None,
+                 viewport: Optional[Tuple[int, int, int, int]] = None):
         super().__init__()
-        self._img = img.copy() if img is not None else None
+        self._img = _readonly(img) if img is not None else None
         self._clip = float(clip)
+        self._preview = preview
+        self._digest = digest
+        self._viewport = viewport
+        self._cancelled = threading.Event()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    def is_cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def _emit_clahe(self, clahe_img: np.ndarray) -> None:
+        if not self.is_cancelled():
+            self.clahe_ready.emit(clahe_img)
+
+    def run(self) -> None:
+        try:
+            if self._img is None or self.is_cancelled():
+                return
+            cache = default_cache()
+            cached = bool(self._digest and cache.has_pipeline(self._digest, self._clip))
+            if self._preview and not cached:
+                proxy = make_proxy(self._img)
+                if proxy is not self._img:
+                    clahe_img, ifg_img, k = cache.pipeline(proxy, clip=self._clip)
+                    if self.is_cancelled():
+                        return
+                    self.preview.emit(clahe_img, ifg_img, k)
+            if self._viewport is not None and not cached and self._img.dtype == np.uint8:
+                analysis = roi.analyse(self._img, self._clip)
+                if self.is_cancelled():
+                    return
+                self.analysed.emit(analysis)
+                self.region.emit(self._viewport, roi.enhance(self._img, analysis, self._viewport))
+            if self.is_cancelled():
+                return
+            timer, stats = StageTimer(), {}
+            clahe_img, ifg_img, k = cache.pipeline(self._img, clip=self._clip, digest=self._digest,
+                                                   on_clahe=self._emit_clahe, stats=stats, timer=timer)
+            if not self.is_cancelled():
+                self.done.emit(clahe_img, ifg_img, k, {} if stats["cached"] else timer.summary())
+        finally:
+            self.finished.emit()
+
+
+class RegionJob(QObject):
+    """Job enhancing one rectangle of an image from its `roi.Analysis`; start it with `pool.start(job.run)`
+
+    Emits:
+        done(rect: tuple, ifg_img: np.ndarray)
+        finished()
+    """
+    done = Signal(object, object)
+    finished = Signal()
+
+    def __init__(self, img: np.ndarray, analysis: roi.Analysis, rect: Tuple[int, int, int, int]):
+        super().__init__()
+        self._img = _readonly(img)
+        self._analysis = analysis
+        self._rect = rect
 
     def run(self) -> None:
-        if self._img is None:
-            return
-        clahe_img = clahe_apply(self._img, clip=self._clip)
-        ifg_img, k = ifg_enhance(self._img, clip=self._clip)
-        self.done.emit(clahe_img, ifg_img, k)
+        try:
+            self.done.emit(self._rect, roi.enhance(self._img, self._analysis, self._rect))
+        finally:
+            self.finished.emit()
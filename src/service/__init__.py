@@ -0,0 +1,31 @@
+"""Local enhancement service: asyncio HTTP server, process pool, client
+
+Run it with `ifg-enhance serve`; see `server` for the protocol. The names
+below are resolved on first access, so importing the client does not
+import OpenCV or start anything.
+"""
+
+import importlib
+
+_EXPORTS = {
+    "EnhanceServer": ("server", "EnhanceServer"),
+    "ServiceClient": ("client", "ServiceClient"),
+    "ServiceError": ("client", "ServiceError"),
+    "EnhanceResult": ("client", "EnhanceResult"),
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    try:
+        module, attr = _EXPORTS[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    value = getattr(importlib.import_module(f".{module}", __name__), attr)
+    globals()[name] = value  # later lookups skip this hook
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -0,0 +1,144 @@
+"""Blocking client for the enhancement service (stdlib `http.client`)
+
+    with ServiceClient(port=8765) as client:
+        result = client.enhance(img, clip=2.0)     # raw array in, array out
+        png = client.enhance(open("a.jpg", "rb").read()).image   # encoded in, PNG bytes out
+        client.metrics()["latency_percentiles"]
+
+A client keeps one keep-alive connection and is not thread-safe; use one
+per thread.
+"""
+
+import http.client
+import json
+import socket
+from typing import Dict, NamedTuple, Optional, Tuple, Union
+from urllib.parse import urlencode
+
+import numpy as np
+
+from .protocol import RAW_CONTENT_TYPE
+
+
+class ServiceError(Exception):
+    """Non-200 answer from the service"""
+
+    def __init__(self, status: int, message: str, retry_after: Optional[float] = None):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def busy(self) -> bool:
+        """The request was rejected because the service queue is full (retry later)"""
+        return self.status == 429
+
+
+class EnhanceResult(NamedTuple):
+    image: Union[np.ndarray, bytes]  # array for raw requests, encoded bytes otherwise
+    k: Optional[float]
+    queue_ms: float
+    process_ms: float
+    batch_size: int
+
+
+class _UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: Optional[float] = None):
+        super().__init__("localhost", timeout=timeout)
+        self.path = path
+
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+class ServiceClient:
+    """Client for a local `EnhanceServer` on TCP (`host`, `port`) or a Unix socket"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765, unix_path: Optional[str] = None,
+                 timeout: Optional[float] = 60.0):
+        self.host, self.port, self.unix_path, self.timeout = host, port, unix_path, timeout
+        self._conn: Optional[http.client.HTTPConnection] = None
+
+    def _connection(self) -> http.client.HTTPConnection:
+        if self._conn is None:
+            if self.unix_path is not None:
+                self._conn = _UnixConnection(self.unix_path, self.timeout)
+            else:
+                self._conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return self._conn
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def __enter__(self) -> "ServiceClient":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _request(self, method: str, path: str, body: Optional[bytes] = None,
+                 headers: Optional[Dict[str, str]] = None) -> Tuple[http.client.HTTPResponse, bytes]:
+        for attempt in (0, 1):
+            conn = self._connection()
+            try:
+                conn.request(method, path, body=body, headers=headers or {})
+                resp = conn.getresponse()
+                data = resp.read()
+            except (ConnectionError, http.client.RemoteDisconnected, http.client.BadStatusLine):
+                # the server closed an idle keep-alive connection; reconnect once
+                self.close()
+                if attempt:
+                    raise
+                continue
+            if resp.getheader("Connection", "").lower() == "close":
+                self.close()
+            if resp.status != 200:
+                try:
+                    message = json.loads(data)["error"]
+                except (ValueError, KeyError):
+                    message = data.decode("utf-8", "replace")
+                retry = resp.getheader("Retry-After")
+                raise ServiceError(resp.status, message, float(retry) if retry else None)
+            return resp, data
+
+    def enhance(self, image: Union[np.ndarray, bytes], engine: str = "ifg", clip: float = 2.0,
+                grid: Tuple[int, int] = (8, 8), search: Optional[str] = None, tol: Optional[float] = None,
+                max_evals: Optional[int] = None, fmt: Optional[str] = None) -> EnhanceResult:
+        """
+        Enhance `image`: a uint8 BGR array (sent raw, returned as an array)
+        or encoded image bytes (returned encoded as `fmt`, default PNG).
+        Raises `ServiceError` (`.busy` when the queue was full).
+        """
+        query = {"engine": engine, "clip": repr(float(clip))}
+        if engine == "clahe":
+            query["grid"] = f"{grid[0]}x{grid[1]}"
+        for name, value in (("search", search), ("tol", tol), ("max_evals", max_evals), ("format", fmt)):
+            if value is not None:
+                query[name] = str(value)
+        if isinstance(image, np.ndarray):
+            if image.dtype != np.uint8 or image.ndim != 3 or image.shape[2] != 3:
+                raise ValueError("image must be a uint8 BGR array")
+            body = np.ascontiguousarray(image).data
+            headers = {"Content-Type": RAW_CONTENT_TYPE, "X-Shape": ",".join(map(str, image.shape))}
+        else:
+            body, headers = bytes(image), {"Content-Type": "application/octet-stream"}
+
+        resp, data = self._request("POST", f"/enhance?{urlencode(query)}", body, headers)
+        if isinstance(image, np.ndarray):
+            shape = tuple(int(n) for n in resp.getheader("X-Shape").split(","))
+            out = np.frombuffer(data, dtype=np.uint8).reshape(shape)
+        else:
+            out = data
+        k = resp.getheader("X-K")
+        return EnhanceResult(out, float(k) if k is not None else None, float(resp.getheader("X-Queue-Ms")),
+                             float(resp.getheader("X-Process-Ms")), int(resp.getheader("X-Batch-Size")))
+
+    def metrics(self) -> Dict:
+        return json.loads(self._request("GET", "/metrics")[1])
+
+    def health(self) -> Dict:
+        return json.loads(self._request("GET", "/health")[1])
@@ -0,0 +1,91 @@
+"""Work done inside the service's pool processes
+
+A job is a plain dict so it pickles cheaply:
+
+    {"engine": "ifg" | "clahe", "clip": float, "grid": (8, 8),
+     "search": {"search": ..., "tol": ..., "max_evals": ...},
+     "data": bytes, "shape": (h, w, 3) or None, "format": ".png" or None}
+
+`shape` marks `data` as a raw uint8 BGR array; otherwise it is an encoded
+image (anything `cv2.imdecode` reads). The result keeps the input kind:
+raw bytes for a raw array, an image encoded as `format` otherwise.
+"""
+
+import time
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from src.enhancements import CLAHEEnhancer, IFGEnhancer, parallel
+from src.enhancements.search import make_search
+
+
+# per-process enhancers reusing their buffers across same-sized images
+_ifg_enhancers: Dict = {}
+_clahe_enhancer = CLAHEEnhancer()
+
+
+def init_worker() -> None:
+    # one process per core already; keep OpenCV and the banded NumPy work from oversubscribing them
+    cv2.setNumThreads(1)
+    parallel.set_num_threads(1)
+
+
+def ping() -> bool:
+    """No-op used to start the pool processes ahead of the first request"""
+    return True
+
+
+def _decode(job: Dict) -> np.ndarray:
+    data, shape = job["data"], job.get("shape")
+    if shape is not None:
+        shape = tuple(shape)
+        if len(shape) != 3 or shape[2] != 3 or len(data) != shape[0] * shape[1] * 3:
+            raise ValueError(f"raw image of {len(data)} bytes does not match shape {shape}")
+        return np.frombuffer(data, dtype=np.uint8).reshape(shape)
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("could not decode image")
+    return img
+
+
+def _encode(img: np.ndarray, job: Dict) -> bytes:
+    if job.get("shape") is not None:
+        return img.tobytes()
+    ok, buf = cv2.imencode(job.get("format") or ".png", img)
+    if not ok:
+        raise ValueError(f"could not encode as {job.get('format')}")
+    return buf.tobytes()
+
+
+def process_one(job: Dict) -> Dict:
+    """Decode, enhance and encode one job; returns its result record"""
+    t0 = time.perf_counter()
+    try:
+        img = _decode(job)
+        k: Optional[float] = None
+        if job["engine"] == "ifg":
+            search = make_search(**job["search"])
+            enhancer = _ifg_enhancers.get(search)
+            if enhancer is None:
+                enhancer = _ifg_enhancers[search] = IFGEnhancer(search=search)
+            out, k = enhancer.enhance(img, clip=job["clip"])
+        elif job["engine"] == "clahe":
+            out = _clahe_enhancer.apply(img, clip=job["clip"], grid=tuple(job["grid"]))
+        else:
+            raise ValueError(f"unknown engine {job['engine']!r}")
+        # the enhancers' outputs live in reused buffers; encoding copies them out
+        data = _encode(out, job)
+        return {"status": "ok", "data": data, "shape": img.shape, "k": k,
+                "seconds": time.perf_counter() - t0}
+    except ValueError as exc:
+        return {"status": "error", "code": 400, "error": str(exc), "seconds": time.perf_counter() - t0}
+    except Exception as exc:
+        return {"status": "error", "code": 500, "error": f"{type(exc).__name__}: {exc}",
+                "seconds": time.perf_counter() - t0}
+
+
+def process_batch(jobs: List[Dict]) -> List[Dict]:
+    """Run a micro-batch of jobs in one pool task (one round trip for many small images)"""
+    return [process_one(job) for job in jobs]
@@ -0,0 +1,111 @@
+"""Counters, latency histograms and throughput for the service"""
+
+import time
+from collections import Counter, deque
+from typing import Deque, Dict, Sequence, Tuple
+
+from src.enhancements.timing import percentiles
+
+
+# upper bounds in seconds; the last bucket catches everything above
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32)
+
+
+class Histogram:
+    """Fixed-bucket histogram (cumulative counts, as Prometheus reports them)"""
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.bounds):
+            if value <= bound:
+                break
+        else:
+            i = len(self.bounds)
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self) -> Dict:
+        cumulative, running = {}, 0
+        for bound, n in zip(self.bounds + ("+Inf",), self.counts):
+            running += n
+            cumulative[f"{bound:g}" if bound != "+Inf" else bound] = running
+        return {"buckets": cumulative, "count": self.count, "sum": self.sum}
+
+
+class Metrics:
+    """
+    Service statistics. Only touched from the event loop thread, so no
+    locking is needed.
+
+    Percentiles are exact over the last `window` completed requests;
+    throughput is given over the whole uptime and the last `rate_window`
+    seconds.
+    """
+
+    def __init__(self, window: int = 1024, rate_window: float = 60.0):
+        self.started = time.monotonic()
+        self.rate_window = rate_window
+        self.responses: Counter = Counter()
+        self.rejected = 0
+        self.images = 0
+        self.megapixels = 0.0
+        self.batches = 0
+        self.latency = {name: Histogram(LATENCY_BUCKETS) for name in ("queue", "process", "total")}
+        self.batch_size = Histogram(BATCH_BUCKETS)
+        self._recent: Deque[Dict[str, float]] = deque(maxlen=window)
+        self._completions: Deque[Tuple[float, float]] = deque()
+
+    def response(self, status: int) -> None:
+        self.responses[status] += 1
+        if status == 429:
+            self.rejected += 1
+
+    def batch(self, size: int, seconds: float) -> None:
+        self.batches += 1
+        self.batch_size.observe(size)
+        self.latency["process"].observe(seconds)
+
+    def completed(self, queue: float, total: float, megapixels: float) -> None:
+        """One image enhanced: its queue wait, receipt-to-response time and size"""
+        self.latency["queue"].observe(queue)
+        self.latency["total"].observe(total)
+        self._recent.append({"queue": queue, "total": total})
+        self.images += 1
+        self.megapixels += megapixels
+        self._completions.append((time.monotonic(), megapixels))
+
+    def _rate(self) -> Dict[str, float]:
+        now = time.monotonic()
+        while self._completions and self._completions[0][0] < now - self.rate_window:
+            self._completions.popleft()
+        span = min(self.rate_window, now - self.started) or 1e-9
+        uptime = max(now - self.started, 1e-9)
+        return {
+            "images_per_s": self.images / uptime,
+            "mp_per_s": self.megapixels / uptime,
+            "recent_images_per_s": len(self._completions) / span,
+            "recent_mp_per_s": sum(mp for _, mp in self._completions) / span,
+        }
+
+    def snapshot(self, **gauges) -> Dict:
+        """Everything as a JSON-ready dict; `gauges` (queue depth etc.) are included as is"""
+        return {
+            "uptime": time.monotonic() - self.started,
+            **gauges,
+            "responses": {str(code): n for code, n in sorted(self.responses.items())},
+            "rejected": self.rejected,
+            "images": self.images,
+            "megapixels": self.megapixels,
+            "batches": self.batches,
+            "throughput": self._rate(),
+            "latency": {name: h.snapshot() for name, h in self.latency.items()},
+            "latency_percentiles": percentiles(self._recent),
+            "batch_size": self.batch_size.snapshot(),
+        }
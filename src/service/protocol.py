@@ -0,0 +1,6 @@
+"""Names shared by the service and its client (importable without OpenCV)"""
+
+# request/response body holding raw uint8 BGR bytes, shape in the X-Shape header
+RAW_CONTENT_TYPE = "application/x-ndarray"
+
+ENGINES = ("ifg", "clahe")
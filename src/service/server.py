@@ -0,0 +1,381 @@
+"""Local HTTP enhancement service on asyncio
+
+A minimal HTTP/1.1 server (stdlib only, keep-alive, Content-Length bodies)
+listening on localhost TCP or a Unix socket:
+
+    POST /enhance?engine=ifg&clip=2.0   body: encoded image -> encoded image
+    POST /enhance?engine=clahe&grid=8x8 body: raw BGR bytes with
+                                        Content-Type application/x-ndarray
+                                        and X-Shape: H,W,3 -> raw bytes
+    GET  /metrics                       queue depth, latency histograms, throughput
+    GET  /health
+
+Other query parameters: `search`, `tol`, `max_evals` (k search, as on the
+command line) and `format` (output encoding for encoded inputs, default
+.png). Responses carry `X-K` (IFG only), `X-Queue-Ms`, `X-Process-Ms` and
+`X-Batch-Size`.
+
+Requests wait in a bounded queue; when it is full the request is rejected
+at once with 429 and Retry-After rather than piling up. A dispatcher feeds
+the queue to a process pool with at most one batch in flight per worker,
+and small requests (bodies up to `batch_bytes`) that are waiting together
+are sent as one micro-batch, so a stream of thumbnails costs one pool
+round trip per batch rather than per image. Decoding, enhancing and
+encoding all happen in the pool processes.
+"""
+
+import asyncio
+import json
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from src.enhancements.search import STRATEGIES
+from . import jobs
+from .metrics import Metrics
+from .protocol import ENGINES, RAW_CONTENT_TYPE
+
+
+_REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    411: "Length Required", 413: "Payload Too Large", 429: "Too Many Requests",
+    500: "Internal Server Error", 503: "Service Unavailable",
+}
+
+
+class _Request:
+    __slots__ = ("job", "size", "future", "queued")
+
+    def __init__(self, job: Dict, future: asyncio.Future):
+        self.job = job
+        self.size = len(job["data"])
+        self.future = future
+        self.queued = time.perf_counter()
+
+
+class _HTTPError(Exception):
+    def __init__(self, status: int, message: str, headers: Optional[Dict[str, str]] = None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+class EnhanceServer:
+    """
+    IFG/CLAHE enhancement over HTTP.
+
+    Parameters
+    ----------
+    host, port
+        TCP address (port 0 picks a free one; see `address` after `start`).
+    unix_path : str, optional
+        Listen on this Unix socket instead of TCP.
+    workers : int, optional
+        Pool processes (default: number of cores).
+    queue_size : int
+        Requests allowed to wait; further ones get 429.
+    max_batch : int
+        Largest micro-batch of small requests.
+    batch_bytes : int
+        Requests with bodies up to this size are small enough to batch.
+    batch_window : float
+        Seconds the dispatcher waits for company when a small request
+        arrives to an empty queue (0 batches only what is already waiting).
+    max_body : int
+        Largest accepted request body (413 above).
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765, unix_path: Optional[str] = None,
+                 workers: Optional[int] = None, queue_size: int = 64, max_batch: int = 8,
+                 batch_bytes: int = 2**20, batch_window: float = 0.002, max_body: int = 256 * 2**20):
+        if queue_size < 1 or max_batch < 1:
+            raise ValueError("queue_size and max_batch must be at least 1")
+        self.host, self.port, self.unix_path = host, port, unix_path
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.max_batch = max_batch
+        self.batch_bytes = batch_bytes
+        self.batch_window = batch_window
+        self.max_body = max_body
+        self.metrics = Metrics()
+        self._queue: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._running: set = set()
+        self._in_flight = 0
+        self._closing = False
+
+    # -- lifecycle ---------------------------------------------------------------
+
+    @property
+    def address(self) -> str:
+        if self.unix_path is not None:
+            return f"unix:{self.unix_path}"
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self) -> None:
+        """Start the pool processes, the dispatcher and the listening socket"""
+        loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(self.queue_size)
+        self._slots = asyncio.Semaphore(self.workers)
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=jobs.init_worker)
+        # spawn every worker now rather than on the first requests
+        await asyncio.gather(*(loop.run_in_executor(self._pool, jobs.ping) for _ in range(self.workers)))
+        self._dispatcher = asyncio.create_task(self._dispatch())
+        if self.unix_path is not None:
+            self._server = await asyncio.start_unix_server(self._handle, path=self.unix_path)
+        else:
+            self._server = await asyncio.start_server(self._handle, self.host, self.port)
+            self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self) -> None:
+        if self._server is None:
+            await self.start()
+        await self._server.serve_forever()
+
+    async def close(self) -> None:
+        """Stop accepting, finish the running batches, answer queued requests with 503"""
+        self._closing = True
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+        while self._queue is not None and not self._queue.empty():
+            req = self._queue.get_nowait()
+            if not req.future.done():
+                req.future.set_exception(_HTTPError(503, "server shutting down"))
+        if self._pool is not None:
+            self._pool.shutdown()
+        if self.unix_path is not None and os.path.exists(self.unix_path):
+            os.unlink(self.unix_path)
+
+    def run(self, on_ready: Optional[Callable[["EnhanceServer"], None]] = None) -> None:
+        """Serve until interrupted (blocking); `on_ready(server)` is called once listening"""
+        async def main():
+            loop = asyncio.get_running_loop()
+            if hasattr(signal, "SIGTERM") and os.name == "posix":
+                # shut down cleanly (socket file, pool) when terminated too
+                loop.add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+            try:
+                await self.start()
+                if on_ready is not None:
+                    on_ready(self)
+                await self.serve_forever()
+            finally:
+                await self.close()
+        try:
+            asyncio.run(main())
+        except (KeyboardInterrupt, asyncio.CancelledError):
+            pass
+
+    # -- queue and dispatch ------------------------------------------------------
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def submit(self, job: Dict) -> Dict:
+        """Queue a job and wait for its result; raises _HTTPError(429) if the queue is full"""
+        if self._closing:
+            raise _HTTPError(503, "server shutting down")
+        req = _Request(job, asyncio.get_running_loop().create_future())
+        try:
+            self._queue.put_nowait(req)
+        except asyncio.QueueFull:
+            raise _HTTPError(429, "queue full", {"Retry-After": "1"}) from None
+        return await req.future
+
+    async def _dispatch(self) -> None:
+        carry: Optional[_Request] = None
+        batch: List[_Request] = []
+        try:
+            while True:
+                first = carry if carry is not None else await self._queue.get()
+                carry = None
+                batch = [first]
+                await self._slots.acquire()
+                if first.size <= self.batch_bytes:
+                    if self._queue.empty() and self.batch_window > 0:
+                        await asyncio.sleep(self.batch_window)
+                    while len(batch) < self.max_batch and not self._queue.empty():
+                        nxt = self._queue.get_nowait()
+                        if nxt.size > self.batch_bytes:
+                            carry = nxt  # large requests go on their own
+                            break
+                        batch.append(nxt)
+                task = asyncio.create_task(self._run_batch(batch))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+                batch = []
+        except asyncio.CancelledError:
+            # requests taken off the queue but not yet handed to the pool
+            for req in batch + ([carry] if carry is not None else []):
+                if not req.future.done():
+                    req.future.set_exception(_HTTPError(503, "server shutting down"))
+            raise
+
+    async def _run_batch(self, batch: List[_Request]) -> None:
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        self._in_flight += len(batch)
+        try:
+            results = await loop.run_in_executor(self._pool, jobs.process_batch, [r.job for r in batch])
+        except Exception as exc:
+            results = [{"status": "error", "code": 500, "error": f"worker failed: {exc}", "seconds": 0.0}
+                       for _ in batch]
+        finally:
+            self._in_flight -= len(batch)
+            self._slots.release()
+        self.metrics.batch(len(batch), time.perf_counter() - started)
+        for req, result in zip(batch, results):
+            result["queue"] = started - req.queued
+            result["batch"] = len(batch)
+            if not req.future.done():
+                req.future.set_result(result)
+
+    # -- HTTP --------------------------------------------------------------------
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line.strip():
+                    break
+                received = time.perf_counter()
+                keep_alive = True
+                try:
+                    method, target, version = line.decode("latin-1").split()
+                    headers = await self._read_headers(reader)
+                    keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                    body = await self._read_body(reader, headers)
+                    status, out_headers, payload = await self._route(method, target, headers, body, received)
+                except _HTTPError as exc:
+                    status, out_headers = exc.status, dict(exc.headers)
+                    payload = json.dumps({"error": str(exc)}).encode()
+                    out_headers["Content-Type"] = "application/json"
+                    if status in (411, 413):
+                        keep_alive = False  # the unread body is still in the stream
+                except ValueError:
+                    status, out_headers, payload = 400, {"Content-Type": "application/json"}, b'{"error": "malformed request"}'
+                    keep_alive = False
+                self.metrics.response(status)
+                self._write_response(writer, status, out_headers, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_headers(reader: asyncio.StreamReader) -> Dict[str, str]:
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                return headers
+            name, value = line.decode("latin-1").split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+
+    async def _read_body(self, reader: asyncio.StreamReader, headers: Dict[str, str]) -> bytes:
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            raise _HTTPError(411, "chunked bodies are not supported; send Content-Length")
+        length = int(headers.get("content-length", "0"))
+        if length > self.max_body:
+            raise _HTTPError(413, f"body larger than {self.max_body} bytes")
+        return await reader.readexactly(length) if length else b""
+
+    @staticmethod
+    def _write_response(writer: asyncio.StreamWriter, status: int, headers: Dict[str, str],
+                        payload: bytes, keep_alive: bool) -> None:
+        head = [f"HTTP/1.1 {status} {_REASONS.get(status, 'Unknown')}",
+                f"Content-Length: {len(payload)}",
+                f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        head += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+        writer.write(payload)
+
+    async def _route(self, method: str, target: str, headers: Dict[str, str], body: bytes,
+                     received: float) -> Tuple[int, Dict, bytes]:
+        url = urlsplit(target)
+        if url.path == "/enhance":
+            if method != "POST":
+                raise _HTTPError(405, "use POST")
+            return await self._enhance(parse_qs(url.query), headers, body, received)
+        if url.path in ("/metrics", "/health"):
+            if method != "GET":
+                raise _HTTPError(405, "use GET")
+            doc = self.metrics_snapshot() if url.path == "/metrics" else {"status": "ok"}
+            return 200, {"Content-Type": "application/json"}, json.dumps(doc).encode()
+        raise _HTTPError(404, f"no such endpoint {url.path}")
+
+    def metrics_snapshot(self) -> Dict:
+        return self.metrics.snapshot(queue_depth=self.queue_depth(), queue_size=self.queue_size,
+                                     in_flight=self._in_flight, workers=self.workers)
+
+    async def _enhance(self, query: Dict[str, List[str]], headers: Dict[str, str], body: bytes,
+                       received: float) -> Tuple[int, Dict, bytes]:
+        job = parse_job(query, headers, body)
+        result = await self.submit(job)
+        if result["status"] != "ok":
+            raise _HTTPError(result["code"], result["error"])
+        h, w = result["shape"][:2]
+        self.metrics.completed(result["queue"], time.perf_counter() - received, h * w / 1e6)
+        out = {
+            "Content-Type": RAW_CONTENT_TYPE if job["shape"] is not None else _content_type(job["format"]),
+            "X-Shape": ",".join(str(n) for n in result["shape"]),
+            "X-Queue-Ms": f"{result['queue'] * 1000:.3f}",
+            "X-Process-Ms": f"{result['seconds'] * 1000:.3f}",
+            "X-Batch-Size": str(result["batch"]),
+        }
+        if result["k"] is not None:
+            out["X-K"] = repr(result["k"])
+        return 200, out, result["data"]
+
+
+def parse_job(query: Dict[str, List[str]], headers: Dict[str, str], body: bytes) -> Dict:
+    """Build a pool job from the query string and headers of an /enhance request"""
+    def arg(name: str, default=None):
+        values = query.get(name)
+        return values[-1] if values else default
+
+    try:
+        engine = arg("engine", "ifg")
+        if engine not in ENGINES:
+            raise _HTTPError(400, f"engine must be one of {', '.join(ENGINES)}")
+        search = arg("search", "grid")
+        if search not in STRATEGIES:
+            raise _HTTPError(400, f"search must be one of {', '.join(sorted(STRATEGIES))}")
+        clip = float(arg("clip", 2.0))
+        grid = tuple(int(n) for n in arg("grid", "8x8").lower().split("x"))
+        tol = None if arg("tol") is None else float(arg("tol"))
+        max_evals = None if arg("max_evals") is None else int(arg("max_evals"))
+        shape = None
+        if headers.get("content-type", "").split(";")[0].strip() == RAW_CONTENT_TYPE:
+            shape = tuple(int(n) for n in headers.get("x-shape", "").split(","))
+    except ValueError:
+        raise _HTTPError(400, "invalid numeric parameter") from None
+    if len(grid) != 2 or min(grid) < 1 or clip <= 0:
+        raise _HTTPError(400, "clip must be positive and grid of the form WxH")
+    if not body:
+        raise _HTTPError(400, "empty body")
+    fmt = arg("format", ".png")
+    return {
+        "engine": engine, "clip": clip, "grid": grid,
+        "search": {"search": search, "tol": tol, "max_evals": max_evals},
+        "data": body, "shape": shape, "format": fmt if fmt.startswith(".") else f".{fmt}",
+    }
+
+
+def _content_type(fmt: str) -> str:
+    ext = fmt.lower().lstrip(".")
+    return {"jpg": "image/jpeg", "jpeg": "image/jpeg", "tif": "image/tiff"}.get(ext, f"image/{ext}")
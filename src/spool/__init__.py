@@ -0,0 +1,34 @@
+"""Spool directory work queue for batch runs spread over processes and hosts
+
+Workers on any number of machines share a directory (e.g. on NFS) and
+cooperate without a broker: jobs are claimed by atomic renames, claims
+are leases kept alive by heartbeats, and the claims of dead workers are
+requeued, so a run resumes after any crash. Use it through
+`ifg-enhance spool submit | work | status | manifest`; see `store` for
+the layout and `worker` for the processing loop. The names below are
+resolved on first access.
+"""
+
+import importlib
+
+_EXPORTS = {
+    "Spool": ("store", "Spool"),
+    "work": ("worker", "work"),
+    "run_workers": ("worker", "run_workers"),
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    try:
+        module, attr = _EXPORTS[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    value = getattr(importlib.import_module(f".{module}", __name__), attr)
+    globals()[name] = value  # later lookups skip this hook
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -0,0 +1,278 @@
+"""Spool directory layout and its atomic state transitions
+
+    <spool>/
+        pending/<id>.json             job waiting for a worker
+        claimed/<id>~<owner>.json     job being processed by worker <owner>
+        done/<id>.json                result record (k, timings, worker, ...)
+        failed/<id>.json              result record of a job that failed
+        workers/<worker>.json         heartbeat and counters of each worker
+
+Every transition is a single `os.rename` (atomic on a local filesystem
+and on NFS), so when several workers race for a job exactly one wins and
+the others see `FileNotFoundError` and move on. Records are written to a
+temporary name first and renamed into place, so readers never see a
+partial file.
+
+A claim is a lease: its worker touches the claimed file every heartbeat.
+A claim whose file has not been touched for `lease` seconds belongs to a
+dead (or hung) worker, and any worker may put the job back into
+`pending/`. Times are compared to the modification time of a file the
+caller just wrote, i.e. against the clock of the storage, so hosts with
+skewed clocks agree on which claims are stale. A job whose worker was
+lost `max_attempts` times is failed instead of being requeued, so one
+image that kills its worker cannot stall the queue.
+
+Jobs run at least once: a worker presumed dead that still finishes
+rewrites the same outputs and record, which is harmless. Outputs are
+written under `temp_output` names first; reclaiming a job deletes those
+of the lost worker.
+"""
+
+import hashlib
+import json
+import os
+import random
+import socket
+import time
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+
+STATES = ("pending", "claimed", "done", "failed")
+DEFAULT_LEASE = 60.0
+DEFAULT_MAX_ATTEMPTS = 3
+
+# claimers pick among this many of the oldest pending jobs at random, so
+# workers starting together do not all race for the same file
+_CLAIM_SPREAD = 32
+
+
+class Claim(NamedTuple):
+    id: str
+    path: str        # the claimed file, touched to renew the lease
+    job: Dict
+
+
+def job_key(job: Dict) -> str:
+    """Identity of a job: its input and output paths (resubmitting it is a no-op)"""
+    text = json.dumps([os.path.abspath(job["input"]), os.path.abspath(job["output"])])
+    return hashlib.blake2b(text.encode(), digest_size=8).hexdigest()
+
+
+def worker_name() -> str:
+    """`<host>-<pid>`, unique among the workers sharing a spool"""
+    host = socket.gethostname().split(".")[0] or "host"
+    return f"{host}-{os.getpid()}".replace("~", "-").replace(os.sep, "-")
+
+
+def temp_output(path: str, worker: str) -> str:
+    """Name `worker` writes output `path` under before renaming it into place"""
+    directory, name = os.path.split(path)
+    stem, ext = os.path.splitext(name)
+    return os.path.join(directory, f".{stem}.{worker}.tmp{ext}")  # same extension: same format
+
+
+def _key(name: str) -> str:
+    """Job key of a spool file name (`<seq>-<key>.json` or `<seq>-<key>~<owner>.json`)"""
+    return name.split("~", 1)[0].rsplit(".json", 1)[0].split("-", 1)[-1]
+
+
+def _write_json(path: str, obj: Dict) -> None:
+    directory, name = os.path.split(path)
+    tmp = os.path.join(directory, f".{name}.{os.getpid()}.{random.getrandbits(32):08x}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f)
+    os.replace(tmp, path)
+
+
+def _read_json(path: str) -> Optional[Dict]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class Spool:
+    """A spool directory shared by any number of worker processes and hosts"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, state: str, name: str = "") -> str:
+        return os.path.join(self.root, state, name)
+
+    def create(self) -> None:
+        for state in (*STATES, "workers"):
+            os.makedirs(self.path(state), exist_ok=True)
+
+    def exists(self) -> bool:
+        return all(os.path.isdir(self.path(state)) for state in STATES)
+
+    def names(self, state: str) -> List[str]:
+        """File names in `state`, oldest submission first (temporaries excluded)"""
+        try:
+            return sorted(n for n in os.listdir(self.path(state)) if not n.startswith("."))
+        except FileNotFoundError:
+            return []
+
+    # -- submitting -----------------------------------------------------------
+
+    def submit(self, jobs: Iterable[Dict], force: bool = False) -> Tuple[int, int]:
+        """
+        Queue `jobs` (`batch.process_one` dicts); returns (queued, skipped).
+        Jobs already pending, claimed or done are skipped (done ones are
+        queued again with `force`); failed ones are queued again.
+        """
+        self.create()
+        known = {state: {_key(n): n for n in self.names(state)} for state in STATES}
+        seq = sum(len(k) for k in known.values())
+        queued = skipped = 0
+        for job in jobs:
+            key = job_key(job)
+            if key in known["pending"] or key in known["claimed"] or (key in known["done"] and not force):
+                skipped += 1
+                continue
+            for state in ("done", "failed"):
+                if key in known[state]:
+                    try:
+                        os.remove(self.path(state, known[state][key]))
+                    except FileNotFoundError:
+                        pass
+            job_id = f"{seq:08d}-{key}"
+            seq += 1
+            _write_json(self.path("pending", f"{job_id}.json"), dict(job, id=job_id, attempts=0))
+            known["pending"][key] = job_id
+            queued += 1
+        return queued, skipped
+
+    # -- working --------------------------------------------------------------
+
+    def claim(self, worker: str) -> Optional[Claim]:
+        """Atomically take a pending job for `worker` (None if there is none left)"""
+        names = self.names("pending")
+        while names:
+            name = names.pop(random.randrange(min(len(names), _CLAIM_SPREAD)))
+            job_id = name[:-len(".json")]
+            pending = self.path("pending", name)
+            path = self.path("claimed", f"{job_id}~{worker}.json")
+            try:
+                # the lease starts now, not at submission: renaming keeps the
+                # mtime, and a claim appearing with an old one would be stale
+                os.utime(pending)
+                os.rename(pending, path)
+            except FileNotFoundError:
+                continue  # another worker was faster
+            job = _read_json(path)
+            if job is None:
+                if not os.path.exists(path):
+                    continue  # reclaimed meanwhile: the job is pending again
+                self._finish(path, "failed", {"id": job_id, "status": "error", "error": "unreadable job file"})
+                continue
+            return Claim(job_id, path, job)
+        return None
+
+    def renew(self, claim: Claim) -> bool:
+        """Extend the lease of `claim`; False if it was lost (reclaimed as stale)"""
+        try:
+            os.utime(claim.path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def complete(self, claim: Claim, record: Dict) -> None:
+        """Store the result `record` of a claimed job and drop the claim"""
+        state = "done" if record.get("status") == "ok" else "failed"
+        self._finish(claim.path, state, dict(record, id=claim.id))
+
+    def release(self, claim: Claim) -> None:
+        """Give an unfinished claim back (e.g. on Ctrl+C), without counting an attempt"""
+        try:
+            os.rename(claim.path, self.path("pending", f"{claim.id}.json"))
+        except FileNotFoundError:
+            pass
+
+    def _finish(self, claimed: str, state: str, record: Dict) -> None:
+        _write_json(self.path(state, f"{record['id']}.json"), record)
+        try:
+            os.remove(claimed)
+        except FileNotFoundError:
+            pass  # reclaimed meanwhile; the new claimer will rewrite the same record
+
+    def reclaim_stale(self, worker: str, lease: float = DEFAULT_LEASE,
+                      max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> int:
+        """
+        Requeue the claims not renewed for `lease` seconds; returns how many.
+        The reclaiming `worker` first takes each one over by renaming it, so
+        only one of several reclaimers handles a given claim.
+        """
+        now = self.clock(worker)
+        reclaimed = 0
+        for name in self.names("claimed"):
+            path = self.path("claimed", name)
+            try:
+                if now - os.stat(path).st_mtime <= lease:
+                    continue
+                job_id, owner = name[:-len(".json")].split("~", 1)
+                # renaming keeps the old mtime, so a takeover abandoned by a
+                # crashed reclaimer is itself stale and picked up again
+                mine = self.path("claimed", f"{job_id}~reclaim-{worker}.json")
+                os.rename(path, mine)
+            except FileNotFoundError:
+                continue
+            job = _read_json(mine) or {"id": job_id}
+            for key in ("output", "clahe_output"):
+                if key in job and not owner.startswith("reclaim-"):
+                    try:
+                        os.remove(temp_output(job[key], owner))  # left by the lost worker
+                    except OSError:
+                        pass
+            job["attempts"] = job.get("attempts", 0) + 1
+            if job["attempts"] >= max_attempts:
+                self._finish(mine, "failed", {
+                    "id": job_id, "input": job.get("input"), "output": job.get("output"), "status": "error",
+                    "attempts": job["attempts"], "error": f"worker lost {job['attempts']} times"})
+            else:
+                _write_json(mine, job)
+                os.rename(mine, self.path("pending", f"{job_id}.json"))
+            reclaimed += 1
+        return reclaimed
+
+    # -- workers and progress ---------------------------------------------------
+
+    def heartbeat(self, worker: str, info: Dict) -> None:
+        """Publish the state and counters of `worker`"""
+        _write_json(self.path("workers", f"{worker}.json"), dict(info, worker=worker))
+
+    def clock(self, worker: str) -> float:
+        """Current time of the storage, read back from the heartbeat file of `worker`"""
+        path = self.path("workers", f"{worker}.json")
+        try:
+            os.utime(path)
+            return os.stat(path).st_mtime
+        except FileNotFoundError:
+            return time.time()
+
+    def workers(self) -> List[Dict]:
+        """Heartbeats of all workers that ever ran, each with its `age` in seconds"""
+        out = []
+        now = time.time()
+        for name in self.names("workers"):
+            path = self.path("workers", name)
+            info = _read_json(path)
+            if info is not None:
+                try:
+                    info["age"] = now - os.stat(path).st_mtime
+                except FileNotFoundError:
+                    continue
+                out.append(info)
+        return out
+
+    def counts(self) -> Dict[str, int]:
+        return {state: len(self.names(state)) for state in STATES}
+
+    def records(self, state: str = "done") -> Iterator[Dict]:
+        """Result records of the `done` (or `failed`) jobs"""
+        for name in self.names(state):
+            record = _read_json(self.path(state, name))
+            if record is not None:
+                yield record
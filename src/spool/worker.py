@@ -0,0 +1,180 @@
+"""Worker processes of a spool
+
+`work` claims jobs one at a time and runs each through
+`cli.batch.process_one`, so outputs and result records are those of
+`ifg-enhance batch`. Outputs are written under a temporary name and
+renamed into place: a worker killed mid-write, or a slow worker and the
+one that reclaimed its job, never leave a truncated image behind. A
+heartbeat thread renews the lease of the current job and publishes the
+worker's counters for `ifg-enhance spool status`.
+
+When the spool has no pending job left, a worker requeues stale claims
+(see `store.Spool.reclaim_stale`) and otherwise waits for the claims of
+the other workers to finish or go stale; it exits once nothing is
+pending or claimed, or keeps polling for new jobs with `wait`.
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from src.cli import batch
+from .store import DEFAULT_LEASE, DEFAULT_MAX_ATTEMPTS, Claim, Spool, temp_output, worker_name
+
+
+class Heartbeat:
+    """Background thread renewing the current claim and publishing the worker's state"""
+
+    def __init__(self, spool: Spool, worker: str, interval: float, lease: float):
+        self.spool = spool
+        self.worker = worker
+        self.interval = interval
+        self.claim: Optional[Claim] = None
+        now = time.time()
+        self.info = {"worker": worker, "host": worker.rsplit("-", 1)[0], "pid": os.getpid(),
+                     "started": now, "updated": now, "lease": lease, "state": "idle", "current": None,
+                     "done": 0, "failed": 0, "megapixels": 0.0, "busy": 0.0}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="spool-heartbeat", daemon=True)
+
+    def start(self) -> None:
+        self.beat()  # the heartbeat file also serves as the storage clock
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.beat()
+
+    def beat(self) -> None:
+        with self._lock:
+            claim = self.claim
+            self.info["updated"] = time.time()
+            info = dict(self.info)
+        if claim is not None:
+            self.spool.renew(claim)
+        self.spool.heartbeat(self.worker, info)
+
+    def begin(self, claim: Claim) -> None:
+        with self._lock:
+            self.claim = claim
+            self.info.update(state="busy", current=claim.job.get("input"))
+        self.beat()  # renews the claim and shows the job even if it ends before the next beat
+
+    def end(self, record: Dict) -> None:
+        with self._lock:
+            self.claim = None
+            ok = record.get("status") == "ok"
+            self.info["done" if ok else "failed"] += 1
+            self.info["megapixels"] += record.get("megapixels", 0.0) if ok else 0.0
+            self.info["busy"] += record["finished"] - record["started"]
+            self.info.update(state="idle", current=None)
+        self.beat()
+
+    def stop(self) -> Dict:
+        self._stopped.set()
+        self._thread.join()
+        with self._lock:
+            self.claim = None
+            self.info.update(state="stopped", current=None)
+        self.beat()
+        return dict(self.info)
+
+
+def run_job(job: Dict, worker: str) -> Dict:
+    """`batch.process_one` writing the outputs atomically; returns its record"""
+    outputs = {key: job[key] for key in ("output", "clahe_output") if key in job}
+    temps = {key: temp_output(path, worker) for key, path in outputs.items()}
+    record = batch.process_one(dict(job, **temps))
+    for key, tmp in temps.items():
+        try:
+            if record["status"] == "ok":
+                os.replace(tmp, outputs[key])
+            elif os.path.exists(tmp):
+                os.remove(tmp)
+        except OSError as exc:
+            record.update(status="error", error=f"could not move {tmp} into place: {exc}")
+    record.update(outputs)
+    return record
+
+
+def work(root: str, worker: Optional[str] = None, lease: float = DEFAULT_LEASE,
+         heartbeat: Optional[float] = None, poll: float = 1.0, wait: bool = False,
+         max_attempts: int = DEFAULT_MAX_ATTEMPTS, cache_dir: Optional[str] = None,
+         cache_size: int = 0) -> Dict:
+    """
+    Process jobs of the spool at `root` until it is drained (or, with
+    `wait`, until interrupted); returns the worker's final counters.
+
+    Parameters
+    ----------
+    worker : str, optional
+        Name of this worker (default `<host>-<pid>`).
+    lease : float
+        Seconds after which the claim of a silent worker is requeued.
+    heartbeat : float, optional
+        Seconds between heartbeats (default: a sixth of `lease`).
+    poll : float
+        Seconds to sleep when no job is available.
+    max_attempts : int
+        Lost workers after which a job is failed rather than requeued.
+    cache_dir, cache_size
+        Result cache directory and its size limit, as for `batch`.
+    """
+    spool = Spool(root)
+    if not spool.exists():
+        raise FileNotFoundError(f"{root} is not a spool directory (create it with `spool submit`)")
+    worker = worker or worker_name()
+    batch._init_worker(cache_dir, cache_size)
+    beat = Heartbeat(spool, worker, heartbeat or lease / 6, lease)
+    beat.start()
+    claim = None
+    try:
+        while True:
+            claim = spool.claim(worker)
+            if claim is None:
+                if spool.reclaim_stale(worker, lease, max_attempts):
+                    continue
+                if not wait and not spool.names("pending") and not spool.names("claimed"):
+                    break
+                time.sleep(poll)
+                continue
+            beat.begin(claim)
+            started = time.time()
+            record = run_job(claim.job, worker)
+            record.update(worker=worker, attempts=claim.job.get("attempts", 0), started=started,
+                          finished=time.time())
+            spool.complete(claim, record)
+            beat.end(record)
+            claim = None
+    except KeyboardInterrupt:
+        if claim is not None:
+            spool.release(claim)
+    finally:
+        info = beat.stop()
+    return info
+
+
+def _work_process(root: str, kwargs: Dict) -> None:
+    try:
+        work(root, **kwargs)
+    except KeyboardInterrupt:
+        pass
+
+
+def run_workers(root: str, processes: int, **kwargs) -> List[int]:
+    """Run `processes` local workers (`work` in child processes); returns their exit codes"""
+    children = [multiprocessing.Process(target=_work_process, args=(root, kwargs), name=f"spool-worker-{i}")
+                for i in range(processes)]
+    for child in children:
+        child.start()
+    try:
+        for child in children:
+            child.join()
+    except KeyboardInterrupt:
+        # the children got the same SIGINT and give their claims back
+        for child in children:
+            child.join()
+    return [child.exitcode for child in children]
@@ -0,0 +1,353 @@
+"""Two-level cache for enhancement results (memory LRU + optional disk store)
+
+Entries are keyed by a hash of the image content, the algorithm parameters
+and a fingerprint of the enhancement code, so editing an algorithm
+invalidates its old results. The in-memory level is an LRU bounded by the
+bytes of the arrays it holds; the optional on-disk level stores one `.npz`
+per entry and evicts the least recently used files once it grows past its
+size limit. Cached arrays are returned read-only and shared between hits.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple, Union
+
+import numpy as np
+
+from src.enhancements import clahe as _clahe
+from src.enhancements import color as _color
+from src.enhancements import ifg as _ifg
+from src.enhancements import ifg16 as _ifg16
+from src.enhancements import pipeline as _pipeline
+from src.enhancements import search as _search
+from src.enhancements import sweep as _sweep
+from src.enhancements.search import KSearch, make_search
+from src.enhancements.timing import NULL_TIMER, StageTimer
+
+
+Entry = Dict[str, Union[np.ndarray, float, int]]
+
+_code_version: Optional[str] = None
+
+
+def code_version() -> str:
+    """Fingerprint of the enhancement sources (part of every cache key)"""
+    global _code_version
+    if _code_version is None:
+        h = hashlib.blake2b(digest_size=8)
+        for mod in (_clahe, _color, _ifg, _ifg16, _pipeline, _search, _sweep):
+            try:
+                with open(mod.__file__, "rb") as f:
+                    h.update(f.read())
+            except (OSError, TypeError):
+                # frozen builds ship no sources; fall back to the module name
+                h.update(mod.__name__.encode())
+        _code_version = h.hexdigest()
+    return _code_version
+
+
+def image_digest(img: np.ndarray) -> str:
+    """Content hash of an image array (dtype, shape and pixels)"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{img.dtype.str}{img.shape}".encode())
+    h.update(np.ascontiguousarray(img).data)
+    return h.hexdigest()
+
+
+def _entry_bytes(entry: Entry) -> int:
+    return sum(v.nbytes for v in entry.values() if isinstance(v, np.ndarray))
+
+
+class ResultCache:
+    """
+    Memory LRU of enhancement results, optionally backed by a directory.
+
+    Parameters
+    ----------
+    max_bytes : int
+        Budget of the in-memory level (0 disables it).
+    directory : str, optional
+        Directory of the on-disk level; disabled when omitted.
+    max_disk_bytes : int
+        Size above which the least recently used files are deleted.
+    """
+
+    def __init__(self, max_bytes: int = 512 * 2**20, directory: Optional[str] = None,
+                 max_disk_bytes: int = 4 * 2**30):
+        self.max_bytes = int(max_bytes)
+        self.directory = directory
+        self.max_disk_bytes = int(max_disk_bytes)
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, Entry]" = OrderedDict()
+        self._memory_bytes = 0
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "disk_evictions": 0}
+        self._disk_bytes = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self._disk_bytes = sum(size for _, size, _ in self._disk_files())
+
+    # -- generic entry access ------------------------------------------------
+
+    def get(self, key: str) -> Optional[Entry]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return entry
+        entry = self._load(key)
+        with self._lock:
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["disk_hits"] += 1
+            self._remember(key, entry)
+        return entry
+
+    def put(self, key: str, entry: Entry, persist: bool = True) -> Entry:
+        """Add an entry; with `persist=False` it is kept in memory only"""
+        for v in entry.values():
+            if isinstance(v, np.ndarray):
+                v.flags.writeable = False
+        with self._lock:
+            self._remember(key, entry)
+        if persist:
+            self._store(key, entry)
+        return entry
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters and the current size of each level"""
+        with self._lock:
+            out = dict(self._stats)
+            out.update(hits=out["memory_hits"] + out["disk_hits"],
+                       entries=len(self._memory), bytes=self._memory_bytes, disk_bytes=self._disk_bytes)
+        return out
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+
+    # -- enhancement helpers ---------------------------------------------------
+
+    @staticmethod
+    def key(kind: str, digest: str, **params) -> str:
+        text = ";".join([kind, digest, code_version(), *(f"{k}={params[k]!r}" for k in sorted(params))])
+        return hashlib.blake2b(text.encode(), digest_size=20).hexdigest()
+
+    def _clahe_key(self, digest: str, clip: float, grid: Tuple[int, int] = (8, 8)) -> str:
+        return self.key("clahe", digest, clip=float(clip), grid=tuple(grid))
+
+    def _ifg_key(self, digest: str, clip: float, search: KSearch) -> str:
+        return self.key("ifg", digest, clip=float(clip), search=search)
+
+    def _prepared_key(self, digest: str, search: KSearch) -> str:
+        return self.key("prepared", digest, search=search)
+
+    @staticmethod
+    def _ifg_entry(out: np.ndarray, k: float, info: dict) -> Entry:
+        return {"image": out, "k": k, "entropy": info["entropy"], "evaluations": info["evaluations"]}
+
+    @staticmethod
+    def _report(stats: Optional[dict], entry: Entry, cached: bool) -> None:
+        if stats is not None:
+            stats.update(k=float(entry["k"]), entropy=float(entry["entropy"]),
+                         evaluations=int(entry["evaluations"]), cached=cached)
+
+    @staticmethod
+    def _digest(img: np.ndarray, digest: Optional[str], timer) -> str:
+        if digest is not None:
+            return digest
+        with timer.stage("digest"):
+            return image_digest(img)
+
+    def clahe(self, img: np.ndarray, clip: float = 2.0, grid: Tuple[int, int] = (8, 8),
+              digest: Optional[str] = None, timer: Optional[StageTimer] = None) -> np.ndarray:
+        """Cached `clahe.apply`; `timer` records the stages actually run"""
+        timer = timer or NULL_TIMER
+        key = self._clahe_key(self._digest(img, digest, timer), clip, grid)
+        entry = self.get(key)
+        if entry is None:
+            entry = self.put(key, {"image": _clahe.apply(img, clip=clip, grid=grid, timer=timer)})
+        return entry["image"]
+
+    def ifg(self, img: np.ndarray, clip: float = 2.0, search: Union[str, KSearch, None] = None,
+            digest: Optional[str] = None, stats: Optional[dict] = None,
+            timer: Optional[StageTimer] = None) -> Tuple[np.ndarray, float]:
+        """Cached `ifg.enhance`; `stats` also reports whether it was a `cached` result"""
+        timer = timer or NULL_TIMER
+        search = make_search(search)
+        key = self._ifg_key(self._digest(img, digest, timer), clip, search)
+        entry = self.get(key)
+        cached = entry is not None
+        if entry is None:
+            info = {}
+            out, k = _ifg.enhance(img, clip=clip, search=search, stats=info, timer=timer)
+            entry = self.put(key, self._ifg_entry(out, k, info))
+        self._report(stats, entry, cached)
+        return entry["image"], float(entry["k"])
+
+    def prepared(self, img: np.ndarray, search: Union[str, KSearch, None] = None,
+                 digest: Optional[str] = None, timer: Optional[StageTimer] = None) -> _sweep.Prepared:
+        """
+        Cached `sweep.prepare`: the clip-independent IFG state of an image.
+        Kept in memory only (it is four image planes and cheap to rebuild).
+        """
+        timer = timer or NULL_TIMER
+        search = make_search(search)
+        key = self._prepared_key(self._digest(img, digest, timer), search)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+        if entry is None:
+            entry = self.put(key, _sweep.prepare(img, search, timer)._asdict(), persist=False)
+        return _sweep.Prepared(**entry)
+
+    def pipeline(self, img: np.ndarray, clip: float = 2.0, search: Union[str, KSearch, None] = None,
+                 digest: Optional[str] = None, on_clahe=None, stats: Optional[dict] = None,
+                 timer: Optional[StageTimer] = None) -> Tuple[np.ndarray, np.ndarray, float]:
+        """
+        Cached `pipeline.run`: returns (clahe_bgr, ifg_bgr, k), computing
+        only the branches that are not cached. `on_clahe` is called as soon
+        as the CLAHE image is available. The IFG analysis is shared with
+        other clip limits of the same image through `prepared`.
+        """
+        timer = timer or NULL_TIMER
+        search = make_search(search)
+        digest = self._digest(img, digest, timer)
+        clahe_key, ifg_key = self._clahe_key(digest, clip), self._ifg_key(digest, clip, search)
+        clahe_entry, ifg_entry = self.get(clahe_key), self.get(ifg_key)
+        cached = ifg_entry is not None
+        if clahe_entry is not None and on_clahe is not None:
+            on_clahe(clahe_entry["image"])
+
+        if clahe_entry is None or ifg_entry is None:
+            def clahe_done(out: np.ndarray) -> None:
+                self.put(clahe_key, {"image": out})
+                if on_clahe is not None:
+                    on_clahe(out)
+
+            info = {}
+            # the shared analysis (`sweep.Prepared`) exists for 8-bit images only
+            prepared = (self.prepared(img, search, digest, timer)
+                        if ifg_entry is None and img.dtype == np.uint8 else None)
+            clahe_img, ifg_img, k = _pipeline.run(img, clip, search, on_clahe=clahe_done, stats=info,
+                                                  with_clahe=clahe_entry is None, with_ifg=ifg_entry is None,
+                                                  timer=timer, prepared=prepared)
+            if clahe_entry is None:
+                clahe_entry = {"image": clahe_img}
+            if ifg_entry is None:
+                ifg_entry = self.put(ifg_key, self._ifg_entry(ifg_img, k, info))
+        self._report(stats, ifg_entry, cached)
+        return clahe_entry["image"], ifg_entry["image"], float(ifg_entry["k"])
+
+    def has_pipeline(self, digest: str, clip: float = 2.0, search: Union[str, KSearch, None] = None) -> bool:
+        """True if `pipeline` would answer from memory for this image digest and settings"""
+        search = make_search(search)
+        keys = (self._clahe_key(digest, clip), self._ifg_key(digest, clip, search))
+        with self._lock:
+            return all(key in self._memory for key in keys)
+
+    # -- internals -------------------------------------------------------------
+
+    def _remember(self, key: str, entry: Entry) -> None:
+        size = _entry_bytes(entry)
+        if size > self.max_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= _entry_bytes(old)
+        self._memory[key] = entry
+        self._memory_bytes += size
+        while self._memory_bytes > self.max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= _entry_bytes(evicted)
+            self._stats["evictions"] += 1
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def _load(self, key: str) -> Optional[Entry]:
+        if self.directory is None:
+            return None
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                entry = {name: data[name] for name in data.files}
+            os.utime(path)  # mark as recently used for eviction
+        except (OSError, ValueError, EOFError):
+            return None
+        for name, value in entry.items():
+            if value.ndim == 0:
+                entry[name] = value.item()
+            else:
+                value.flags.writeable = False
+        return entry
+
+    def _store(self, key: str, entry: Entry) -> None:
+        if self.directory is None:
+            return
+        fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **entry)
+            size = os.path.getsize(tmp)
+            path = self._path(key)
+            try:
+                replaced = os.path.getsize(path)
+            except OSError:
+                replaced = 0
+            os.replace(tmp, path)
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return
+        with self._lock:
+            self._disk_bytes += size - replaced
+            over = self._disk_bytes > self.max_disk_bytes
+        if over:
+            self._evict_disk()
+
+    def _disk_files(self):
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".npz"):
+                try:
+                    st = os.stat(os.path.join(self.directory, name))
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, name))
+        return files
+
+    def _evict_disk(self) -> None:
+        # rescan: other processes may share the directory
+        files = self._disk_files()
+        total = sum(size for _, size, _ in files)
+        evicted = 0
+        for _, size, name in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        with self._lock:
+            self._disk_bytes = total
+            self._stats["disk_evictions"] += evicted
+
+
+_default: Optional[ResultCache] = None
+
+
+def default_cache() -> ResultCache:
+    """Process-wide in-memory cache used by the GUI"""
+    global _default
+    if _default is None:
+        _default = ResultCache()
+    return _default
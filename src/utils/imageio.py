@@ -0,0 +1,38 @@
+"""Reading and writing images at their native bit depth
+
+OpenCV's `IMREAD_COLOR` truncates 16-bit PNG/TIFF files to 8 bits, and
+`imwrite` saturates 16-bit images (rather than scaling them) for formats
+that only hold 8 bits. `read` keeps 8- and 16-bit images as they are and
+`write` scales 16-bit data to 8 bits where the format needs it.
+"""
+
+from typing import Optional
+import numpy as np
+import cv2
+
+
+# formats OpenCV writes at 16 bits per channel
+DEEP_EXTENSIONS = (".png", ".tif", ".tiff")
+
+
+def read(path: str) -> Optional[np.ndarray]:
+    """BGR uint8 or uint16 image (None if it cannot be decoded)"""
+    img = cv2.imread(path, cv2.IMREAD_COLOR | cv2.IMREAD_ANYDEPTH)
+    if img is not None and img.dtype not in (np.uint8, np.uint16):
+        # e.g. float TIFFs: the enhancements take integer images only
+        img = cv2.imread(path, cv2.IMREAD_COLOR)
+    return img
+
+
+def to_8bit(img: np.ndarray) -> np.ndarray:
+    """`img` scaled to uint8 (returned as is if it already is)"""
+    if img.dtype == np.uint8:
+        return img
+    return cv2.convertScaleAbs(img, alpha=255.0 / 65535.0)
+
+
+def write(path: str, img: np.ndarray) -> bool:
+    """`cv2.imwrite`, converting 16-bit images to 8 bits for formats without 16-bit support"""
+    if img.dtype != np.uint8 and not path.lower().endswith(DEEP_EXTENSIONS):
+        img = to_8bit(img)
+    return cv2.imwrite(path, img)